@@ -0,0 +1,133 @@
+"""
+Бенчмарк чанкинга: RecursiveCharacterTextSplitter (прежний путь) против однопроходного
+TextChunker (src/utils/text_chunker.py) на текстах законов data/raw/*.txt.
+
+Кроме пропускной способности считаются размеры чанков и доля чанков, которые заканчиваются
+на границе предложения или клаузы и начинаются с начала статьи, части или пункта.
+
+Запуск из корня проекта:
+    python scripts/benchmark_chunker.py
+    python scripts/benchmark_chunker.py --file data/raw/44fz.txt --repeat 10 --output data/benchmarks/chunker.json
+"""
+import argparse
+import json
+import logging
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import settings  # noqa: E402
+from src.utils.text_chunker import TextChunker  # noqa: E402
+
+logger = logging.getLogger("benchmark_chunker")
+
+CLEAN_END_RE = re.compile(r"[.;:!?…»\")]$")
+STRUCTURAL_START_RE = re.compile(r"(?:Статья|Глава|§)\s*\d|\d+(?:\.\d+)*[.)]\s|[а-яё]\)\s")
+
+
+def recursive_splitter(chunk_size: int, chunk_overlap: int) -> Callable[[str], List[Tuple[int, str]]]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, add_start_index=True
+    )
+    return lambda text: [(d.metadata["start_index"], d.page_content) for d in splitter.create_documents([text])]
+
+
+def offset_chunker(chunk_size: int, chunk_overlap: int) -> Callable[[str], List[Tuple[int, str]]]:
+    chunker = TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return lambda text: [(d.metadata["start_index"], d.page_content) for d in chunker.create_documents([text])]
+
+
+def chunk_stats(text: str, chunks: List[Tuple[int, str]]) -> Dict[str, Any]:
+    lengths = [len(chunk) for _, chunk in chunks]
+    misplaced = sum(1 for start, chunk in chunks if not text.startswith(chunk, start))
+    return {
+        "chunks": len(chunks),
+        "mean_chars": round(statistics.mean(lengths), 1) if lengths else 0,
+        "min_chars": min(lengths, default=0),
+        "max_chars": max(lengths, default=0),
+        "clean_end_share": round(sum(1 for _, chunk in chunks if CLEAN_END_RE.search(chunk)) / max(len(chunks), 1), 3),
+        "structural_start_share": round(sum(1 for _, chunk in chunks if STRUCTURAL_START_RE.match(chunk)) / max(len(chunks), 1), 3),
+        "wrong_start_index": misplaced,
+    }
+
+
+def measure(func: Callable[[str], Any], text: str, repeat: int) -> Tuple[float, Any]:
+    """Медиана времени (мс) по repeat запускам и результат последнего запуска."""
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(text)
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение RecursiveCharacterTextSplitter и TextChunker.")
+    parser.add_argument("--file", action="append", help="Текстовый файл (можно несколько); по умолчанию тексты законов из настроек")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько раз чанкировать каждый текст (берется медиана)")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    files = args.file or list(settings.tools.statute_files.values())
+    texts = []
+    for path in files:
+        try:
+            texts.append((Path(path).name, Path(path).read_text(encoding="utf-8")))
+        except OSError as e:
+            logger.error(f"Не удалось прочитать {path}: {e}")
+    if not texts:
+        logger.error("Нет текстов для бенчмарка.")
+        return 1
+
+    engines: Dict[str, Callable[[str], List[Tuple[int, str]]]] = {"offset": offset_chunker(args.chunk_size, args.chunk_overlap)}
+    try:
+        engines = {"recursive": recursive_splitter(args.chunk_size, args.chunk_overlap), **engines}
+    except ImportError:
+        logger.warning("langchain_text_splitters не установлен, замеряется только TextChunker.")
+    for func in engines.values():
+        func(texts[0][1][:10_000])  # прогрев: компиляция регулярных выражений и импорты не попадают в замеры
+
+    rows: List[Dict[str, Any]] = []
+    for name, text in texts:
+        megabytes = len(text.encode("utf-8")) / 1024 / 1024
+        row: Dict[str, Any] = {"file": name, "chars": len(text), "mb": round(megabytes, 2)}
+        for engine, func in engines.items():
+            ms, chunks = measure(func, text, args.repeat)
+            row[engine] = {"ms": round(ms, 2), "mb_per_s": round(megabytes / (ms / 1000), 1) if ms else None, **chunk_stats(text, chunks)}
+        rows.append(row)
+
+    print(f"{'файл':<12} {'МБ':>5} {'движок':<10} {'мс':>8} {'МБ/с':>7} {'чанков':>7} {'ср. длина':>9} {'мин':>5} {'макс':>5} {'конец ок':>9} {'начало ст.':>10}")
+    for row in rows:
+        for engine in engines:
+            stats = row[engine]
+            print(
+                f"{row['file'][:12]:<12} {row['mb']:>5} {engine:<10} {stats['ms']:>8} {stats['mb_per_s']:>7} {stats['chunks']:>7} "
+                f"{stats['mean_chars']:>9} {stats['min_chars']:>5} {stats['max_chars']:>5} {stats['clean_end_share']:>9} {stats['structural_start_share']:>10}"
+            )
+    if "recursive" in engines:
+        total_recursive = sum(row["recursive"]["ms"] for row in rows)
+        total_offset = sum(row["offset"]["ms"] for row in rows)
+        print(f"Время всего: RecursiveCharacterTextSplitter {total_recursive:.0f} мс, TextChunker {total_offset:.0f} мс (x{total_recursive / max(total_offset, 1e-9):.1f})")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap, "repeat": args.repeat, "files": rows},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.getLogger("src").setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Бенчмарк извлечения текста из HTML: прежний путь (BeautifulSoup.get_text + BeautifulSoupTransformer)
+против потокового извлекателя на lxml (src/utils/html_text.py).
+
+Страницы берутся из каталога с сохраненным HTML (--html-dir, например выгрузки consultant.ru);
+если он не задан, страницы в разметке правового портала собираются из текстов законов data/raw/*.txt.
+
+Запуск из корня проекта:
+    python scripts/benchmark_html_extract.py
+    python scripts/benchmark_html_extract.py --html-dir data/html_samples --repeat 5 --output data/benchmarks/html.json
+"""
+import argparse
+import json
+import logging
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import settings  # noqa: E402
+from src.utils.html_text import extract_html_text  # noqa: E402
+
+logger = logging.getLogger("benchmark_html_extract")
+
+# Список тегов, которые прежний путь передавал BeautifulSoupTransformer.
+LEGACY_UNWANTED_TAGS = ["script", "style", "nav", "footer", "aside", "header", "form", "button", "img", "svg", "iframe", "figure", "noscript"]
+
+
+def legacy_extract(html: str) -> str:
+    """Прежний путь: BeautifulSoup(html.parser).get_text(), затем BeautifulSoupTransformer (при пустом результате — сырой текст)."""
+    from bs4 import BeautifulSoup
+    from langchain_community.document_transformers import BeautifulSoupTransformer
+    from langchain_core.documents import Document
+
+    soup = BeautifulSoup(html, "html.parser")
+    soup.find("title"), soup.find("meta", attrs={"name": "description"}), soup.find("html")
+    raw_text = soup.get_text()
+    transformed = BeautifulSoupTransformer().transform_documents([Document(page_content=raw_text)], unwanted_tags=LEGACY_UNWANTED_TAGS)
+    cleaned = " ".join(doc.page_content for doc in transformed if doc.page_content and doc.page_content.strip())
+    return cleaned or raw_text
+
+
+def portal_page(title: str, paragraphs: List[str]) -> str:
+    """HTML в духе страниц правовых порталов: тяжелая навигация, скрипты, стили, таблица оглавления, футер."""
+    nav = "".join(f"<li class='menu-item'><a href='/document/cons_doc_LAW_{i}/'>Раздел {i}</a></li>" for i in range(300))
+    toc = "".join(f"<tr><td><a href='#p{i}'>{p[:60]}</a></td><td>{i}</td></tr>" for i, p in enumerate(paragraphs[:200]))
+    scripts = "".join(f"<script>window.__state{i} = {json.dumps({'id': i, 'items': list(range(50))})};</script>" for i in range(20))
+    body = "".join(
+        f"<div class='doc-style' id='p{i}'><p class='p'><span class='blk'>{paragraph}</span></p></div>"
+        for i, paragraph in enumerate(paragraphs)
+    )
+    return (
+        f"<!DOCTYPE html><html lang='ru'><head><meta charset='utf-8'><title>{title}</title>"
+        f"<meta name='description' content='{title}'><style>.p {{margin: 0 0 8px}} .menu-item {{display: inline}}</style>{scripts}</head>"
+        f"<body><header><nav><ul>{nav}</ul></nav><form><input name='q'><button>Найти</button></form></header>"
+        f"<main><table class='toc'>{toc}</table><article>{body}</article></main>"
+        f"<aside><ul>{nav[:5000]}</ul></aside><footer>© КонсультантПлюс, 1997-2025</footer></body></html>"
+    )
+
+
+def generated_pages() -> List[Tuple[str, str]]:
+    pages = []
+    for name, path in settings.tools.statute_files.items():
+        sentences = [s.strip() for s in re.split(r"(?<=[.;:])\s+", Path(path).read_text(encoding="utf-8")) if s.strip()]
+        paragraphs = [" ".join(sentences[i:i + 3]) for i in range(0, len(sentences), 3)]
+        for size_kb in (20, 200, None):
+            selected, chars = [], 0
+            for paragraph in paragraphs:
+                if size_kb is not None and chars >= size_kb * 1024:
+                    break
+                selected.append(paragraph)
+                chars += len(paragraph)
+            label = f"{size_kb} тыс. симв." if size_kb else "полный текст"
+            pages.append((f"{name}: {label}", portal_page(name, selected)))
+    return pages
+
+
+def saved_pages(html_dir: str) -> List[Tuple[str, str]]:
+    pages = []
+    for path in sorted(Path(html_dir).glob("*.htm*")):
+        raw = path.read_bytes()
+        match = re.search(rb"charset=[\"']?([\w-]+)", raw[:4096])
+        pages.append((path.name, raw.decode(match.group(1).decode() if match else "utf-8", errors="replace")))
+    return pages
+
+
+def measure(func: Callable[[str], Any], html: str, repeat: int) -> Tuple[float, float, Any]:
+    """Медианы времени (мс) и процессорного времени (мс) по repeat запускам и результат последнего запуска."""
+    wall, cpu, result = [], [], None
+    for _ in range(repeat):
+        started_wall, started_cpu = time.perf_counter(), time.process_time()
+        result = func(html)
+        wall.append((time.perf_counter() - started_wall) * 1000)
+        cpu.append((time.process_time() - started_cpu) * 1000)
+    return statistics.median(wall), statistics.median(cpu), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение извлечения текста из HTML: BeautifulSoup против lxml.")
+    parser.add_argument("--html-dir", help="Каталог с сохраненными страницами (*.html); по умолчанию страницы генерируются из законов")
+    parser.add_argument("--repeat", type=int, default=3, help="Сколько раз обрабатывать каждую страницу (берется медиана)")
+    parser.add_argument("--max-chars", type=int, default=settings.tools.max_page_text_chars, help="Лимит текста для lxml-извлекателя")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    pages = saved_pages(args.html_dir) if args.html_dir else generated_pages()
+    if not pages:
+        logger.error("Нет страниц для бенчмарка.")
+        return 1
+
+    engines: Dict[str, Callable[[str], str]] = {
+        "bs4": legacy_extract,
+        "lxml": lambda html: extract_html_text(html, max_chars=None).text,
+        "lxml_capped": lambda html: extract_html_text(html, max_chars=args.max_chars).text,
+    }
+    for func in engines.values():
+        func(pages[0][1])  # импорт библиотек не должен попадать в замеры
+
+    rows: List[Dict[str, Any]] = []
+    for name, html in pages:
+        row: Dict[str, Any] = {"page": name, "html_kb": round(len(html.encode("utf-8")) / 1024, 1)}
+        for engine, func in engines.items():
+            wall_ms, cpu_ms, text = measure(func, html, args.repeat)
+            row[engine] = {"ms": round(wall_ms, 2), "cpu_ms": round(cpu_ms, 2), "chars": len(text)}
+        row["speedup"] = round(row["bs4"]["ms"] / row["lxml"]["ms"], 1) if row["lxml"]["ms"] else None
+        rows.append(row)
+
+    print(f"{'страница':<34} {'HTML, КБ':>9} {'bs4, мс':>9} {'lxml, мс':>9} {'x':>6} {'bs4 симв':>10} {'lxml симв':>10} {'лимит, мс':>10}")
+    for row in rows:
+        print(
+            f"{row['page'][:34]:<34} {row['html_kb']:>9} {row['bs4']['ms']:>9} {row['lxml']['ms']:>9} {row['speedup']:>6} "
+            f"{row['bs4']['chars']:>10} {row['lxml']['chars']:>10} {row['lxml_capped']['ms']:>10}"
+        )
+    total_bs4 = sum(row["bs4"]["cpu_ms"] for row in rows)
+    total_lxml = sum(row["lxml"]["cpu_ms"] for row in rows)
+    print(f"Процессорное время всего: bs4 {total_bs4:.0f} мс, lxml {total_lxml:.0f} мс (x{total_bs4 / max(total_lxml, 1e-9):.1f})")
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"max_chars": args.max_chars, "repeat": args.repeat, "pages": rows}, f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.getLogger("src").setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""
+Офлайн-бенчмарк задержек пайплайна: вопросы из Q&A-корпусов прогоняются через run_query_flow,
+а Tavily, загрузка страниц и LLM заменены детерминированными локальными заглушками с настраиваемой
+задержкой. Эмбеддинги по умолчанию тоже заглушка (hashing trick), поэтому сеть не нужна.
+Результат — перцентили p50/p95/p99 по этапам (спаны src/utils/tracing.py) в JSON, который можно
+сравнивать между коммитами.
+
+Запуск из корня проекта:
+    python scripts/benchmark_pipeline.py --sample 50 --output data/benchmarks/pipeline.json
+    python scripts/benchmark_pipeline.py --embeddings model --concurrency 4
+    python scripts/benchmark_pipeline.py --compare data/benchmarks/old.json data/benchmarks/new.json
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import requests
+from requests.adapters import BaseAdapter
+from langchain_core.embeddings import Embeddings
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import settings  # noqa: E402
+from src.agent import executor, tools  # noqa: E402
+from src.agent.prompts import (  # noqa: E402
+    DECIDE_SEARCH_PROMPT_TEMPLATE,
+    GENERATE_SEARCH_QUERY_PROMPT_TEMPLATE,
+    PLAN_SEARCH_PROMPT_TEMPLATE,
+    SYNTHESIZE_ANSWER_PROMPT_TEMPLATE,
+)
+from src.agent.scheduler import InferenceScheduler, ScheduledLLM  # noqa: E402
+from src.utils.tracing import Span, add_span_listener, remove_span_listener  # noqa: E402
+
+logger = logging.getLogger("benchmark_pipeline")
+
+STAGE_ORDER = [
+    "embed_query", "answer_cache", "faq", "route", "plan", "decide", "generate_query", "index",
+    "search", "fetch", "extract", "clean", "chunk", "embed", "rank", "synthesize",
+]
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class BenchmarkLLM:
+    """
+    Детерминированная замена LLM: распознает промпт по первой строке шаблона и возвращает
+    правдоподобный ответ (план поиска в JSON, YES, поисковый запрос, ответ с источником)
+    после заданной задержки. Поддерживает invoke / ainvoke / stream, как LlamaCpp.
+    """
+
+    def __init__(self, planning_latency_ms: float, synthesis_latency_ms: float, answer_chars: int):
+        self.planning_latency = planning_latency_ms / 1000
+        self.synthesis_latency = synthesis_latency_ms / 1000
+        self.answer_chars = answer_chars
+        self._kinds = [
+            (PLAN_SEARCH_PROMPT_TEMPLATE.split("\n", 1)[0], "plan"),
+            (DECIDE_SEARCH_PROMPT_TEMPLATE.split("\n", 1)[0], "decide"),
+            (GENERATE_SEARCH_QUERY_PROMPT_TEMPLATE.split("\n", 1)[0], "generate"),
+            (SYNTHESIZE_ANSWER_PROMPT_TEMPLATE.split("\n", 1)[0], "synthesize"),
+        ]
+
+    def _kind(self, prompt: str) -> str:
+        for prefix, kind in self._kinds:
+            if prompt.startswith(prefix):
+                return kind
+        return "synthesize"
+
+    def _search_query(self, prompt: str) -> str:
+        words = _WORD_RE.findall(prompt.rsplit("Запрос пользователя:", 1)[-1])
+        return " ".join(words[:8]) + " 44-ФЗ"
+
+    def _respond(self, prompt: str) -> str:
+        kind = self._kind(prompt)
+        if kind == "plan":
+            return json.dumps({"search": "YES", "query": self._search_query(prompt)}, ensure_ascii=False)
+        if kind == "decide":
+            return "YES"
+        if kind == "generate":
+            return self._search_query(prompt)
+        sources = re.findall(r"источник: ([^,)\n]+)", prompt)[:2]
+        body = ("Согласно положениям 44-ФЗ, заказчик обязан соблюдать порядок проведения закупки. " * 40)[:self.answer_chars]
+        return f"{body}\n\nИсточники: {', '.join(sources) or 'нет'}"
+
+    def _latency(self, prompt: str) -> float:
+        return self.synthesis_latency if self._kind(prompt) == "synthesize" else self.planning_latency
+
+    def invoke(self, prompt: str, **kwargs: Any) -> str:
+        time.sleep(self._latency(prompt))
+        return self._respond(prompt)
+
+    async def ainvoke(self, prompt: str, **kwargs: Any) -> str:
+        await asyncio.sleep(self._latency(prompt))
+        return self._respond(prompt)
+
+    def stream(self, prompt: str, **kwargs: Any) -> Iterator[str]:
+        words = self._respond(prompt).split(" ")
+        delay = self._latency(prompt) / max(1, len(words))
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            yield word if i == 0 else " " + word
+
+
+class HashingEmbeddings(Embeddings):
+    """Детерминированные эмбеддинги без модели (hashing trick по словам), для запуска без сети."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            h = _stable_hash(word)
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class BenchmarkTavilyClient:
+    """Замена TavilyClient: детерминированный список URL на нескольких «доменах» после задержки."""
+
+    def __init__(self, latency_ms: float, hosts: int = 3, pages: int = 200):
+        self.latency = latency_ms / 1000
+        self.hosts = hosts
+        self.pages = pages
+
+    def search(self, query: str, max_results: int = 5, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        h = _stable_hash(query)
+        results = []
+        for i in range(max_results):
+            page = (h + i * 7919) % self.pages
+            results.append({
+                "url": f"https://bench{(h + i) % self.hosts}.example/docs/{page}",
+                "title": f"Документ {page}",
+                "content": f"Фрагмент документа {page} по запросу {query[:50]}",
+            })
+        return {"results": results}
+
+
+class BenchmarkWeb(BaseAdapter):
+    """
+    Транспорт общего HTTP-пула вместо сети: HTML-страницы из текстов корпуса с типичной разметкой
+    (навигация, скрипты, футер). Чтение тела, лимиты размера и статистика пула работают как обычно.
+    """
+
+    def __init__(self, corpus_texts: List[str], latency_ms: float, page_kb: int):
+        super().__init__()
+        self.corpus_texts = corpus_texts
+        self.latency = latency_ms / 1000
+        self.page_chars = page_kb * 1024
+
+    def page_html(self, url: str) -> str:
+        rng = random.Random(_stable_hash(url))
+        paragraphs, size = [], 0
+        while size < self.page_chars:
+            text = rng.choice(self.corpus_texts)
+            paragraphs.append(f"<p>{text}</p>")
+            size += len(text)
+        nav = "".join(f"<li><a href='/section/{i}'>Раздел {i}</a></li>" for i in range(30))
+        return (
+            f"<html lang='ru'><head><title>{url}</title><meta name='description' content='Бенчмарк'>"
+            f"<script>var analytics = {{id: {rng.randint(1, 10**6)}}};</script><style>p {{margin: 0}}</style></head>"
+            f"<body><header><nav><ul>{nav}</ul></nav></header><main><article>{''.join(paragraphs)}</article></main>"
+            f"<aside>Популярное</aside><footer>© Бенчмарк</footer></body></html>"
+        )
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response.headers["Content-Type"] = "text/html; charset=utf-8"
+        response.raw = io.BytesIO(self.page_html(request.url).encode("utf-8"))
+        response.encoding = "utf-8"
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class StageCollector:
+    """Собирает длительности завершенных спанов по этапам."""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = {}
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def __call__(self, finished: Span) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.durations.setdefault(finished.name, []).append(finished.duration_ms)
+
+
+def load_questions(qa_files: List[str]) -> List[Dict[str, str]]:
+    records: Dict[str, str] = {}
+    for qa_file in qa_files:
+        with open(qa_file, "r", encoding="utf-8") as f:
+            for record in json.load(f):
+                question = str(record.get("question", "")).strip()
+                if question:
+                    records.setdefault(question, str(record.get("text", "")))
+    return [{"question": q, "text": t} for q, t in records.items()]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": int(len(values)),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "total_ms": round(float(values.sum()), 3),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def install_stand_ins(args: argparse.Namespace, corpus_texts: List[str]) -> None:
+    """Подменяет внешние зависимости пайплайна заглушками и отключает кеши, искажающие замеры."""
+    settings.cache.answer_cache_enabled = False
+    settings.tools.local_index_enabled = args.local_index
+    settings.tools.search_router_enabled = args.router
+    # Вопросы бенчмарка взяты из тех же выгрузок, что и база типовых вопросов: с ней все ответы шли бы в обход поиска.
+    settings.tools.faq_enabled = args.faq
+    settings.use_query_planner = not args.no_planner
+    tools.search_cache = None
+    tools.page_cache = None
+
+    if args.embeddings == "hash":
+        embeddings = HashingEmbeddings()
+        executor.load_embedding_model = lambda: embeddings
+        tools.load_cached_embedding_model = lambda: embeddings
+
+    tavily = BenchmarkTavilyClient(args.search_latency_ms)
+    tools.get_tavily_clients = lambda: (tavily, None)
+    web = BenchmarkWeb(corpus_texts, args.fetch_latency_ms, args.page_kb)
+    tools.get_http_client().session.mount("http://", web)
+    tools.get_http_client().session.mount("https://", web)
+
+    llm: Any = BenchmarkLLM(args.llm_latency_ms, args.synthesis_latency_ms, args.answer_chars)
+    if args.scheduler:
+        llm = ScheduledLLM(InferenceScheduler(llm, max_queue_depth=max(32, args.concurrency * 4)))
+    executor._llm_instance = llm
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    records = load_questions(settings.tools.router_qa_files)
+    if not records:
+        raise RuntimeError("Не найдено вопросов в Q&A-корпусах.")
+    install_stand_ins(args, [r["text"] for r in records if r["text"]])
+
+    rng = random.Random(args.seed)
+    questions = [r["question"] for r in records]
+    sample = rng.sample(questions, min(args.sample, len(questions))) if args.sample else questions
+    collector = StageCollector()
+    add_span_listener(collector)
+
+    def run_one(question: str) -> float:
+        started = time.perf_counter()
+        executor.run_query_flow(question, session_id="benchmark")
+        return (time.perf_counter() - started) * 1000
+
+    try:
+        for question in sample[:args.warmup]:
+            run_one(question)
+        collector.enabled = True
+        logger.info(f"Прогон {len(sample)} вопросов (параллельно: {args.concurrency})...")
+        wall_started = time.perf_counter()
+        if args.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                query_times = list(pool.map(run_one, sample))
+        else:
+            query_times = [run_one(question) for question in sample]
+        wall_time = time.perf_counter() - wall_started
+    finally:
+        remove_span_listener(collector)
+
+    stages = {name: summarize(collector.durations[name]) for name in STAGE_ORDER if name in collector.durations}
+    stages.update({name: summarize(values) for name, values in collector.durations.items() if name not in stages})
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "queries": len(sample),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_qps": round(len(sample) / wall_time, 3) if wall_time else None,
+        "query": summarize(query_times),
+        "stages": stages,
+        "http": tools.get_http_stats(),
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Печатает изменение p50/p95 по этапам между двумя результатами бенчмарка."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    rows = [("query", old.get("query"), new.get("query"))]
+    names = list(dict.fromkeys(list(old["stages"]) + list(new["stages"])))
+    rows += [(name, old["stages"].get(name), new["stages"].get(name)) for name in names]
+    print(f"{'этап':<16}{'p50 было':>12}{'p50 стало':>12}{'Δ%':>8}{'p95 было':>12}{'p95 стало':>12}{'Δ%':>8}")
+    for name, before, after in rows:
+        cells = []
+        for key in ("p50_ms", "p95_ms"):
+            b = before.get(key) if before else None
+            a = after.get(key) if after else None
+            delta = f"{(a - b) / b * 100:+.1f}" if a is not None and b else "-"
+            cells += [f"{b:.1f}" if b is not None else "-", f"{a:.1f}" if a is not None else "-", delta]
+        print(f"{name:<16}{cells[0]:>12}{cells[1]:>12}{cells[2]:>8}{cells[3]:>12}{cells[4]:>12}{cells[5]:>8}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк задержек пайплайна по этапам.")
+    parser.add_argument("--sample", type=int, default=50, help="Кол-во вопросов из корпуса (0 = все)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--warmup", type=int, default=2, help="Кол-во первых вопросов, не попадающих в замеры")
+    parser.add_argument("--concurrency", type=int, default=1, help="Кол-во одновременно обрабатываемых вопросов")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Задержка заглушки LLM на вызовах планирования")
+    parser.add_argument("--synthesis-latency-ms", type=float, default=800.0, help="Задержка заглушки LLM на синтезе ответа")
+    parser.add_argument("--answer-chars", type=int, default=1200, help="Длина ответа заглушки LLM")
+    parser.add_argument("--search-latency-ms", type=float, default=300.0, help="Задержка заглушки Tavily")
+    parser.add_argument("--fetch-latency-ms", type=float, default=150.0, help="Задержка загрузки одной страницы")
+    parser.add_argument("--page-kb", type=int, default=40, help="Размер текста страницы (КБ)")
+    parser.add_argument("--embeddings", choices=["hash", "model"], default="hash", help="hash — заглушка без сети, model — модель из настроек")
+    parser.add_argument("--local-index", action="store_true", help="Использовать локальный индекс законов (нужен --embeddings model)")
+    parser.add_argument("--router", action="store_true", help="Использовать классификатор необходимости поиска (нужен --embeddings model)")
+    parser.add_argument("--faq", action="store_true", help="Использовать базу типовых вопросов (нужен --embeddings model и построенный индекс)")
+    parser.add_argument("--no-planner", action="store_true", help="Отдельные вызовы DECIDE и GENERATE вместо планировщика")
+    parser.add_argument("--scheduler", action="store_true", help="Вызовы LLM через очередь InferenceScheduler")
+    parser.add_argument("--output", help="Путь для сохранения результата в JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Сравнить два сохраненных результата")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    for noisy in ("src", "httpx"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    report = run_benchmark(args)
+    report_json = json.dumps(report, ensure_ascii=False, indent=2)
+    print(report_json)
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_text(report_json, encoding="utf-8")
+        logger.info(f"Результат сохранен в {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Бенчмарк хранилищ векторов локального индекса (src/agent/vector_store.py): точные float32-векторы
+против int8 скалярного квантования, product quantization и PCA, полный перебор против HNSW и IVF.
+
+Документы — фрагменты локального индекса (законы, ответы на вопросы, справочные материалы),
+запросы — вопросы из выгрузок вопрос-ответ. Для каждого хранилища считаются размер кодов и файла,
+время построения, задержка поиска одного запроса, recall@1 и recall@k относительно точного поиска
+и ошибка лучшей близости (от нее зависят пороги local_index_min_score). Для HNSW и IVF замеры
+повторяются для каждого значения efSearch (--ef-search) и nprobe (--nprobe).
+
+Корпус в репозитории — несколько тысяч фрагментов; --synthetic-size дополняет его до заданного
+числа векторов копиями документов со случайным шумом, чтобы оценить движки на больших корпусах.
+
+Запуск из корня проекта:
+    python scripts/benchmark_vector_store.py
+    python scripts/benchmark_vector_store.py --save-vectors data/benchmarks/vectors   # сохранить эмбеддинги
+    python scripts/benchmark_vector_store.py --vectors-dir data/benchmarks/vectors --stores flat sq8 pq48 "pca192,sq8"
+    python scripts/benchmark_vector_store.py --vectors-dir data/benchmarks/vectors --synthetic-size 200000 \
+        --stores flat hnsw32,flat ivf,sq8 --ef-search 16 64 256 --nprobe 1 8 32
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import settings  # noqa: E402
+from src.agent.corpora import load_qa_documents  # noqa: E402
+from src.agent.local_index import EMBED_BATCH_SIZE, prepare_local_documents  # noqa: E402
+from src.agent.retrieval import normalize_rows, top_k_indices  # noqa: E402
+from src.agent.vector_store import build_vector_store, load_vector_store, parse_vector_spec  # noqa: E402
+
+logger = logging.getLogger("benchmark_vector_store")
+
+DEFAULT_STORES = [
+    "flat", "sq8", "pq96", "pq48", "pca192,sq8", "pca192,pq48",
+    "hnsw32,flat", "hnsw32,sq8", "ivf,flat", "ivf,sq8", "ivf,pq48",
+]
+
+
+def embed(texts: List[str]) -> np.ndarray:
+    from src.agent.models import load_embedding_model
+
+    model = load_embedding_model()
+    batches = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batches.append(np.asarray(model.embed_documents(texts[start:start + EMBED_BATCH_SIZE]), dtype=np.float32))
+        logger.info(f"Векторизовано {min(start + EMBED_BATCH_SIZE, len(texts))}/{len(texts)} текстов.")
+    return normalize_rows(np.vstack(batches))
+
+
+def load_vectors(args: argparse.Namespace) -> Tuple[np.ndarray, np.ndarray]:
+    """Векторы документов и запросов: из --vectors-dir или эмбеддингами текущей модели."""
+    if args.vectors_dir:
+        directory = Path(args.vectors_dir)
+        return np.load(directory / "documents.npy"), np.load(directory / "queries.npy")
+    texts, _ = prepare_local_documents(settings.tools.statute_files, settings.tools.local_corpus_qa_files, settings.tools.local_corpus_md_files)
+    questions = list(dict.fromkeys(metadata["question"] for _, metadata in load_qa_documents(settings.tools.router_qa_files)))
+    documents, queries = embed(texts), embed(questions)
+    if args.save_vectors:
+        directory = Path(args.save_vectors)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "documents.npy", documents)
+        np.save(directory / "queries.npy", queries)
+        logger.info(f"Эмбеддинги сохранены в {directory}")
+    return documents, queries
+
+
+def synthesize(documents: np.ndarray, size: int, noise: float, seed: int = 0) -> np.ndarray:
+    """Дополняет корпус до size векторов копиями случайных документов с гауссовым шумом (после нормировки)."""
+    if size <= len(documents):
+        return documents
+    rng = np.random.default_rng(seed)
+    extra = documents[rng.integers(0, len(documents), size - len(documents))]
+    extra = extra + rng.normal(0.0, noise / np.sqrt(documents.shape[1]), extra.shape).astype(np.float32)
+    return np.vstack([documents, normalize_rows(extra)])
+
+
+def measure_search(store, queries: np.ndarray, exact: np.ndarray, exact_scores: np.ndarray, k: int) -> Dict[str, Any]:
+    latencies, hits_at_1, hits_at_k, score_errors = [], 0, 0, []
+    for query, truth, truth_scores in zip(queries, exact, exact_scores):
+        started = time.perf_counter()
+        results = store.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = [position for position, _ in results]
+        hits_at_1 += bool(found) and found[0] == truth[0]
+        hits_at_k += len(set(found) & set(truth.tolist()))
+        if results:
+            score_errors.append(abs(results[0][1] - float(truth_scores[0])))
+    count = len(queries)
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "recall_at_1": round(hits_at_1 / count, 4),
+        f"recall_at_{k}": round(hits_at_k / (count * k), 4),
+        "top1_score_error": round(statistics.mean(score_errors), 4) if score_errors else None,
+    }
+
+
+def evaluate(spec: str, documents: np.ndarray, queries: np.ndarray, exact: np.ndarray, exact_scores: np.ndarray,
+             k: int, ef_search: List[int], nprobe: List[int]) -> List[Dict[str, Any]]:
+    """Строки результатов хранилища: одна на каждое значение параметра поиска (efSearch/nprobe) или одна для остальных."""
+    config = parse_vector_spec(spec)
+    started = time.perf_counter()
+    store = build_vector_store(documents, config)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "store"
+        store.save(path)
+        file_bytes = sum(f.stat().st_size for f in Path(directory).iterdir())
+        store = load_vector_store(path, store.spec)  # поиск по отображенному в память файлу, как в приложении
+        sweep = [("efSearch", value) for value in ef_search] if config.engine == "hnsw" else \
+                [("nprobe", value) for value in nprobe] if config.engine == "ivf" else [("", None)]
+        for parameter, value in sweep:
+            store.set_search_params(**({"ef_search": value} if parameter == "efSearch" else {"nprobe": value} if parameter else {}))
+            rows.append({
+                "store": store.spec,
+                "search_param": f"{parameter}={value}" if parameter else "",
+                "code_bytes_per_vector": round(store.nbytes / max(len(documents), 1), 1),
+                "file_mb": round(file_bytes / 1024 / 1024, 2),
+                "build_ms": round(build_ms, 1),
+                **measure_search(store, queries, exact, exact_scores, k),
+            })
+        del store
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение хранилищ векторов: память против recall относительно точного поиска.")
+    parser.add_argument("--stores", nargs="+", default=DEFAULT_STORES, help="Хранилища: flat, sq8, pq<M>, pca<D>,<...>")
+    parser.add_argument("--k", type=int, default=10, help="Глубина для recall@k")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256], help="Значения efSearch для HNSW")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32], help="Значения nprobe для IVF")
+    parser.add_argument("--synthetic-size", type=int, default=0, help="Дополнить корпус зашумленными копиями документов до стольких векторов")
+    parser.add_argument("--synthetic-noise", type=float, default=0.5, help="Норма шума синтетических векторов (относительно единичной длины)")
+    parser.add_argument("--vectors-dir", help="Каталог с documents.npy и queries.npy (без загрузки модели эмбеддингов)")
+    parser.add_argument("--save-vectors", help="Сохранить посчитанные эмбеддинги в каталог для повторных запусков")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    documents, queries = load_vectors(args)
+    documents = normalize_rows(np.ascontiguousarray(documents, dtype=np.float32))
+    queries = normalize_rows(np.ascontiguousarray(queries, dtype=np.float32))
+    corpus_size = len(documents)
+    documents = synthesize(documents, args.synthetic_size, args.synthetic_noise)
+    k = min(args.k, len(documents))
+    logger.info(f"Документов: {len(documents)} (синтетических {len(documents) - corpus_size}), запросов: {len(queries)}, размерность: {documents.shape[1]}.")
+
+    similarities = queries @ documents.T
+    exact = np.stack([top_k_indices(row, k) for row in similarities])
+    exact_scores = np.take_along_axis(similarities, exact, axis=1)
+
+    rows: List[Dict[str, Any]] = []
+    for spec in args.stores:
+        try:
+            rows.extend(evaluate(spec, documents, queries, exact, exact_scores, k, args.ef_search, args.nprobe))
+        except (ValueError, ImportError) as e:
+            logger.error(f"Хранилище '{spec}' пропущено: {e}")
+
+    print(f"{'хранилище':<18} {'параметр':<13} {'байт/вект.':>10} {'файл МБ':>8} {'постр. мс':>10} {'p50 мс':>8} {'p95 мс':>8} {'recall@1':>9} {f'recall@{k}':>10} {'ошибка top1':>12}")
+    for row in rows:
+        print(
+            f"{row['store']:<18} {row['search_param']:<13} {row['code_bytes_per_vector']:>10} {row['file_mb']:>8} {row['build_ms']:>10} {row['p50_ms']:>8} "
+            f"{row['p95_ms']:>8} {row['recall_at_1']:>9} {row[f'recall_at_{k}']:>10} {str(row['top1_score_error']):>12}"
+        )
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"documents": len(documents), "synthetic": len(documents) - corpus_size,
+                       "queries": len(queries), "dim": int(documents.shape[1]), "k": k, "stores": rows},
+                      f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.getLogger("src").setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Строит локальный индекс (векторы + BM25) по текстам 44-ФЗ и 223-ФЗ (data/raw/*.txt),
+ответам на вопросы (data/old/data_prev/*.json) и справочным материалам (data/old/data_md/*.md),
+а также индекс типовых вопросов (векторы вопросов с готовыми ответами, src/agent/faq.py).
+
+Запуск из корня проекта:
+    python scripts/build_local_index.py
+    python scripts/build_local_index.py --encoding sq8            # int8-векторы, индекс в 4 раза меньше
+    python scripts/build_local_index.py --encoding pq --pca-dim 192 --pq-m 48
+    python scripts/build_local_index.py --engine hnsw --encoding sq8     # приближенный поиск для больших корпусов
+"""
+import argparse
+import logging
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import settings  # noqa: E402
+from src.agent.faq import FAQ_INDEX_NAME, build_faq_index  # noqa: E402
+from src.agent.local_index import LAW_INDEX_NAME, build_law_index, vector_store_config  # noqa: E402
+from src.agent.models import load_embedding_model  # noqa: E402
+from src.agent.vector_store import VECTOR_ENCODINGS, VECTOR_ENGINES  # noqa: E402
+
+logger = logging.getLogger("build_local_index")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Построение локального индекса законов.")
+    parser.add_argument("--index-dir", default=settings.tools.local_index_dir, help="Каталог для сохранения индекса")
+    parser.add_argument("--encoding", choices=VECTOR_ENCODINGS, default=settings.tools.local_index_encoding, help="Хранение векторов (flat/sq8/pq)")
+    parser.add_argument("--pca-dim", type=int, default=settings.tools.local_index_pca_dim, help="Размерность после PCA (0 — без PCA)")
+    parser.add_argument("--pq-m", type=int, default=settings.tools.local_index_pq_m, help="Число подквантователей PQ")
+    parser.add_argument("--engine", choices=VECTOR_ENGINES, default=settings.tools.local_index_engine, help="Поиск по векторам (flat/hnsw/ivf)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    embedding_model = load_embedding_model()
+    index = build_law_index(
+        embedding_model, settings.embeddings.embedding_model_name, settings.tools.statute_files,
+        qa_files=settings.tools.local_corpus_qa_files, md_files=settings.tools.local_corpus_md_files,
+        vector_config=replace(
+            vector_store_config(), encoding=args.encoding, engine=args.engine, pca_dim=args.pca_dim, pq_m=args.pq_m,
+        ),
+    )
+    if not index.texts:
+        logger.error("Не удалось подготовить ни одного фрагмента законов, индекс не сохранен.")
+        return 1
+    index.save(args.index_dir, LAW_INDEX_NAME)
+    logger.info(f"Индекс законов построен за {time.perf_counter() - started:.1f} сек.")
+
+    started = time.perf_counter()
+    faq_index = build_faq_index(embedding_model, settings.embeddings.embedding_model_name, settings.tools.local_corpus_qa_files)
+    if faq_index.texts:
+        faq_index.save(args.index_dir, FAQ_INDEX_NAME)
+        logger.info(f"Индекс типовых вопросов построен за {time.perf_counter() - started:.1f} сек.")
+    else:
+        logger.warning("Нет ни одного типового вопроса, индекс типовых вопросов не сохранен.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
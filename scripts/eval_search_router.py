@@ -0,0 +1,90 @@
+"""
+Офлайн-оценка классификатора необходимости поиска против решения LLM (DECIDE_SEARCH_PROMPT):
+согласие решений, доля запросов, решаемых без LLM, и сэкономленное время.
+
+Запуск из корня проекта (классификатор должен быть обучен scripts/train_search_router.py):
+    python scripts/eval_search_router.py --sample 100
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import settings  # noqa: E402
+from src.agent.executor import decide_search, get_llm  # noqa: E402
+from src.agent.models import load_cached_embedding_model  # noqa: E402
+from src.agent.router import get_search_router, load_router_dataset  # noqa: E402
+
+logger = logging.getLogger("eval_search_router")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Оценка классификатора необходимости поиска против LLM.")
+    parser.add_argument("--sample", type=int, default=100, help="Кол-во запросов для оценки (0 = все)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Путь для сохранения отчета в JSON")
+    args = parser.parse_args()
+
+    router = get_search_router()
+    if router is None:
+        logger.error("Классификатор не загружен. Запустите scripts/train_search_router.py.")
+        return 1
+
+    texts, _ = load_router_dataset(settings.tools.router_qa_files, settings.tools.router_no_search_file)
+    if args.sample and args.sample < len(texts):
+        texts = random.Random(args.seed).sample(texts, args.sample)
+
+    embedding_model = load_cached_embedding_model()
+    llm = get_llm()
+    min_confidence = settings.tools.search_router_min_confidence
+    llm_decisions, router_probabilities, llm_seconds, router_seconds, embed_seconds = [], [], [], [], []
+    for text in texts:
+        started = time.perf_counter()
+        query_vector = np.asarray(embedding_model.embed_query(text), dtype=np.float32)
+        embed_seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        router_probabilities.append(float(router.predict_proba(query_vector)[0]))
+        router_seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        llm_decisions.append(decide_search(llm, text))
+        llm_seconds.append(time.perf_counter() - started)
+
+    probabilities = np.asarray(router_probabilities)
+    router_decisions = probabilities >= 0.5
+    llm_decisions = np.asarray(llm_decisions)
+    confident = np.maximum(probabilities, 1.0 - probabilities) >= min_confidence
+    agree = router_decisions == llm_decisions
+    mean_llm = float(np.mean(llm_seconds))
+    report = {
+        "queries": len(texts),
+        "llm_yes_rate": float(np.mean(llm_decisions)),
+        "agreement": float(np.mean(agree)),
+        "min_confidence": min_confidence,
+        "coverage": float(np.mean(confident)),
+        "agreement_confident": float(np.mean(agree[confident])) if confident.any() else None,
+        "llm_decide_ms_mean": mean_llm * 1000,
+        "llm_decide_ms_p50": float(np.percentile(llm_seconds, 50)) * 1000,
+        "router_ms_mean": float(np.mean(router_seconds)) * 1000,
+        # Эмбеддинг запроса в run_query_flow считается в любом случае (кеш ответов, локальная база),
+        # поэтому в сэкономленное время он не входит.
+        "query_embedding_ms_mean": float(np.mean(embed_seconds)) * 1000,
+        "saved_ms_per_query": float(np.mean(confident)) * mean_llm * 1000 - float(np.mean(router_seconds)) * 1000,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Обучает классификатор необходимости поиска (логистическая регрессия над эмбеддингами запросов)
+на вопросах из Q&A-корпусов (data/old/data_prev/*.json) и запросах без поиска (data/raw/no_search_queries.txt).
+
+Запуск из корня проекта:
+    python scripts/train_search_router.py
+    python scripts/train_search_router.py --label-with-llm   # метки берутся из решения LLM (DECIDE_SEARCH_PROMPT)
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import settings  # noqa: E402
+from src.agent.models import load_cached_embedding_model  # noqa: E402
+from src.agent.router import SearchRouter, load_router_dataset  # noqa: E402
+
+logger = logging.getLogger("train_search_router")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Обучение классификатора необходимости поиска.")
+    parser.add_argument("--index-dir", default=settings.tools.local_index_dir, help="Каталог для сохранения классификатора")
+    parser.add_argument("--label-with-llm", action="store_true", help="Разметить вопросы решением LLM вместо меток по источнику")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Доля отложенной выборки для оценки")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from sklearn.metrics import classification_report
+    from sklearn.model_selection import train_test_split
+
+    texts, labels = load_router_dataset(settings.tools.router_qa_files, settings.tools.router_no_search_file)
+    if args.label_with_llm:
+        from src.agent.executor import decide_search, get_llm
+
+        llm = get_llm()
+        started = time.perf_counter()
+        labels = [int(decide_search(llm, text)) for text in texts]
+        logger.info(f"Разметка LLM: {len(texts)} запросов за {time.perf_counter() - started:.1f} сек., доля YES {np.mean(labels):.2f}.")
+    if len(set(labels)) < 2:
+        logger.error("В выборке только один класс, обучение невозможно.")
+        return 1
+
+    started = time.perf_counter()
+    vectors = np.asarray(load_cached_embedding_model().embed_documents(texts), dtype=np.float32)
+    logger.info(f"Векторизовано {len(texts)} запросов за {time.perf_counter() - started:.1f} сек.")
+
+    model_name = settings.embeddings.embedding_model_name
+    train_x, test_x, train_y, test_y = train_test_split(
+        vectors, labels, test_size=args.test_size, random_state=args.seed, stratify=labels
+    )
+    holdout_router = SearchRouter.train(train_x, train_y, model_name)
+    predicted = (holdout_router.predict_proba(test_x) >= 0.5).astype(int)
+    print(classification_report(test_y, predicted, target_names=["NO", "YES"], digits=3))
+
+    router = SearchRouter.train(vectors, labels, model_name)
+    router.save(args.index_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
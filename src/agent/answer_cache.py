@@ -0,0 +1,120 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SOURCE_RE = re.compile(r"источник: ([^,)\n]+)")
+
+
+@dataclass
+class CachedAnswer:
+    """Закешированный ответ на вопрос."""
+    question: str
+    answer: str
+    sources: List[str] = field(default_factory=list)
+    created_at: float = 0.0
+    score: float = 0.0
+
+    def text_with_sources(self) -> str:
+        """Ответ со списком источников, на которых он основан (кроме уже указанных в тексте ответа)."""
+        missing = [source for source in self.sources if source not in self.answer]
+        if not missing:
+            return self.answer
+        return self.answer + "\n\nИсточники:\n" + "\n".join(f"- {source}" for source in missing)
+
+
+def extract_sources(search_results_context: str) -> List[str]:
+    """Извлекает уникальные источники (URL / ссылки на статьи) из контекста поиска."""
+    return list(dict.fromkeys(s.strip() for s in _SOURCE_RE.findall(search_results_context or "")))
+
+
+class SemanticAnswerCache:
+    """
+    Семантический кеш ответов: находит ранее отвеченный вопрос, близкий к новому
+    (косинусная близость >= threshold), и возвращает сохраненный ответ.
+    Векторы хранятся в заранее выделенной матрице float16 (max_entries x dim); при заполнении
+    перезаписывается самая старая запись. Записи старше ttl_seconds не используются.
+    Один экземпляр на процесс — общий для всех сессий Streamlit.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 21600, threshold: float = 0.92):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._created_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._entries: List[Optional[CachedAnswer]] = [None] * self.max_entries
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_vector: np.ndarray) -> Optional[CachedAnswer]:
+        """Возвращает ближайший непросроченный ответ с близостью не ниже порога, иначе None."""
+        query = self._normalize(query_vector)
+        with self._lock:
+            if self._vectors is None or self._size == 0:
+                self.misses += 1
+                return None
+            scores = self._vectors[:self._size].astype(np.float32) @ query
+            scores[time.time() - self._created_at[:self._size] >= self.ttl_seconds] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry = self._entries[best]
+            return CachedAnswer(entry.question, entry.answer, list(entry.sources), entry.created_at, float(scores[best]))
+
+    def add(self, question: str, query_vector: np.ndarray, answer: str, sources: Optional[List[str]] = None) -> None:
+        vector = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float16)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._created_at))
+            self._vectors[slot] = vector
+            self._created_at[slot] = now
+            self._entries[slot] = CachedAnswer(question, answer, list(sources or []), now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0, "entries": self._size}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Возвращает общий для процесса кеш ответов (None, если он отключен в настройках)."""
+    global _answer_cache
+    if not settings.cache.answer_cache_enabled:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                max_entries=settings.cache.answer_cache_max_entries,
+                ttl_seconds=settings.cache.answer_cache_ttl_seconds,
+                threshold=settings.cache.answer_cache_threshold,
+            )
+        return _answer_cache
@@ -0,0 +1,113 @@
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.agent.retrieval import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Слова, числа и составные обозначения ("7.30", "24.2", "44-фз") целиком: номера статей и частей — самые точные термины.
+_TOKEN_RE = re.compile(r"[0-9a-zа-яё]+(?:[.\-][0-9a-zа-яё]+)*")
+# Служебные слова не несут смысла для поиска и раздувают списки вхождений. "ч", "ст", "п" сюда не входят —
+# они нужны для ссылок вида "ч. 15 ст. 99".
+STOP_WORDS = frozenset(
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от "
+    "меня еще нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас нибудь опять уж вам ведь "
+    "там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз "
+    "тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы "
+    "нее сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше тот через эти "
+    "нас про всего них какая много разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя "
+    "такой им более всегда конечно всю между также который которые которых которой является".split()
+)
+
+
+@lru_cache(maxsize=1)
+def _get_stemmer():
+    from nltk.stem.snowball import SnowballStemmer
+    return SnowballStemmer("russian")
+
+
+@lru_cache(maxsize=200_000)
+def _stem(word: str) -> str:
+    return _get_stemmer().stem(word) if not word[0].isdigit() else word
+
+
+def tokenize(text: str) -> List[str]:
+    """Токены для BM25: нижний регистр, ё -> е, без служебных слов, основы по стеммеру Snowball (русский)."""
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower().replace("ё", "е")) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 в компактных массивах: для каждого термина — срез doc_ids (int32)
+    и заранее посчитанных весов BM25 (float32) в общих массивах, границы срезов — в offsets.
+    Поиск суммирует веса вхождений терминов запроса одним np.bincount.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray, doc_count: int):
+        self.terms: Dict[str, int] = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.doc_count = doc_count
+
+    @classmethod
+    def build(cls, texts: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        df = np.array([len(postings[term]) for term in terms], dtype=np.int64)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        pairs = np.array([pair for term in terms for pair in postings[term]], dtype=np.int64).reshape(-1, 2)
+        doc_ids, tf = pairs[:, 0].astype(np.int32), pairs[:, 1].astype(np.float32)
+
+        doc_count = len(texts)
+        avg_length = float(lengths.mean()) if doc_count else 1.0
+        idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[doc_ids] / max(avg_length, 1e-9))
+        weights = (np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        logger.info(f"BM25: Индекс построен: документов {doc_count}, терминов {len(terms)}, вхождений {len(doc_ids)}.")
+        return cls(terms, offsets, doc_ids, weights, doc_count)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (позиция документа, оценка BM25) по убыванию оценки; документы без совпадений не возвращаются."""
+        term_ids = {self.terms[token] for token in tokenize(query) if token in self.terms}
+        if not term_ids:
+            return []
+        slices = [slice(self.offsets[i], self.offsets[i + 1]) for i in term_ids]
+        scores = np.bincount(
+            np.concatenate([self.doc_ids[s] for s in slices]),
+            weights=np.concatenate([self.weights[s] for s in slices]),
+            minlength=self.doc_count,
+        )
+        matched = np.flatnonzero(scores)
+        top = matched[top_k_indices(scores[matched], k)]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: Path) -> None:
+        terms = "\n".join(sorted(self.terms, key=self.terms.get)).encode("utf-8")
+        np.savez(
+            path, offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights,
+            terms=np.frombuffer(terms, dtype=np.uint8), doc_count=np.array(self.doc_count),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path) as data:
+            terms = data["terms"].tobytes().decode("utf-8")
+            return cls(terms.split("\n") if terms else [], data["offsets"], data["doc_ids"], data["weights"], int(data["doc_count"]))
+
+
+__all__ = ["BM25Index", "STOP_WORDS", "tokenize"]
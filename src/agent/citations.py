@@ -0,0 +1,255 @@
+import logging
+import math
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.agent.bm25 import tokenize
+from src.agent.prompts import synthesis_context_chars
+from src.agent.statutes import StatuteUnit, load_statutes, parse_statute
+from src.utils.text_chunker import TextChunker
+
+logger = logging.getLogger(__name__)
+
+_NUMBER = r"\d+(?:\.\d+)*"
+# Элемент ссылки: "ст. 34", "статьи 34", "ч. 5", "части 5", "п. 2", "пункта 2".
+_TOKEN = rf"(?<![а-яёa-z])(?:ст(?:ать[а-яё]*|\.)?|ч(?:аст[а-яё]*|\.)|п(?:ункт[а-яё]*|\.))\s*{_NUMBER}"
+_CHAIN_RE = re.compile(rf"{_TOKEN}(?:[\s,]+{_TOKEN})*", re.IGNORECASE)
+_TOKEN_RE = re.compile(rf"(?<![а-яёa-z])(?P<kind>с|ч|п)[а-яё.]*\s*(?P<number>{_NUMBER})", re.IGNORECASE)
+# Упоминания законов номером ("44-ФЗ", "44 ФЗ", "ФЗ-44", "ФЗ № 223") и названием.
+_LAW_NAMES = {
+    "44-ФЗ": r"о\s+контрактной\s+системе",
+    "223-ФЗ": r"о\s+закупках\s+товаров,?\s+работ,?\s+услуг\s+отдельными\s+видами",
+}
+# Другие нормативные акты: ссылка без явного указания закона относится к ним, а не к 44-ФЗ/223-ФЗ.
+_OTHER_ACT_RE = re.compile(r"(?<![а-яё])(?:коап|гк|нк|тк|бк|ук|кодекс|постановлени|приказ)|\d+\s*-?\s*фз", re.IGNORECASE)
+# Насколько далеко от ссылки может стоять номер закона: после ("ст. 34 Федерального закона от ... № 44-ФЗ") и до ("в 44-ФЗ ст. 34").
+LAW_AFTER_CHARS = 80
+LAW_BEFORE_CHARS = 30
+# Слова, которыми вопрос ссылается на положение или спрашивает о нем вообще, а не говорит, что в нем ищется.
+_REFERENCE_TERMS = frozenset(tokenize("статья часть пункт закон федеральный говорит гласит сказано написано означает содержание текст положение норма редакция какие каков последний действующий актуальный"))
+# Длинное положение делится на окна такой длины, в контекст идут окна со словами вопроса.
+FRAGMENT_CHARS = 700
+FRAGMENT_SEPARATOR = "\n[...]\n"
+CONTEXT_HEADER = "Точный текст положений законов, на которые ссылается вопрос (локальная база):\n"
+CONTEXT_SEPARATOR = "\n\n"
+
+
+@dataclass(frozen=True)
+class Citation:
+    """Ссылка на положение закона из текста вопроса."""
+    law: str
+    article: str
+    part: Optional[str] = None
+    item: Optional[str] = None
+
+
+@lru_cache(maxsize=8)
+def _law_patterns(laws: Tuple[str, ...]) -> List[Tuple[str, "re.Pattern"]]:
+    patterns = []
+    for law in laws:
+        number = re.match(r"\d+", law)
+        variants = []
+        if number:
+            digits = number.group(0)
+            variants += [rf"(?<!\d){digits}\s*-?\s*фз(?![а-яё])", rf"(?<![а-яё])фз\s*(?:№\s*)?-?\s*{digits}(?!\d)"]
+        if law in _LAW_NAMES:
+            variants.append(_LAW_NAMES[law])
+        if variants:
+            patterns.append((law, re.compile("|".join(variants), re.IGNORECASE)))
+    return patterns
+
+
+def find_citations(query: str, laws: List[str]) -> Optional[List[Citation]]:
+    """
+    Находит в вопросе ссылки на статьи (части, пункты) законов laws.
+    Возвращает None, если ссылок нет или хотя бы одну нельзя однозначно отнести к закону из laws:
+    тогда вопрос обрабатывается обычным путем.
+    """
+    if not any(ch.isdigit() for ch in query):
+        return None
+    chains = list(_CHAIN_RE.finditer(query))
+    if not chains:
+        return None
+    mentions = [(match.start(), match.end(), law) for law, pattern in _law_patterns(tuple(laws)) for match in pattern.finditer(query)]
+    mentioned_laws = {law for _, _, law in mentions}
+    # Без номера закона рядом со ссылкой она относится к единственному упомянутому закону, если других актов в вопросе нет.
+    default_law = None
+    if len(mentioned_laws) == 1 and not _OTHER_ACT_RE.search(_strip_spans(query, mentions)):
+        default_law = next(iter(mentioned_laws))
+
+    citations: List[Citation] = []
+    for chain in chains:
+        numbers: Dict[str, str] = {}
+        for token in _TOKEN_RE.finditer(chain.group(0)):
+            numbers.setdefault(token.group("kind").lower(), token.group("number"))
+        if "с" not in numbers:
+            continue
+        law = _nearest_law(query, chain.start(), chain.end(), mentions) or default_law
+        if law is None:
+            return None
+        citations.append(Citation(law, numbers["с"], numbers.get("ч"), numbers.get("п")))
+    return list(dict.fromkeys(citations)) or None
+
+
+def _nearest_law(query: str, start: int, end: int, mentions: List[Tuple[int, int, str]]) -> Optional[str]:
+    after = [(m_start, law) for m_start, _, law in mentions if end <= m_start <= end + LAW_AFTER_CHARS]
+    if after:
+        m_start, law = min(after)
+        # "ст. 7.30 КоАП за нарушение 44-ФЗ": ссылка относится к акту, названному между ней и законом.
+        return None if _OTHER_ACT_RE.search(query, end, m_start) else law
+    before = [(m_end, law) for _, m_end, law in mentions if start - LAW_BEFORE_CHARS <= m_end <= start]
+    return max(before)[1] if before else None
+
+
+def _strip_spans(text: str, spans: List[Tuple[int, int, str]]) -> str:
+    for start, end, _ in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    return text
+
+
+class StatuteIndex:
+    """
+    Структурный индекс текстов законов: (закон, статья, часть, пункт) -> позиции в тексте.
+    Строится один раз из разбора statutes.parse_statute и отвечает на ссылки из вопросов словарным поиском.
+    """
+
+    def __init__(self, texts: Dict[str, str], units: List[StatuteUnit]):
+        self.texts = texts
+        self.units: Dict[Tuple[str, str, Optional[str], Optional[str]], StatuteUnit] = {}
+        self._items_by_article: Dict[Tuple[str, str, str], List[StatuteUnit]] = {}
+        for unit in units:
+            self.units.setdefault((unit.law, unit.article, unit.part, unit.item), unit)
+            if unit.item:
+                self._items_by_article.setdefault((unit.law, unit.article, unit.item), []).append(unit)
+
+    @classmethod
+    def build(cls, statute_files: Dict[str, str]) -> "StatuteIndex":
+        texts = load_statutes(statute_files)
+        units: List[StatuteUnit] = []
+        for law, text in texts.items():
+            units.extend(parse_statute(text, law))
+        return cls(texts, units)
+
+    @property
+    def laws(self) -> List[str]:
+        return list(self.texts)
+
+    def resolve(self, citation: Citation) -> Optional[StatuteUnit]:
+        """
+        Единица закона по ссылке. Пункт без части ("п. 3 ст. 3") ищется среди пунктов статьи
+        и разрешается, только если пункт с таким номером в статье один.
+        """
+        unit = self.units.get((citation.law, citation.article, citation.part, citation.item))
+        if unit is None and citation.item and citation.part is None:
+            candidates = self._items_by_article.get((citation.law, citation.article, citation.item), [])
+            unit = candidates[0] if len(candidates) == 1 else None
+        return unit
+
+    def unit_text(self, unit: StatuteUnit) -> str:
+        return self.texts[unit.law][unit.start:unit.end]
+
+
+def _query_terms(query: str, laws: List[str]) -> List[str]:
+    """Слова вопроса без самих ссылок, номеров законов и слов вроде "статья", "говорится" — то, что ищется в тексте положения."""
+    text = _CHAIN_RE.sub(" ", query)
+    for _, pattern in _law_patterns(tuple(laws)):
+        text = pattern.sub(" ", text)
+    return [term for term in dict.fromkeys(tokenize(text)) if term not in _REFERENCE_TERMS]
+
+
+def _relevant_fragments(body: str, terms: List[str], max_chars: int) -> Optional[str]:
+    """
+    Фрагменты длинного положения (окна чанкера), в которых встречаются слова вопроса: лучшие по сумме IDF
+    совпавших слов, в порядке следования в тексте, вместе не длиннее max_chars. None, если совпадений нет.
+    """
+    spans = TextChunker(chunk_size=min(FRAGMENT_CHARS, max_chars), chunk_overlap=0).split_offsets(body)
+    fragment_terms = [set(tokenize(body[start:end])) for start, end in spans]
+    scores = [0.0] * len(spans)
+    for term in terms:
+        matched = [i for i, found in enumerate(fragment_terms) if term in found]
+        idf = math.log(1 + (len(spans) - len(matched) + 0.5) / (len(matched) + 0.5))
+        for i in matched:
+            scores[i] += idf
+
+    chosen, used = [], 0
+    for i in sorted(range(len(spans)), key=lambda i: -scores[i]):
+        if scores[i] <= 0:
+            break
+        length = spans[i][1] - spans[i][0] + len(FRAGMENT_SEPARATOR)
+        if used + length <= max_chars:
+            chosen.append(i)
+            used += length
+    if not chosen:
+        return None
+    return FRAGMENT_SEPARATOR.join(body[spans[i][0]:spans[i][1]] for i in sorted(chosen))
+
+
+def build_citation_context(index: StatuteIndex, citations: List[Citation], query: str, max_chars: int) -> Optional[str]:
+    """
+    Контекст синтеза из точного текста процитированных положений (в формате локальной базы законов)
+    не длиннее max_chars. Положение, не помещающееся в свою долю, заменяется фрагментами, где встречаются
+    слова вопроса. None — ссылка не найдена в тексте закона или длинное положение нечем сократить
+    (вопрос не уточняет, что в нем ищется): тогда вопрос обрабатывается обычным путем.
+    """
+    units = []
+    for citation in citations:
+        unit = index.resolve(citation)
+        if unit is None:
+            logger.info(f"CITATIONS: Положение {citation} не найдено в тексте закона, вопрос обрабатывается обычным путем.")
+            return None
+        units.append(unit)
+
+    share = (max_chars - len(CONTEXT_HEADER) - len(CONTEXT_SEPARATOR) * (len(units) - 1)) // len(units)
+    terms = _query_terms(query, index.laws)
+    context_parts = []
+    for unit in units:
+        body = index.unit_text(unit)
+        header = f"Статья {unit.article}. {unit.title}".strip() if unit.part or unit.item else ""
+        head = f"... (источник: {unit.label}, точный текст закона"
+        prefix = ") ...\n" + (f"{header}\n" if header else "")
+        # Части склеиваются без str.format: в названиях статей и тексте закона бывают фигурные скобки.
+        note = ""
+        if len(head + prefix + body + "\n...") > share:
+            note = " (фрагменты, относящиеся к вопросу)"
+            body = _relevant_fragments(body, terms, share - len(head + note + prefix + "\n...")) if terms else None
+            if body is None:
+                logger.info(f"CITATIONS: Положение {unit.label} не помещается в контекст ({share} симв.), а вопрос не уточняет, что в нем искать: вопрос обрабатывается обычным путем.")
+                return None
+        context_parts.append(head + note + prefix + body + "\n...")
+    return CONTEXT_HEADER + CONTEXT_SEPARATOR.join(context_parts)
+
+
+_statute_index: Optional[StatuteIndex] = None
+_statute_index_lock = threading.Lock()
+
+
+def get_statute_index() -> StatuteIndex:
+    """Структурный индекс законов из settings.tools.statute_files (строится при первом обращении)."""
+    global _statute_index
+    if _statute_index is not None:
+        return _statute_index
+    with _statute_index_lock:
+        if _statute_index is None:
+            _statute_index = StatuteIndex.build(settings.tools.statute_files)
+            logger.info(f"CITATIONS: Структурный индекс законов построен ({len(_statute_index.units)} единиц).")
+    return _statute_index
+
+
+def resolve_citations(query: str) -> Optional[str]:
+    """
+    Распознает в вопросе ссылки вида "ч. 5 ст. 34 44-ФЗ" / "пункт 2 части 1 статьи 93 Закона № 44-ФЗ"
+    и возвращает точный текст этих положений для синтеза (None — вопрос без ссылок или ссылка не разрешена).
+    """
+    index = get_statute_index()
+    citations = find_citations(query, index.laws)
+    if not citations:
+        return None
+    citations = citations[:settings.tools.citation_max_refs]
+    return build_citation_context(index, citations, query, synthesis_context_chars())
+
+
+__all__ = ["Citation", "StatuteIndex", "find_citations", "build_citation_context", "get_statute_index", "resolve_citations"]
@@ -0,0 +1,107 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from src.utils.text_chunker import TextChunker
+
+logger = logging.getLogger(__name__)
+
+# Ответы и строки таблиц длиннее окна делятся по границам предложений; вопрос (первая ячейка) повторяется в каждом окне.
+ENTRY_WINDOW_CHARS = 1500
+# Сплошной текст markdown-файлов делится так же, как страницы в веб-RAG.
+TEXT_CHUNK_CHARS, TEXT_CHUNK_OVERLAP = 1000, 200
+# Строки-заголовки таблиц в выгрузках data/old/data_md.
+_HEADER_CELLS = frozenset({"", "вопросы", "ответы", "question", "text", "name", "special", "link"})
+
+Document = Tuple[str, Dict[str, Any]]
+
+
+def _entry_documents(head: str, body: str, metadata: Dict[str, Any]) -> List[Document]:
+    """Документы записи "вопрос/термин + текст": одно окно или несколько, каждое начинается с head."""
+    windows = TextChunker(ENTRY_WINDOW_CHARS, 0).split_text(body) if len(body) > ENTRY_WINDOW_CHARS else [body]
+    return [(f"{head}\n{window}".strip(), dict(metadata)) for window in windows]
+
+
+def load_qa_entries(qa_files: Iterable[str]) -> List[Dict[str, str]]:
+    """Записи выгрузок вопрос-ответ (*.json: [{"question", "text", "link"?}, ...]) как {"question", "answer", "link"}."""
+    entries: List[Dict[str, str]] = []
+    for path in qa_files:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"CORPORA: Не удалось прочитать выгрузку вопросов {path}: {e}")
+            continue
+        for record in records:
+            question = " ".join(str(record.get("question") or "").split())
+            answer = str(record.get("text") or "").strip()
+            if question and answer:
+                entries.append({"question": question, "answer": answer, "link": str(record.get("link") or "").strip()})
+    return entries
+
+
+def qa_label(entry: Dict[str, str]) -> str:
+    """Подпись записи вопрос-ответ в контексте синтеза: ссылка на первоисточник или сам вопрос."""
+    return entry["link"] or f"вопрос-ответ «{entry['question'][:80]}»"
+
+
+def load_qa_documents(qa_files: Iterable[str]) -> List[Document]:
+    """Документы из выгрузок вопрос-ответ: вопрос и ответ (длинный ответ — несколько окон с вопросом в начале)."""
+    documents: List[Document] = []
+    for entry in load_qa_entries(qa_files):
+        metadata = {"corpus": "qa", "label": qa_label(entry), "question": entry["question"], "link": entry["link"]}
+        documents.extend(_entry_documents(entry["question"], entry["answer"], metadata))
+    return documents
+
+
+def _table_cells(line: str) -> List[str]:
+    return [" ".join(cell.split()) for cell in line.strip().strip("|").split("|")]
+
+
+def load_md_documents(md_files: Iterable[str]) -> List[Document]:
+    """
+    Документы из markdown-выгрузок: строка таблицы (вопрос | ответ, термин | описание) — отдельная запись,
+    сплошной текст между таблицами делится чанкером с перекрытием.
+    """
+    documents: List[Document] = []
+    chunker = TextChunker(TEXT_CHUNK_CHARS, TEXT_CHUNK_OVERLAP)
+    for path in md_files:
+        try:
+            lines = Path(path).read_text(encoding="utf-8").splitlines()
+        except OSError as e:
+            logger.error(f"CORPORA: Не удалось прочитать {path}: {e}")
+            continue
+        name = Path(path).stem
+        plain: List[str] = []
+        for line in lines:
+            if not line.lstrip().startswith("|"):
+                plain.append(line)
+                continue
+            cells = _table_cells(line)
+            if all(not cell.strip("-: ") for cell in cells) or all(cell.lower() in _HEADER_CELLS for cell in cells):
+                continue
+            # Ячейка, с которой начинается другая (краткое описание термина), не повторяется.
+            cells = [cell for cell in dict.fromkeys(cells) if cell and not any(o != cell and o.startswith(cell) for o in cells)]
+            if cells:
+                metadata = {"corpus": "md", "label": f"{name}: «{cells[0][:80]}»"}
+                documents.extend(_entry_documents(cells[0], "\n".join(cells[1:]), metadata))
+        text = "\n".join(plain)
+        for index, chunk in enumerate(chunker.split_text(text)):
+            documents.append((chunk, {"corpus": "md", "label": f"{name}, фрагмент {index + 1}"}))
+    return documents
+
+
+def deduplicate(documents: List[Document]) -> List[Document]:
+    """Убирает документы с одинаковым текстом (без учета регистра и пробелов); выгрузки частично повторяют друг друга."""
+    seen = set()
+    unique: List[Document] = []
+    for text, metadata in documents:
+        key = " ".join(text.lower().split())
+        if key not in seen:
+            seen.add(key)
+            unique.append((text, metadata))
+    return unique
+
+
+__all__ = ["load_qa_entries", "qa_label", "load_qa_documents", "load_md_documents", "deduplicate"]
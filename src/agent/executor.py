@@ -1,31 +1,77 @@
+import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Union
 
+import numpy as np
 from langchain_core.language_models.base import BaseLanguageModel
 from langchain_core.runnables import Runnable
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, BaseMessageChunk
 
 from src.config import settings
-from src.agent.models import load_llm
+from src.agent.models import load_cached_embedding_model, load_llm, load_llm_pool, load_embedding_model
+from src.agent.local_index import get_law_index, retrieve_local_context
+from src.agent.faq import get_faq_index, match_faq
+from src.agent.router import get_search_router, route_search
+from src.agent.llm_pool import LocalLLMPool
+from src.agent.scheduler import InferenceScheduler, Priority, ScheduledLLM, with_priority
+from src.agent.answer_cache import SemanticAnswerCache, extract_sources, get_answer_cache
+from src.agent.citations import get_statute_index, resolve_citations
 from src.agent.prompts import (
     DECIDE_SEARCH_PROMPT,
     GENERATE_SEARCH_QUERY_PROMPT,
+    PLAN_SEARCH_GRAMMAR,
+    PLAN_SEARCH_PROMPT,
     SYNTHESIZE_ANSWER_PROMPT
 )
-from src.agent.tools import search_and_rag_chain
+from src.agent.tools import SearchContext, arelease_loop_resources, get_tavily_clients, search_and_rag_chain
+from src.utils.timings import get_timings, timed
+from src.utils.metrics import install_exporters
+from src.utils.profiling import ProfileReport, profile_query
+from src.utils.tracing import span, trace
 
 logger = logging.getLogger(__name__)
 
 
-_llm_instance: Optional[BaseLanguageModel] = None
+_llm_instance: Optional[Union[BaseLanguageModel, ScheduledLLM]] = None
+_llm_lock = threading.Lock()
 
-def get_llm() -> BaseLanguageModel:
-    """Возвращает инициализированный экземпляр LLM."""
+def get_llm() -> Union[BaseLanguageModel, ScheduledLLM]:
+    """
+    Возвращает инициализированный экземпляр LLM.
+    Локальная модель оборачивается в ScheduledLLM: все сессии обращаются к ней через общую очередь.
+    При N_REPLICAS > 1 вместо одной модели запускается пул реплик, и очередь обслуживает
+    столько запросов одновременно, сколько реплик в пуле.
+    """
     global _llm_instance
-    if _llm_instance is None:
+    if _llm_instance is not None:
+        return _llm_instance
+    with _llm_lock:
+        if _llm_instance is not None:
+            return _llm_instance
         logger.info("EXECUTOR: Первая инициализация LLM...")
         try:
-            _llm_instance = load_llm()
+            concurrency = 1
+            if settings.llm_provider == "local" and settings.local_llm.n_replicas > 1:
+                llm = load_llm_pool()
+                concurrency = llm.replicas
+            else:
+                llm = load_llm()
+            if settings.llm_provider == "local" and settings.scheduler.enabled:
+                llm = ScheduledLLM(InferenceScheduler(
+                    llm,
+                    max_queue_depth=settings.scheduler.max_queue_depth,
+                    enqueue_timeout=settings.scheduler.enqueue_timeout_seconds,
+                    metrics_window=settings.scheduler.metrics_window,
+                    concurrency=concurrency,
+                ))
+                logger.info(f"EXECUTOR: Запросы к локальной LLM идут через очередь (глубина до {settings.scheduler.max_queue_depth}, параллельно {concurrency}).")
+            _llm_instance = llm
             logger.info("EXECUTOR: LLM успешно инициализирована.")
         except Exception as e:
              logger.critical("EXECUTOR: КРИТИЧЕСКАЯ ОШИБКА при инициализации LLM!", exc_info=True)
@@ -33,112 +79,695 @@ def get_llm() -> BaseLanguageModel:
     return _llm_instance
 
 
-def run_query_flow(query: str, session_id: str = "default_session") -> str:
+def get_llm_scheduler_stats() -> Optional[Dict[str, Any]]:
+    """Метрики очереди локальной LLM (None, если очередь не используется или LLM еще не загружена)."""
+    if isinstance(_llm_instance, ScheduledLLM):
+        stats = _llm_instance.scheduler.stats()
+        if isinstance(_llm_instance.scheduler.llm, LocalLLMPool):
+            stats["pool"] = _llm_instance.scheduler.llm.stats()
+        return stats
+    return None
+
+
+def _scheduler_busy_message(llm: Any) -> Optional[str]:
+    if isinstance(llm, ScheduledLLM) and llm.scheduler.is_saturated():
+        logger.warning("EXECUTOR: Очередь LLM заполнена, запрос отклонен до начала обработки.")
+        return "Ассистент сейчас перегружен запросами. Пожалуйста, повторите вопрос через минуту."
+    return None
+
+
+_PLAN_JSON_RE = re.compile(r"\{.*?\}", re.DOTALL)
+_PLAN_SEARCH_RE = re.compile(r'"?search"?\s*[:=]\s*"?(YES|NO)', re.IGNORECASE)
+_PLAN_QUERY_RE = re.compile(r'"?query"?\s*[:=]\s*"((?:[^"\\]|\\.)*)"', re.IGNORECASE)
+
+
+def parse_search_plan(text: str) -> Optional[Tuple[bool, str]]:
     """
-    Обрабатывает запрос пользователя: решает, нужен ли поиск, выполняет его (если нужен),
-    и синтезирует финальный ответ с помощью LLM.
+    Разбирает ответ планировщика вида {"search": "YES"|"NO", "query": "..."}.
+    Возвращает (нужен ли поиск, поисковый запрос) или None, если ответ не удалось разобрать
+    (в т.ч. если поиск нужен, а запрос пустой).
     """
-    logger.info(f"EXECUTOR: Начало обработки запроса (сессия: {session_id}): '{query[:100]}...'")
-    llm = get_llm()
+    decision, search_query = None, ""
+    match = _PLAN_JSON_RE.search(text or "")
+    if match:
+        try:
+            plan = json.loads(match.group(0))
+            decision = str(plan.get("search", "")).strip().upper()
+            search_query = str(plan.get("query") or "")
+        except (ValueError, AttributeError):
+            decision = None
+    if decision not in ("YES", "NO"):
+        search_match = _PLAN_SEARCH_RE.search(text or "")
+        if not search_match:
+            return None
+        decision = search_match.group(1).upper()
+        query_match = _PLAN_QUERY_RE.search(text or "")
+        search_query = query_match.group(1).replace('\\"', '"') if query_match else ""
+
+    search_query = search_query.strip().strip('"\'')
+    if decision == "YES" and not search_query:
+        return None
+    return decision == "YES", search_query
 
 
-    search_needed = False
+@lru_cache(maxsize=1)
+def _get_plan_grammar():
+    """Компилирует GBNF-грамматику планировщика для LlamaCpp (None, если llama_cpp недоступна)."""
     try:
-        prompt_decide = DECIDE_SEARCH_PROMPT.format(user_query=query)
-        logger.debug(f"EXECUTOR: Запрос к LLM для решения о поиске:\n{prompt_decide}")
+        from llama_cpp import LlamaGrammar
+        return LlamaGrammar.from_string(PLAN_SEARCH_GRAMMAR, verbose=False)
+    except Exception as e:
+        logger.warning(f"EXECUTOR: Не удалось подготовить грамматику планировщика, ответ не будет ограничен: {e}")
+        return None
 
-        llm_response_decide = llm.invoke(prompt_decide)
-        logger.debug(f"EXECUTOR: Ответ LLM (решение): {llm_response_decide}")
 
-        if isinstance(llm_response_decide, AIMessage):
-            decision_str = llm_response_decide.content.strip().upper()
-        elif isinstance(llm_response_decide, str):
-             decision_str = llm_response_decide.strip().upper()
-        else:
-             logger.warning(f"EXECUTOR: Неожиданный тип ответа LLM (решение): {type(llm_response_decide)}")
-             decision_str = ""
+def _plan_prompt(query: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Промпт планировщика и параметры вызова (грамматика для локальной модели).
+    Пулу реплик (N_REPLICAS > 1) передается исходный текст грамматики: реплики в других процессах компилируют его сами.
+    """
+    prompt_plan = PLAN_SEARCH_PROMPT.format(user_query=query)
+    logger.debug(f"EXECUTOR: Запрос к LLM для планирования поиска:\n{prompt_plan}")
+    invoke_kwargs: Dict[str, Any] = {}
+    if settings.llm_provider == "local" and settings.local_llm.n_replicas > 1:
+        invoke_kwargs["grammar"] = PLAN_SEARCH_GRAMMAR
+    elif settings.llm_provider == "local":
+        grammar = _get_plan_grammar()
+        if grammar is not None:
+            invoke_kwargs["grammar"] = grammar
+    return prompt_plan, invoke_kwargs
 
-        logger.info(f"EXECUTOR: Решение LLM о поиске (обработано): '{decision_str}'")
-        if "YES" in decision_str:
-            search_needed = True
+
+def _plan_from_response(llm_response_plan: Any) -> Optional[Tuple[bool, str]]:
+    logger.debug(f"EXECUTOR: Ответ LLM (план поиска): {llm_response_plan}")
+    if isinstance(llm_response_plan, AIMessage):
+        plan_str = llm_response_plan.content
+    elif isinstance(llm_response_plan, str):
+        plan_str = llm_response_plan
+    else:
+        logger.warning(f"EXECUTOR: Неожиданный тип ответа LLM (план поиска): {type(llm_response_plan)}")
+        return None
+
+    plan = parse_search_plan(plan_str)
+    if plan is None:
+        logger.warning(f"EXECUTOR: Не удалось разобрать план поиска, переход к двухшаговому пути: '{plan_str[:200]}'")
+    return plan
+
+
+def _plan_search(llm: BaseLanguageModel, query: str) -> Optional[Tuple[bool, str]]:
+    """
+    Один вызов LLM вместо двух (DECIDE + GENERATE): возвращает (нужен ли поиск, поисковый запрос)
+    или None, если план получить не удалось — тогда используется прежний двухшаговый путь.
+    Для локальной модели вывод ограничивается грамматикой, чтобы гарантировать корректный JSON.
+    """
+    try:
+        prompt_plan, invoke_kwargs = _plan_prompt(query)
+        with span("plan"):
+            return _plan_from_response(with_priority(llm, Priority.PLANNING).invoke(prompt_plan, **invoke_kwargs))
+    except Exception as e:
+        logger.error(f"EXECUTOR: Ошибка на шаге планирования поиска, переход к двухшаговому пути: {e}", exc_info=True)
+        return None
+
+
+def _decision_from_response(llm_response_decide: Any) -> bool:
+    logger.debug(f"EXECUTOR: Ответ LLM (решение): {llm_response_decide}")
+
+    if isinstance(llm_response_decide, AIMessage):
+        decision_str = llm_response_decide.content.strip().upper()
+    elif isinstance(llm_response_decide, str):
+         decision_str = llm_response_decide.strip().upper()
+    else:
+         logger.warning(f"EXECUTOR: Неожиданный тип ответа LLM (решение): {type(llm_response_decide)}")
+         decision_str = ""
+
+    logger.info(f"EXECUTOR: Решение LLM о поиске (обработано): '{decision_str}'")
+    return "YES" in decision_str
+
+
+def decide_search(llm: BaseLanguageModel, query: str) -> bool:
+    """Отдельный вызов LLM (DECIDE_SEARCH_PROMPT): нужен ли поиск для ответа на запрос."""
+    try:
+        prompt_decide = DECIDE_SEARCH_PROMPT.format(user_query=query)
+        logger.debug(f"EXECUTOR: Запрос к LLM для решения о поиске:\n{prompt_decide}")
+        with span("decide"):
+            return _decision_from_response(with_priority(llm, Priority.PLANNING).invoke(prompt_decide))
     except Exception as e:
         logger.error(f"EXECUTOR: Ошибка на шаге решения о поиске: {e}", exc_info=True)
-        search_needed = True
         logger.warning("EXECUTOR: Не удалось получить решение LLM о поиске, предполагаем, что поиск нужен.")
+        return True
 
 
-    search_results_context = "Поиск не проводился, так как был оценен как ненужный для данного запроса."
-    if search_needed:
-        try:
-            prompt_generate_query = GENERATE_SEARCH_QUERY_PROMPT.format(user_query=query)
-            logger.debug(f"EXECUTOR: Запрос к LLM для генерации поискового запроса:\n{prompt_generate_query}")
-
-            llm_response_gen_query = llm.invoke(prompt_generate_query)
-            logger.debug(f"EXECUTOR: Ответ LLM (генерация запроса): {llm_response_gen_query}")
-            if isinstance(llm_response_gen_query, AIMessage):
-                 search_query = llm_response_gen_query.content.strip().strip('"\'')
-            elif isinstance(llm_response_gen_query, str):
-                 search_query = llm_response_gen_query.strip().strip('"\'')
-            else:
-                 logger.warning(f"EXECUTOR: Неожиданный тип ответа LLM (генерация запроса): {type(llm_response_gen_query)}")
-                 search_query = ""
+def _search_query_from_response(llm_response_gen_query: Any) -> str:
+    logger.debug(f"EXECUTOR: Ответ LLM (генерация запроса): {llm_response_gen_query}")
+    if isinstance(llm_response_gen_query, AIMessage):
+         return llm_response_gen_query.content.strip().strip('"\'')
+    elif isinstance(llm_response_gen_query, str):
+         return llm_response_gen_query.strip().strip('"\'')
+    else:
+         logger.warning(f"EXECUTOR: Неожиданный тип ответа LLM (генерация запроса): {type(llm_response_gen_query)}")
+         return ""
 
+
+def _generate_search_query_prompt(query: str) -> str:
+    prompt_generate_query = GENERATE_SEARCH_QUERY_PROMPT.format(user_query=query)
+    logger.debug(f"EXECUTOR: Запрос к LLM для генерации поискового запроса:\n{prompt_generate_query}")
+    return prompt_generate_query
+
+
+@dataclass
+class _QueryContext:
+    """
+    Результат подготовительных шагов (кеш, решение о поиске, поиск) перед синтезом ответа.
+    ready_answer — готовый ответ без синтеза (из кеша ответов или отказ из-за перегрузки).
+    search_status — ok (контекст получен: локальная база, типовые вопросы, веб-RAG), skipped (поиск не нужен),
+    not_found или error; в кеш ответов попадают только ответы со статусом ok.
+    """
+    query: str
+    query_vector: Optional[np.ndarray]
+    answer_cache: Optional[SemanticAnswerCache]
+    ready_answer: Optional[str] = None
+    search_results_context: str = ""
+    search_status: str = "ok"
+
+
+def _lookup_cached_answer(query: str, query_vector: Optional[np.ndarray]) -> Tuple[Optional[SemanticAnswerCache], Optional[_QueryContext]]:
+    """Ищет ответ в семантическом кеше; возвращает (кеш, контекст с готовым ответом или None)."""
+    answer_cache = get_answer_cache()
+    if answer_cache is not None and query_vector is not None:
+        with span("answer_cache") as cache_span:
+            cached_answer = answer_cache.lookup(query_vector)
+            cache_span.set(cache="hit" if cached_answer else "miss")
+        if cached_answer:
+            logger.info(f"EXECUTOR: Ответ взят из семантического кеша (близость {cached_answer.score:.3f}, вопрос: '{cached_answer.question[:100]}', источников: {len(cached_answer.sources)}).")
+            return answer_cache, _QueryContext(query, query_vector, answer_cache, ready_answer=cached_answer.text_with_sources())
+    return answer_cache, None
+
+
+def _citation_query_context(llm: BaseLanguageModel, query: str) -> Optional[_QueryContext]:
+    """
+    Если вопрос ссылается на конкретные положения законов ("ч. 5 ст. 34 44-ФЗ"), контекстом синтеза
+    становится их точный текст: эмбеддинг запроса, кеш ответов, решение о поиске и сам поиск не выполняются.
+    """
+    if not settings.tools.citation_resolver_enabled:
+        return None
+    try:
+        with span("citation") as citation_span:
+            citation_context = resolve_citations(query)
+            citation_span.set(hit=citation_context is not None)
+    except Exception as e:
+        logger.error(f"EXECUTOR: Ошибка разбора ссылок на законы, вопрос обрабатывается обычным путем: {e}", exc_info=True)
+        return None
+    if citation_context is None:
+        return None
+    logger.info("EXECUTOR: Вопрос ссылается на конкретные положения законов, ответ будет основан на их тексте без поиска.")
+    busy_message = _scheduler_busy_message(llm)
+    if busy_message:
+        return _QueryContext(query, None, None, ready_answer=busy_message)
+    return _QueryContext(query, None, None, search_results_context=citation_context)
+
+
+def _faq_query_context(query: str, query_vector: Optional[np.ndarray], answer_cache: Optional[SemanticAnswerCache]) -> Optional[_QueryContext]:
+    """
+    Если вопрос практически совпадает с типовым из базы вопрос-ответ (src/agent/faq.py), контекстом синтеза
+    становится готовый ответ со ссылкой: решение о поиске и поиск не выполняются, остается один вызов LLM.
+    """
+    if query_vector is None or not settings.tools.faq_enabled:
+        return None
+    try:
+        with span("faq") as faq_span:
+            faq_context, faq_score = match_faq(query_vector)
+            faq_span.set(hit=faq_context is not None, score=round(faq_score, 3))
+    except Exception as e:
+        logger.error(f"EXECUTOR: Ошибка поиска по базе типовых вопросов, вопрос обрабатывается обычным путем: {e}", exc_info=True)
+        return None
+    if faq_context is None:
+        return None
+    logger.info(f"EXECUTOR: Вопрос совпадает с типовым (близость {faq_score:.3f}), ответ будет основан на готовом ответе без поиска.")
+    return _QueryContext(query, query_vector, answer_cache, search_results_context=faq_context)
+
+
+def _route_decision(query_vector: Optional[np.ndarray]) -> Optional[bool]:
+    """Решение классификатора о поиске (None — классификатор недоступен или не уверен)."""
+    if query_vector is None:
+        return None
+    try:
+        with span("route") as route_span:
+            routed_decision, search_probability = route_search(query_vector)
+            route_span.set(decided=routed_decision is not None, probability=round(search_probability, 3))
+        if routed_decision is not None:
+            logger.info(f"EXECUTOR: Решение о поиске принято классификатором без LLM: {'YES' if routed_decision else 'NO'} (p={search_probability:.3f}).")
+        return routed_decision
+    except Exception as e:
+        logger.error(f"EXECUTOR: Ошибка классификатора необходимости поиска, решение примет LLM: {e}", exc_info=True)
+        return None
+
+
+def _local_search_context(query_vector: Optional[np.ndarray], query: str) -> Optional[str]:
+    """Контекст из локальной базы (законы, ответы на вопросы) или None, если локального recall недостаточно."""
+    if query_vector is None:
+        return None
+    try:
+        with span("index") as index_span:
+            local_context, local_score = retrieve_local_context(query_vector, query)
+            index_span.set(hit=local_context is not None, score=round(local_score, 3))
+        if local_context:
+            logger.info(f"EXECUTOR: Ответ будет основан на локальной базе (близость {local_score:.3f}), веб-поиск пропущен.")
+        return local_context
+    except Exception as e:
+        logger.error(f"EXECUTOR: Ошибка поиска по локальной базе законов, переход к веб-поиску: {e}", exc_info=True)
+        return None
+
+
+def _log_plan(plan: Tuple[bool, str]) -> None:
+    logger.info(f"EXECUTOR: План поиска от LLM: поиск {'нужен' if plan[0] else 'не нужен'}, запрос: '{plan[1]}'")
+
+
+NO_SEARCH_CONTEXT = "Поиск не проводился, так как был оценен как ненужный для данного запроса."
+
+
+def _prepare_query_context(llm: BaseLanguageModel, query: str) -> _QueryContext:
+    """Все шаги обработки запроса до синтеза: ссылки на законы, кеш ответов, типовые вопросы, решение о поиске, локальная база, веб-поиск."""
+    citation_context = _citation_query_context(llm, query)
+    if citation_context is not None:
+        return citation_context
+    query_vector: Optional[np.ndarray] = None
+    try:
+        embedding_model = load_embedding_model()
+        with span("embed_query"):
+            query_vector = np.asarray(embedding_model.embed_query(query), dtype=np.float32)
+    except Exception as e:
+        logger.error(f"EXECUTOR: Не удалось получить эмбеддинг запроса, кеш ответов и локальная база не используются: {e}", exc_info=True)
+
+    answer_cache, cached_context = _lookup_cached_answer(query, query_vector)
+    if cached_context is not None:
+        return cached_context
+    busy_message = _scheduler_busy_message(llm)
+    if busy_message:
+        return _QueryContext(query, query_vector, None, ready_answer=busy_message)
+    faq_context = _faq_query_context(query, query_vector, answer_cache)
+    if faq_context is not None:
+        return faq_context
+
+    planned_query: Optional[str] = None
+    routed_decision = _route_decision(query_vector)
+    plan = _plan_search(llm, query) if settings.use_query_planner and routed_decision is None else None
+    if routed_decision is not None:
+        search_needed = routed_decision
+    elif plan is not None:
+        search_needed, planned_query = plan
+        _log_plan(plan)
+    else:
+        search_needed = decide_search(llm, query)
+
+
+    search_results_context = NO_SEARCH_CONTEXT
+    search_status = "skipped"
+    local_context = _local_search_context(query_vector, query) if search_needed else None
+    if local_context:
+        search_results_context, search_status = local_context, "ok"
+
+    if search_needed and not local_context:
+        try:
+            search_query = planned_query
+            if not search_query:
+                with span("generate_query"):
+                    search_query = _search_query_from_response(with_priority(llm, Priority.PLANNING).invoke(_generate_search_query_prompt(query)))
             logger.info(f"EXECUTOR: Сгенерированный поисковый запрос: '{search_query}'")
 
             if not search_query:
                  logger.warning("EXECUTOR: LLM сгенерировала пустой поисковый запрос.")
-                 search_results_context = "Не удалось сгенерировать поисковый запрос."
+                 search_results_context, search_status = "Не удалось сгенерировать поисковый запрос.", "error"
             else:
                 logger.debug(f"EXECUTOR: Вызов цепочки search_and_rag_chain с запросом: '{search_query}'")
-                search_results_context = search_and_rag_chain.invoke(search_query)
-                logger.info("EXECUTOR: Цепочка search_and_rag_chain успешно выполнена.")
-                logger.debug(f"EXECUTOR: Полученные результаты поиска/RAG (для контекста):\n{str(search_results_context)[:500]}...")
+                search_result: SearchContext = search_and_rag_chain.invoke(search_query)
+                search_results_context, search_status = search_result.text, search_result.status
+                logger.info(f"EXECUTOR: Цепочка search_and_rag_chain выполнена (статус: {search_status}).")
+                logger.debug(f"EXECUTOR: Полученные результаты поиска/RAG (для контекста):\n{search_results_context[:500]}...")
 
         except Exception as e:
             logger.error(f"EXECUTOR: Ошибка на шаге генерации запроса или выполнения поиска: {e}", exc_info=True)
             search_results_context = f"Произошла ошибка при попытке поиска информации: {e}"
+            search_status = "error"
+
+    return _QueryContext(query, query_vector, answer_cache, search_results_context=search_results_context, search_status=search_status)
 
 
+async def _aprepare_query_context(llm: BaseLanguageModel, query: str) -> _QueryContext:
+    """
+    Асинхронный вариант _prepare_query_context: вызовы LLM через ainvoke, поиск через
+    search_and_rag_chain.ainvoke, а CPU-нагрузка и первое чтение с диска (структурный индекс законов, эмбеддинг
+    запроса, кеш ответов, типовые вопросы, классификатор, локальный индекс) — через asyncio.to_thread.
+    """
+    citation_context = await asyncio.to_thread(_citation_query_context, llm, query)
+    if citation_context is not None:
+        return citation_context
+    query_vector: Optional[np.ndarray] = None
     try:
-        prompt_synthesize = SYNTHESIZE_ANSWER_PROMPT.format(
-            user_query=query,
-            search_results_context=search_results_context
-        )
-        logger.debug(f"EXECUTOR: Запрос к LLM для синтеза финального ответа (контекст ~{len(str(search_results_context))} симв.).")
-        logger.debug(f"EXECUTOR: Начало промпта синтеза:\n{prompt_synthesize[:1000]}...")
-
-
-        llm_response_final = llm.invoke(prompt_synthesize)
-        logger.debug(f"EXECUTOR: Ответ LLM (синтез): {llm_response_final}")
-        if isinstance(llm_response_final, AIMessage):
-             final_answer = llm_response_final.content.strip()
-        elif isinstance(llm_response_final, str):
-             final_answer = llm_response_final.strip()
-        else:
-             logger.error(f"EXECUTOR: Неожиданный тип ответа LLM (синтез): {type(llm_response_final)}")
-             final_answer = "Ошибка: Не удалось получить финальный ответ от языковой модели."
-
-
-        logger.info("EXECUTOR: Финальный ответ успешно сгенерирован.")
+        embedding_model = await asyncio.to_thread(load_embedding_model)
+        with span("embed_query"):
+            query_vector = np.asarray(await asyncio.to_thread(embedding_model.embed_query, query), dtype=np.float32)
+    except Exception as e:
+        logger.error(f"EXECUTOR: Не удалось получить эмбеддинг запроса, кеш ответов и локальная база не используются: {e}", exc_info=True)
+
+    answer_cache, cached_context = await asyncio.to_thread(_lookup_cached_answer, query, query_vector)
+    if cached_context is not None:
+        return cached_context
+    busy_message = _scheduler_busy_message(llm)
+    if busy_message:
+        return _QueryContext(query, query_vector, None, ready_answer=busy_message)
+    faq_context = await asyncio.to_thread(_faq_query_context, query, query_vector, answer_cache)
+    if faq_context is not None:
+        return faq_context
+
+    planned_query: Optional[str] = None
+    routed_decision = await asyncio.to_thread(_route_decision, query_vector)
+    plan: Optional[Tuple[bool, str]] = None
+    if settings.use_query_planner and routed_decision is None:
+        try:
+            prompt_plan, invoke_kwargs = _plan_prompt(query)
+            with span("plan"):
+                plan = _plan_from_response(await with_priority(llm, Priority.PLANNING).ainvoke(prompt_plan, **invoke_kwargs))
+        except Exception as e:
+            logger.error(f"EXECUTOR: Ошибка на шаге планирования поиска, переход к двухшаговому пути: {e}", exc_info=True)
+    if routed_decision is not None:
+        search_needed = routed_decision
+    elif plan is not None:
+        search_needed, planned_query = plan
+        _log_plan(plan)
+    else:
+        try:
+            with span("decide"):
+                search_needed = _decision_from_response(await with_priority(llm, Priority.PLANNING).ainvoke(DECIDE_SEARCH_PROMPT.format(user_query=query)))
+        except Exception as e:
+            logger.error(f"EXECUTOR: Ошибка на шаге решения о поиске: {e}", exc_info=True)
+            logger.warning("EXECUTOR: Не удалось получить решение LLM о поиске, предполагаем, что поиск нужен.")
+            search_needed = True
+
+    search_results_context = NO_SEARCH_CONTEXT
+    search_status = "skipped"
+    local_context = await asyncio.to_thread(_local_search_context, query_vector, query) if search_needed else None
+    if local_context:
+        search_results_context, search_status = local_context, "ok"
+
+    if search_needed and not local_context:
+        try:
+            search_query = planned_query
+            if not search_query:
+                with span("generate_query"):
+                    search_query = _search_query_from_response(await with_priority(llm, Priority.PLANNING).ainvoke(_generate_search_query_prompt(query)))
+            logger.info(f"EXECUTOR: Сгенерированный поисковый запрос: '{search_query}'")
+            if not search_query:
+                 logger.warning("EXECUTOR: LLM сгенерировала пустой поисковый запрос.")
+                 search_results_context, search_status = "Не удалось сгенерировать поисковый запрос.", "error"
+            else:
+                search_result: SearchContext = await search_and_rag_chain.ainvoke(search_query)
+                search_results_context, search_status = search_result.text, search_result.status
+                logger.info(f"EXECUTOR: Цепочка search_and_rag_chain (async) выполнена (статус: {search_status}).")
+        except Exception as e:
+            logger.error(f"EXECUTOR: Ошибка на шаге генерации запроса или выполнения поиска: {e}", exc_info=True)
+            search_results_context = f"Произошла ошибка при попытке поиска информации: {e}"
+            search_status = "error"
+
+    return _QueryContext(query, query_vector, answer_cache, search_results_context=search_results_context, search_status=search_status)
+
+
+def _synthesis_prompt(context: _QueryContext) -> str:
+    logger.debug(f"EXECUTOR: Запрос к LLM для синтеза финального ответа (контекст ~{len(str(context.search_results_context))} симв.).")
+    return SYNTHESIZE_ANSWER_PROMPT.format(
+        user_query=context.query,
+        search_results_context=context.search_results_context
+    )
+
+
+def _remember_answer(context: _QueryContext, final_answer: str) -> None:
+    """
+    Сохраняет ответ в семантический кеш, только если он основан на найденном контексте: ответ на сбой
+    поиска, пустую выдачу или без поиска иначе раздавался бы всем сессиям до истечения TTL.
+    """
+    if context.answer_cache is None or context.query_vector is None or not final_answer:
+        return
+    if context.search_status != "ok":
+        logger.info(f"EXECUTOR: Ответ не сохраняется в кеш ответов (статус поиска: {context.search_status}).")
+        return
+    context.answer_cache.add(context.query, context.query_vector, final_answer, extract_sources(context.search_results_context))
+
+
+def run_query_flow(query: str, session_id: str = "default_session") -> str:
+    """
+    Обрабатывает запрос пользователя: решает, нужен ли поиск, выполняет его (если нужен),
+    и синтезирует финальный ответ с помощью LLM.
+    Решение о поиске и поисковый запрос по умолчанию получаются одним вызовом LLM (_plan_search);
+    если план не удалось разобрать, используются отдельные шаги DECIDE и GENERATE.
+    Если обученный классификатор (src/agent/router.py) уверен в решении о поиске, LLM для решения не вызывается.
+    Близкие по смыслу повторные вопросы обслуживаются из семантического кеша ответов без вызовов LLM
+    (ответ дополняется его источниками); в кеш попадают только ответы, основанные на найденном контексте.
+    Сначала поиск выполняется по локальному индексу законов; веб-поиск (search_and_rag_chain)
+    запускается, только если локальный recall слабый.
+    Вопросы со ссылкой на конкретную статью/часть/пункт закона (src/agent/citations.py) отвечаются
+    по точному тексту этих положений — все шаги до синтеза пропускаются.
+    Вопросы, практически совпадающие с типовыми (src/agent/faq.py), отвечаются по готовому ответу
+    из базы вопрос-ответ со ссылкой на первоисточник — без решения о поиске и самого поиска.
+    """
+    logger.info(f"EXECUTOR: Начало обработки запроса (сессия: {session_id}): '{query[:100]}...'")
+    with trace("query", session_id, mode="sync", query_chars=len(query)) as root:
+        llm = get_llm()
+        context = _prepare_query_context(llm, query)
+        if context.ready_answer is not None:
+            return context.ready_answer
+
+        try:
+            prompt_synthesize = _synthesis_prompt(context)
+            logger.debug(f"EXECUTOR: Начало промпта синтеза:\n{prompt_synthesize[:1000]}...")
+
+
+            with span("synthesize", context_chars=len(str(context.search_results_context))):
+                llm_response_final = llm.invoke(prompt_synthesize)
+            logger.debug(f"EXECUTOR: Ответ LLM (синтез): {llm_response_final}")
+            if isinstance(llm_response_final, AIMessage):
+                 final_answer = llm_response_final.content.strip()
+            elif isinstance(llm_response_final, str):
+                 final_answer = llm_response_final.strip()
+            else:
+                 logger.error(f"EXECUTOR: Неожиданный тип ответа LLM (синтез): {type(llm_response_final)}")
+                 final_answer = "Ошибка: Не удалось получить финальный ответ от языковой модели."
+
+
+            logger.info("EXECUTOR: Финальный ответ успешно сгенерирован.")
+            logger.debug(f"EXECUTOR: Сгенерированный финальный ответ:\n{final_answer[:500]}...")
+            if isinstance(llm_response_final, (AIMessage, str)):
+                _remember_answer(context, final_answer)
+            root.set(answer_chars=len(final_answer))
+            return final_answer
+
+        except Exception as e:
+            logger.error(f"EXECUTOR: Ошибка на шаге синтеза финального ответа: {e}", exc_info=True)
+            return f"Произошла ошибка при генерации финального ответа: {e}"
+
+
+
+def stream_query_flow(query: str, session_id: str = "default_session") -> Iterator[str]:
+    """
+    Потоковый вариант run_query_flow: подготовительные шаги те же, а финальный ответ
+    отдается по мере генерации (фрагменты текста от LlamaCpp или Gemini через llm.stream).
+    Ответ из семантического кеша отдается одним фрагментом.
+    """
+    logger.info(f"EXECUTOR: Начало потоковой обработки запроса (сессия: {session_id}): '{query[:100]}...'")
+    with trace("query", session_id, mode="stream", query_chars=len(query)) as root:
+        started = time.perf_counter()
+        llm = get_llm()
+        context = _prepare_query_context(llm, query)
+        if context.ready_answer is not None:
+            yield context.ready_answer
+            return
+
+        parts: List[str] = []
+        try:
+            prompt_synthesize = _synthesis_prompt(context)
+            logger.debug(f"EXECUTOR: Начало промпта синтеза:\n{prompt_synthesize[:1000]}...")
+            with span("synthesize", context_chars=len(str(context.search_results_context)), streaming=True) as synthesis_span:
+                for chunk in llm.stream(prompt_synthesize):
+                    text = chunk.content if isinstance(chunk, BaseMessageChunk) else str(chunk)
+                    if not text:
+                        continue
+                    if not parts:
+                        logger.info(f"EXECUTOR: Первый фрагмент ответа получен через {time.perf_counter() - started:.2f} сек.")
+                        synthesis_span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 1))
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            logger.error(f"EXECUTOR: Ошибка на шаге потокового синтеза финального ответа: {e}", exc_info=True)
+            yield ("\n\n" if parts else "") + f"Произошла ошибка при генерации финального ответа: {e}"
+            return
+
+        final_answer = "".join(parts).strip()
+        logger.info(f"EXECUTOR: Финальный ответ (поток) сгенерирован за {time.perf_counter() - started:.2f} сек.")
         logger.debug(f"EXECUTOR: Сгенерированный финальный ответ:\n{final_answer[:500]}...")
-        return final_answer
+        _remember_answer(context, final_answer)
+        root.set(answer_chars=len(final_answer))
+
+
+async def run_query_flow_async(query: str, session_id: str = "default_session") -> str:
+    """
+    Асинхронный вариант run_query_flow: не занимает поток на время ожидания LLM и сети,
+    поэтому один процесс обслуживает много одновременных сессий.
+    Отмена задачи (task.cancel(), asyncio.wait_for) прерывает обработку на ближайшей точке ожидания.
+    Владелец event loop перед его закрытием вызывает tools.arelease_loop_resources() (HTTP-клиент loop).
+    """
+    logger.info(f"EXECUTOR: Начало асинхронной обработки запроса (сессия: {session_id}): '{query[:100]}...'")
+    try:
+        with trace("query", session_id, mode="async", query_chars=len(query)) as root:
+            llm = await asyncio.to_thread(get_llm)
+            context = await _aprepare_query_context(llm, query)
+            if context.ready_answer is not None:
+                return context.ready_answer
+
+            try:
+                with span("synthesize", context_chars=len(str(context.search_results_context))):
+                    llm_response_final = await llm.ainvoke(_synthesis_prompt(context))
+                logger.debug(f"EXECUTOR: Ответ LLM (синтез): {llm_response_final}")
+                if isinstance(llm_response_final, AIMessage):
+                     final_answer = llm_response_final.content.strip()
+                elif isinstance(llm_response_final, str):
+                     final_answer = llm_response_final.strip()
+                else:
+                     logger.error(f"EXECUTOR: Неожиданный тип ответа LLM (синтез): {type(llm_response_final)}")
+                     return "Ошибка: Не удалось получить финальный ответ от языковой модели."
+            except Exception as e:
+                logger.error(f"EXECUTOR: Ошибка на шаге синтеза финального ответа: {e}", exc_info=True)
+                return f"Произошла ошибка при генерации финального ответа: {e}"
+
+            logger.info("EXECUTOR: Финальный ответ (async) успешно сгенерирован.")
+            _remember_answer(context, final_answer)
+            root.set(answer_chars=len(final_answer))
+            return final_answer
+    except asyncio.CancelledError:
+        logger.warning(f"EXECUTOR: Обработка запроса отменена (сессия: {session_id}).")
+        raise
 
-    except Exception as e:
-        logger.error(f"EXECUTOR: Ошибка на шаге синтеза финального ответа: {e}", exc_info=True)
-        return f"Произошла ошибка при генерации финального ответа: {e}"
 
+def run_query_flow_blocking(query: str, session_id: str = "default_session", timeout: Optional[float] = None) -> str:
+    """
+    Синхронная обертка над run_query_flow_async для кода без event loop.
+    timeout (сек.) отменяет обработку запроса, если она не уложилась в срок.
+    """
+    async def run_in_own_loop() -> str:
+        try:
+            return await asyncio.wait_for(run_query_flow_async(query, session_id), timeout)
+        finally:
+            # asyncio.run создает новый loop на каждый вызов: его HTTP-клиент и семафоры закрываются вместе с ним.
+            await arelease_loop_resources()
 
-def run_agent(query: str, session_id: str = "default_session") -> str:
-    """Точка входа для Streamlit, вызывает run_query_flow."""
     try:
-        return run_query_flow(query, session_id)
+        return asyncio.run(run_in_own_loop())
+    except asyncio.TimeoutError:
+        logger.error(f"EXECUTOR: Превышено время обработки запроса ({timeout} сек., сессия: {session_id}).")
+        return f"Превышено время обработки запроса ({timeout} сек.)."
+
+
+_last_profiles: Dict[str, ProfileReport] = {}
+
+
+def run_agent(query: str, session_id: str = "default_session", profile: bool = False) -> str:
+    """
+    Точка входа для Streamlit, вызывает run_query_flow.
+    profile=True профилирует этот запрос (cProfile + tracemalloc); отчет сохраняется
+    в OBSERVABILITY__PROFILE_DIR и доступен через get_last_profile(session_id).
+    """
+    try:
+        if not profile:
+            return run_query_flow(query, session_id)
+        config = settings.observability
+        with profile_query(query, session_id, config.profile_dir, config.profile_top_n, config.profile_trace_frames) as reports:
+            answer = run_query_flow(query, session_id)
+        if reports:
+            _last_profiles[session_id] = reports[0]
+        return answer
     except Exception as e:
         logger.critical(f"EXECUTOR: Необработанная ошибка в run_agent: {e}", exc_info=True)
         return f"Критическая внутренняя ошибка: {e}"
 
 
+def get_last_profile(session_id: str) -> Optional[ProfileReport]:
+    """Отчет о последнем профилированном запросе сессии (run_agent(..., profile=True))."""
+    return _last_profiles.get(session_id)
+
+
+def run_agent_stream(query: str, session_id: str = "default_session") -> Iterator[str]:
+    """Потоковая точка входа для Streamlit, вызывает stream_query_flow."""
+    try:
+        yield from stream_query_flow(query, session_id)
+    except Exception as e:
+        logger.critical(f"EXECUTOR: Необработанная ошибка в run_agent_stream: {e}", exc_info=True)
+        yield f"Критическая внутренняя ошибка: {e}"
+
+
+async def run_agent_async(query: str, session_id: str = "default_session") -> str:
+    """Асинхронная точка входа, вызывает run_query_flow_async (отмена пробрасывается вызывающему)."""
+    try:
+        return await run_query_flow_async(query, session_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.critical(f"EXECUTOR: Необработанная ошибка в run_agent_async: {e}", exc_info=True)
+        return f"Критическая внутренняя ошибка: {e}"
+
+
+_WARMUP_STEPS = (
+    ("embeddings", load_embedding_model),
+    ("rag_embeddings", load_cached_embedding_model),
+    ("law_index", get_law_index),
+    ("faq_index", get_faq_index),
+    ("statute_index", get_statute_index),
+    ("search_router", get_search_router),
+    ("tavily", get_tavily_clients),
+    ("llm", get_llm),
+)
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_status: Dict[str, Any] = {"state": "idle", "errors": {}}
+_warmup_lock = threading.Lock()
+
+
+def _warmup() -> None:
+    """Заранее загружает модели и индексы, чтобы первый запрос не ждал их загрузки."""
+    _warmup_status["state"] = "running"
+    with timed("warmup:total"):
+        for name, loader in _WARMUP_STEPS:
+            try:
+                loader()
+            except Exception as e:
+                _warmup_status["errors"][name] = str(e)
+                logger.error(f"EXECUTOR/WARMUP: Не удалось загрузить '{name}': {e}", exc_info=True)
+    _warmup_status["state"] = "failed" if _warmup_status["errors"] else "done"
+    logger.info(f"EXECUTOR/WARMUP: Прогрев завершен ({_warmup_status['state']}).")
+
+
+def start_warmup() -> None:
+    """Запускает фоновый прогрев (один раз на процесс)."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warmup, name="warmup", daemon=True)
+            _warmup_thread.start()
+            logger.info("EXECUTOR/WARMUP: Фоновый прогрев моделей запущен.")
+
+
+def get_warmup_status() -> Dict[str, Any]:
+    """Состояние фонового прогрева и замеры времени импорта / загрузки компонентов (мс)."""
+    return {"state": _warmup_status["state"], "errors": dict(_warmup_status["errors"]), "timings_ms": get_timings()}
+
+
 def initialize_flow():
-    """Загружает LLM для подготовки к работе."""
+    """
+    Подготавливает пайплайн к работе. В ленивом режиме (LAZY_MODEL_LOADING) модели здесь не загружаются:
+    они создаются при первом обращении или фоновым прогревом (BACKGROUND_WARMUP), и старт занимает
+    доли секунды. Иначе LLM загружается синхронно.
+    Здесь же подключается экспорт спанов (метрики Prometheus, JSONL-трейсы).
+    """
+    install_exporters()
+    if settings.lazy_model_loading:
+        if settings.background_warmup:
+            start_warmup()
+        return True, None
     try:
         get_llm()
         return True, None
@@ -0,0 +1,98 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import settings
+from src.agent.corpora import load_qa_entries, qa_label
+from src.agent.local_index import LocalIndex, load_local_index
+from src.agent.prompts import synthesis_context_chars
+from src.agent.retrieval import fit_context_parts
+from src.utils.text_chunker import TextChunker
+
+logger = logging.getLogger(__name__)
+
+FAQ_INDEX_NAME = "faq"
+FAQ_CONTEXT_HEADER = "Готовые ответы на типовые вопросы, совпадающие с вопросом пользователя (локальная база):\n"
+
+
+def build_faq_index(embedding_model: Embeddings, model_name: str, qa_files: Sequence[str]) -> LocalIndex:
+    """
+    Индекс типовых вопросов: векторы вопросов из выгрузок вопрос-ответ, в метаданных — готовый ответ и ссылка.
+    Выгрузки пересекаются; из записей с одинаковым вопросом остается первая со ссылкой на первоисточник.
+    """
+    entries: Dict[str, Dict[str, str]] = {}
+    for entry in load_qa_entries(qa_files):
+        key = entry["question"].lower()
+        if key not in entries or (entry["link"] and not entries[key]["link"]):
+            entries[key] = entry
+    questions = [entry["question"] for entry in entries.values()]
+    metadatas: List[Dict[str, Any]] = [
+        {"corpus": "faq", "label": qa_label(entry), "answer": entry["answer"], "link": entry["link"]} for entry in entries.values()
+    ]
+    logger.info(f"FAQ: Подготовлено {len(questions)} уникальных вопросов для индексации.")
+    return LocalIndex.build(questions, metadatas, embedding_model, model_name, lexical=False)
+
+
+_faq_index: Optional[LocalIndex] = None
+_faq_index_loaded = False
+_faq_index_lock = threading.Lock()
+
+
+def get_faq_index() -> Optional[LocalIndex]:
+    """Возвращает загруженный с диска индекс типовых вопросов (или None, если он не построен / отключен)."""
+    global _faq_index, _faq_index_loaded
+    if _faq_index_loaded:
+        return _faq_index
+    with _faq_index_lock:
+        if _faq_index_loaded:
+            return _faq_index
+        if settings.tools.faq_enabled:
+            _faq_index = load_local_index(FAQ_INDEX_NAME, "типовых вопросов")
+        _faq_index_loaded = True
+    return _faq_index
+
+
+def _faq_part(head: str, note: str, question: str, answer: str) -> str:
+    """Фрагмент контекста с одним готовым ответом (склейкой, а не str.format: в вопросах и ответах бывают фигурные скобки)."""
+    return head + note + ") ...\nВопрос: " + question + "\nОтвет: " + answer + "\n..."
+
+
+def match_faq(query_vector: np.ndarray) -> Tuple[Optional[str], float]:
+    """
+    Ищет среди типовых вопросов практически совпадающие с запросом (близость не ниже faq_min_score).
+    Возвращает (контекст синтеза из готовых ответов со ссылками, лучшая близость); контекст None, если совпадений нет.
+    Контекст не длиннее prompts.synthesis_context_chars(): лучший ответ при необходимости сокращается,
+    остальные добавляются, только если помещаются целиком.
+    """
+    index = get_faq_index()
+    if index is None or not index.texts:
+        return None, 0.0
+    tools = settings.tools
+    results = index.search(query_vector, tools.faq_max_answers)
+    best_score = results[0][1] if results else 0.0
+    hits = [(position, score) for position, score in results if score >= tools.faq_min_score]
+    if not hits:
+        return None, best_score
+
+    max_chars = synthesis_context_chars()
+    context_parts = []
+    for position, score in hits:
+        metadata = index.metadatas[position]
+        head = f"... (источник: {metadata['label']}, база ответов на типовые вопросы, близость ~{score:.2f}"
+        question = index.texts[position]
+        answer, note = metadata["answer"], ""
+        available = max_chars - len(FAQ_CONTEXT_HEADER) - len(_faq_part(head, ", ответ сокращен", question, ""))
+        if not context_parts and len(FAQ_CONTEXT_HEADER) + len(_faq_part(head, "", question, answer)) > max_chars and available > 0:
+            # Длинный лучший ответ сокращается до первого окна чанкера — по границе абзаца или предложения.
+            start, end = TextChunker(chunk_size=available, chunk_overlap=0).split_offsets(answer[:available * 2])[0]
+            answer, note = answer[start:end], ", ответ сокращен"
+        context_parts.append(_faq_part(head, note, question, answer))
+    context, used = fit_context_parts(FAQ_CONTEXT_HEADER, context_parts, max_chars)
+    logger.info(f"FAQ: Совпало типовых вопросов: {len(hits)}, в контекст вошло {used} (~{len(context)} симв., лучшая близость {best_score:.3f}).")
+    return context, best_score
+
+
+__all__ = ["FAQ_INDEX_NAME", "build_faq_index", "get_faq_index", "match_faq"]
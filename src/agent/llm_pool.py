@@ -0,0 +1,295 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STREAM_END = object()
+_NO_REQUEST = -1
+
+
+def partition_cores(replicas: int) -> List[List[int]]:
+    """
+    Делит доступные процессу ядра на replicas непересекающихся смежных наборов.
+    Если реплик больше, чем ядер, их число урезается до числа ядер.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    replicas = max(1, min(replicas, len(cores)))
+    size, extra = divmod(len(cores), replicas)
+    core_sets, start = [], 0
+    for i in range(replicas):
+        end = start + size + (1 if i < extra else 0)
+        core_sets.append(cores[start:end])
+        start = end
+    return core_sets
+
+
+def _worker_main(index: int, llm_kwargs: Dict[str, Any], cores: Optional[List[int]], n_threads: int,
+                 requests: "mp.Queue", responses: "mp.Queue", cancelled: Any) -> None:
+    """Процесс-реплика: загружает свою копию модели и обслуживает запросы из общей очереди."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        from langchain_community.llms import LlamaCpp
+        from llama_cpp import LlamaGrammar
+
+        llm = LlamaCpp(**llm_kwargs, n_threads=n_threads, use_mmap=True, use_mlock=False)
+    except Exception as e:
+        responses.put((_NO_REQUEST, "ready", (index, f"{type(e).__name__}: {e}")))
+        return
+    logger.info(f"LLM_POOL: Реплика {index} загружена (pid {os.getpid()}, ядра {cores or 'все'}, n_threads={n_threads}).")
+    responses.put((_NO_REQUEST, "ready", (index, None)))
+    grammars: Dict[str, Any] = {}
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, mode, prompt, kwargs = message
+        responses.put((request_id, "started", index))
+        try:
+            source = kwargs.get("grammar")
+            if source is not None:
+                if source not in grammars:
+                    grammars[source] = LlamaGrammar.from_string(source, verbose=False)
+                kwargs["grammar"] = grammars[source]
+            if mode == "stream":
+                for chunk in llm.stream(prompt, **kwargs):
+                    if cancelled[index] == request_id:
+                        logger.info(f"LLM_POOL: Реплика {index}: потребитель потока отключился, генерация остановлена.")
+                        break
+                    responses.put((request_id, "chunk", chunk))
+                responses.put((request_id, "end", None))
+            else:
+                responses.put((request_id, "result", llm.invoke(prompt, **kwargs)))
+        except Exception as e:
+            responses.put((request_id, "error", f"{type(e).__name__}: {e}"))
+
+
+@contextmanager
+def _main_module_hidden():
+    """
+    При старте через spawn дочерний процесс заново выполняет файл __main__. Для скрипта Streamlit
+    (у которого нет проверки __name__) это означало бы запуск всего приложения в каждой реплике,
+    поэтому на время запуска процессов путь к главному модулю скрывается — реплике он не нужен.
+    """
+    main_module = sys.modules.get("__main__")
+    main_file = getattr(main_module, "__file__", None)
+    if main_file is not None and getattr(main_module, "__spec__", None) is None:
+        del main_module.__file__
+        try:
+            yield
+        finally:
+            main_module.__file__ = main_file
+    else:
+        yield
+
+
+class LocalLLMPool:
+    """
+    Пул реплик локальной модели (LlamaCpp), каждая — в отдельном процессе со своим набором ядер
+    и n_threads. Файл GGUF открывается через mmap, поэтому веса разделяются репликами через
+    страничный кеш ОС и в памяти хранятся один раз; у каждой реплики свой KV-кеш.
+    Запросы ставятся в общую очередь и забираются первой свободной репликой, поэтому нагрузка
+    распределяется автоматически. Интерфейс invoke / ainvoke / stream совместим с LlamaCpp,
+    кроме grammar: передается исходный текст GBNF, реплика компилирует его сама (один раз на текст).
+    """
+
+    def __init__(self, llm_kwargs: Dict[str, Any], replicas: int, threads_per_replica: int = 0,
+                 pin_cores: bool = True, start_timeout: float = 600.0):
+        context = mp.get_context("spawn")
+        self.core_sets = partition_cores(replicas)
+        self.replicas = len(self.core_sets)
+        if self.replicas < replicas:
+            logger.warning(f"LLM_POOL: Запрошено {replicas} реплик, но доступно только {self.replicas} ядер — реплик будет {self.replicas}.")
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        self._cancelled = context.Array("q", [_NO_REQUEST] * self.replicas, lock=False)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Any] = {}
+        self._assigned: Dict[int, int] = {}
+        self._closed = False
+
+        self._processes = []
+        with _main_module_hidden():
+            for index, cores in enumerate(self.core_sets):
+                n_threads = threads_per_replica if threads_per_replica > 0 else len(cores)
+                process = context.Process(
+                    target=_worker_main,
+                    args=(index, llm_kwargs, cores if pin_cores else None, n_threads, self._requests, self._responses, self._cancelled),
+                    name=f"llm-replica-{index}",
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+        logger.info(f"LLM_POOL: Запущено {self.replicas} процессов-реплик, ожидание загрузки модели...")
+        self._wait_ready(start_timeout)
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="llm-pool-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, prompt: str, **kwargs: Any) -> Future:
+        """Ставит запрос llm.invoke в общую очередь реплик и возвращает Future с ответом."""
+        future: Future = Future()
+        self._put(prompt, kwargs, "invoke", future)
+        return future
+
+    def invoke(self, prompt: str, **kwargs: Any) -> Any:
+        return self.submit(prompt, **kwargs).result()
+
+    async def ainvoke(self, prompt: str, **kwargs: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(prompt, **kwargs))
+
+    def stream(self, prompt: str, **kwargs: Any) -> Iterator[Any]:
+        """Потоковая генерация на свободной реплике; при досрочном закрытии генератора реплика прекращает генерацию."""
+        chunks: "queue.Queue" = queue.Queue()
+        request_id = self._put(prompt, kwargs, "stream", chunks)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+                index = self._assigned.pop(request_id, None)
+            if index is not None:
+                self._cancelled[index] = request_id
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._pending)
+        return {
+            "replicas": self.replicas,
+            "alive": sum(p.is_alive() for p in self._processes),
+            "in_flight": in_flight,
+            "cores": [len(cores) for cores in self.core_sets],
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._responses.put(None)
+        self._fail_pending(RuntimeError("Пул реплик LLM остановлен."))
+        logger.info("LLM_POOL: Пул реплик остановлен.")
+
+    def _put(self, prompt: str, kwargs: Dict[str, Any], mode: str, target: Any) -> int:
+        if self._closed:
+            raise RuntimeError("Пул реплик LLM остановлен.")
+        grammar = kwargs.get("grammar")
+        if grammar is not None and not isinstance(grammar, str):
+            # Объект LlamaGrammar не передается в другой процесс.
+            raise TypeError("Пулу реплик грамматика передается исходным текстом GBNF (str), а не объектом LlamaGrammar.")
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = target
+        self._requests.put((request_id, mode, prompt, kwargs))
+        return request_id
+
+    def _wait_ready(self, timeout: float) -> None:
+        errors = []
+        for _ in range(self.replicas):
+            try:
+                _, _, (index, error) = self._responses.get(timeout=timeout)
+            except queue.Empty:
+                errors.append(f"реплики не загрузились за {timeout:.0f} с")
+                break
+            if error:
+                errors.append(f"реплика {index}: {error}")
+        if errors:
+            self.close()
+            raise RuntimeError(f"Не удалось запустить пул реплик LLM: {'; '.join(errors)}")
+        logger.info(f"LLM_POOL: Все {self.replicas} реплик готовы (ядер на реплику: {[len(c) for c in self.core_sets]}).")
+
+    def _dispatch(self) -> None:
+        while True:
+            try:
+                message = self._responses.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            request_id, kind, payload = message
+            with self._lock:
+                target = self._pending.get(request_id)
+                if kind == "started":
+                    self._assigned[request_id] = payload
+                elif kind in ("result", "error", "end"):
+                    self._pending.pop(request_id, None)
+                    self._assigned.pop(request_id, None)
+            if target is None or kind == "started":
+                continue
+            if kind == "error":
+                self._deliver(target, RuntimeError(payload))
+            elif kind == "result":
+                if not target.done():
+                    target.set_result(payload)
+            elif kind == "chunk":
+                target.put(payload)
+            elif kind == "end":
+                target.put(_STREAM_END)
+
+    def _check_workers(self) -> None:
+        dead = {index for index, process in enumerate(self._processes) if not process.is_alive()}
+        if not dead or self._closed:
+            return
+        if len(dead) == len(self._processes):
+            logger.error("LLM_POOL: Все процессы-реплики завершились, ожидающие запросы отменены.")
+            self._closed = True
+            self._fail_pending(RuntimeError("Все процессы-реплики LLM завершились."))
+            return
+        with self._lock:
+            lost = [request_id for request_id, index in self._assigned.items() if index in dead]
+            targets = [self._pending.pop(request_id, None) for request_id in lost]
+            for request_id in lost:
+                self._assigned.pop(request_id, None)
+        for target in targets:
+            if target is not None:
+                self._deliver(target, RuntimeError("Процесс реплики LLM завершился во время генерации."))
+        if lost:
+            logger.error(f"LLM_POOL: Реплики {sorted(dead)} завершились аварийно, отменено запросов: {len(lost)}.")
+
+    def _fail_pending(self, error: BaseException) -> None:
+        with self._lock:
+            targets = list(self._pending.values())
+            self._pending.clear()
+            self._assigned.clear()
+        for target in targets:
+            self._deliver(target, error)
+
+    @staticmethod
+    def _deliver(target: Any, error: BaseException) -> None:
+        if isinstance(target, Future):
+            if not target.done():
+                target.set_exception(error)
+        else:
+            target.put(error)
+
+
+__all__ = ["LocalLLMPool", "partition_cores"]
@@ -0,0 +1,239 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import settings
+from src.agent.bm25 import BM25Index
+from src.agent.corpora import deduplicate, load_md_documents, load_qa_documents
+from src.agent.prompts import synthesis_context_chars
+from src.agent.retrieval import fit_context_parts, normalize_rows, reciprocal_rank_fusion
+from src.agent.statutes import load_statutes, parse_statute, split_for_index
+from src.agent.vector_store import VectorStoreConfig, build_vector_store, load_vector_store
+
+logger = logging.getLogger(__name__)
+
+LAW_INDEX_NAME = "laws"
+EMBED_BATCH_SIZE = 256
+# Как фрагменты разных корпусов подписываются в контексте синтеза.
+CORPUS_TITLES = {"law": "локальная база законов", "qa": "база ответов на вопросы", "md": "справочные материалы"}
+
+
+class LocalIndex:
+    """
+    Персистентный индекс по локальным текстам: хранилище нормированных векторов (src/agent/vector_store.py:
+    float32 .npy или сжатый индекс FAISS, отображаемые в память), документы с метаданными (.jsonl)
+    и лексический индекс BM25 по тем же документам (.bm25.npz).
+    """
+
+    def __init__(self, texts: List[str], metadatas: List[Dict[str, Any]], store, model_name: str,
+                 bm25: Optional[BM25Index] = None):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.store = store
+        self.model_name = model_name
+        self.bm25 = bm25
+
+    @classmethod
+    def build(cls, texts: List[str], metadatas: List[Dict[str, Any]], embedding_model: Embeddings, model_name: str,
+              vector_config: VectorStoreConfig = VectorStoreConfig(), lexical: bool = True) -> "LocalIndex":
+        batches = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batches.append(np.asarray(embedding_model.embed_documents(texts[start:start + EMBED_BATCH_SIZE]), dtype=np.float32))
+            logger.info(f"LOCAL_INDEX: Векторизовано {min(start + EMBED_BATCH_SIZE, len(texts))}/{len(texts)} фрагментов.")
+        vectors = normalize_rows(np.vstack(batches)) if batches else np.zeros((0, 0), dtype=np.float32)
+        store = build_vector_store(vectors, vector_config)
+        if not lexical:
+            return cls(texts, metadatas, store, model_name)
+        # Для BM25 фрагменты законов дополняются подписью ("44-ФЗ, ст. 99, ч. 15"): так находятся ссылки из вопросов.
+        lexical_texts = [f"{metadata['label']}\n{text}" if metadata.get("corpus") == "law" else text
+                         for text, metadata in zip(texts, metadatas)]
+        return cls(texts, metadatas, store, model_name, BM25Index.build(lexical_texts))
+
+    def save(self, index_dir: str, name: str) -> None:
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        self.store.save(path / name)
+        with open(path / f"{name}.jsonl", "w", encoding="utf-8") as f:
+            header = {"model_name": self.model_name, "count": len(self.texts), "vector_store": self.store.spec, "lexical": self.bm25 is not None}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for text, metadata in zip(self.texts, self.metadatas):
+                f.write(json.dumps({"text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+        if self.bm25 is not None:
+            self.bm25.save(path / f"{name}.bm25.npz")
+        logger.info(f"LOCAL_INDEX: Индекс '{name}' сохранен в {path} ({len(self.texts)} фрагментов).")
+
+    @classmethod
+    def load(cls, index_dir: str, name: str) -> "LocalIndex":
+        path = Path(index_dir)
+        texts, metadatas = [], []
+        with open(path / f"{name}.jsonl", "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            for line in f:
+                record = json.loads(line)
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+        store = load_vector_store(path / name, header.get("vector_store", "flat"))
+        bm25 = None
+        if (path / f"{name}.bm25.npz").exists():
+            bm25 = BM25Index.load(path / f"{name}.bm25.npz")
+        elif header.get("lexical", True):
+            logger.warning(f"LOCAL_INDEX: Для индекса '{name}' нет BM25 ({name}.bm25.npz), используется только векторный поиск. Перестройте индекс.")
+        return cls(texts, metadatas, store, header.get("model_name", ""), bm25)
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Возвращает top-k (позиция документа, косинусная близость) по убыванию близости."""
+        if not len(self.texts):
+            return []
+        return self.store.search(_normalize(query_vector), k)
+
+    def similarity(self, query_vector: np.ndarray, positions: List[int]) -> np.ndarray:
+        """Косинусная близость запроса к документам positions (для найденных только BM25)."""
+        return self.store.similarity(_normalize(query_vector), positions)
+
+
+def _normalize(query_vector: np.ndarray) -> np.ndarray:
+    return normalize_rows(np.asarray([query_vector], dtype=np.float32))[0]
+
+
+def prepare_local_documents(statute_files: Dict[str, str], qa_files: Sequence[str] = (),
+                            md_files: Sequence[str] = ()) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Документы локального индекса: тексты законов, разобранные по статьям/частям/пунктам,
+    ответы на вопросы (qa_files) и справочные markdown-материалы (md_files).
+    """
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    for law, law_text in load_statutes(statute_files).items():
+        units = parse_statute(law_text, law)
+        for unit, piece in split_for_index(law_text, units):
+            texts.append(piece)
+            metadatas.append({
+                "corpus": "law", "law": unit.law, "article": unit.article, "part": unit.part, "item": unit.item,
+                "label": unit.label, "start": unit.start, "end": unit.end,
+            })
+    law_count = len(texts)
+    for text, metadata in deduplicate(load_qa_documents(qa_files) + load_md_documents(md_files)):
+        texts.append(text)
+        metadatas.append(metadata)
+    logger.info(f"LOCAL_INDEX: Подготовлено {len(texts)} фрагментов для индексации (законы: {law_count}, вопросы и справочные материалы: {len(texts) - law_count}).")
+    return texts, metadatas
+
+
+def build_law_index(embedding_model: Embeddings, model_name: str, statute_files: Dict[str, str],
+                    qa_files: Sequence[str] = (), md_files: Sequence[str] = (),
+                    vector_config: VectorStoreConfig = VectorStoreConfig()) -> LocalIndex:
+    """
+    Строит векторный и BM25 индексы по документам prepare_local_documents.
+    vector_config задает сжатие векторов и движок поиска (см. src/agent/vector_store.py).
+    """
+    texts, metadatas = prepare_local_documents(statute_files, qa_files, md_files)
+    return LocalIndex.build(texts, metadatas, embedding_model, model_name, vector_config)
+
+
+def vector_store_config() -> VectorStoreConfig:
+    """Параметры хранилища векторов локального индекса из settings.tools."""
+    tools = settings.tools
+    return VectorStoreConfig(
+        encoding=tools.local_index_encoding, engine=tools.local_index_engine, pca_dim=tools.local_index_pca_dim,
+        pq_m=tools.local_index_pq_m, hnsw_m=tools.local_index_hnsw_m, ivf_nlist=tools.local_index_ivf_nlist,
+    )
+
+
+_law_index: Optional[LocalIndex] = None
+_law_index_loaded = False
+_law_index_lock = threading.Lock()
+
+
+def load_local_index(name: str, title: str) -> Optional[LocalIndex]:
+    """
+    Загружает индекс name из local_index_dir; None, если его нет, он построен другой моделью эмбеддингов
+    или не читается (title — название индекса для логов).
+    """
+    try:
+        index = LocalIndex.load(settings.tools.local_index_dir, name)
+    except FileNotFoundError:
+        logger.warning(f"LOCAL_INDEX: Индекс {title} не найден в {settings.tools.local_index_dir}. Запустите scripts/build_local_index.py.")
+        return None
+    except Exception as e:
+        logger.error(f"LOCAL_INDEX: Ошибка загрузки индекса {title}: {e}", exc_info=True)
+        return None
+    if index.model_name != settings.embeddings.embedding_model_name:
+        logger.warning(f"LOCAL_INDEX: Индекс {title} построен моделью '{index.model_name}', а текущая модель — '{settings.embeddings.embedding_model_name}'. Индекс не используется, перестройте его.")
+        return None
+    index.store.set_search_params(settings.tools.local_index_hnsw_ef_search, settings.tools.local_index_ivf_nprobe)
+    logger.info(f"LOCAL_INDEX: Индекс {title} загружен ({len(index.texts)} фрагментов, векторы: {index.store.spec}).")
+    return index
+
+
+def get_law_index() -> Optional[LocalIndex]:
+    """Возвращает загруженный с диска индекс законов (или None, если он не построен / отключен)."""
+    global _law_index, _law_index_loaded
+    if _law_index_loaded:
+        return _law_index
+    with _law_index_lock:
+        if _law_index_loaded:
+            return _law_index
+        if settings.tools.local_index_enabled:
+            _law_index = load_local_index(LAW_INDEX_NAME, "законов")
+        _law_index_loaded = True
+    return _law_index
+
+
+def retrieve_local_context(query_vector: np.ndarray, query: Optional[str] = None) -> Tuple[Optional[str], float]:
+    """
+    Ищет фрагменты законов, ответов на вопросы и справочных материалов в локальном индексе.
+    При заданном тексте запроса и local_index_hybrid_enabled векторное ранжирование объединяется
+    с BM25 (точные термины и номера: "НМЦК", "ч. 15 ст. 99") методом reciprocal rank fusion.
+    Возвращает (контекст для синтеза, лучшая косинусная близость); контекст None, если индекс недоступен
+    или локальный recall слабый: лучшая близость ниже local_index_min_score и лучшие документы
+    векторного поиска и BM25 не совпадают (или близость ниже local_index_agreement_min_score).
+    Контекст не длиннее prompts.synthesis_context_chars(): фрагменты, которые в него не помещаются, отбрасываются.
+    """
+    index = get_law_index()
+    if index is None or not index.texts:
+        return None, 0.0
+    tools = settings.tools
+    hybrid = bool(query) and tools.local_index_hybrid_enabled and index.bm25 is not None
+    dense_hits = index.search(query_vector, tools.local_index_candidates if hybrid else tools.local_index_top_k)
+    if not dense_hits:
+        return None, 0.0
+    scores = dict(dense_hits)
+    dense = [position for position, _ in dense_hits]
+    lexical = [position for position, _ in index.bm25.search(query, tools.local_index_candidates)] if hybrid else []
+    best_score = dense_hits[0][1]
+
+    agreement = bool(lexical) and lexical[0] == dense[0] and best_score >= tools.local_index_agreement_min_score
+    if best_score < tools.local_index_min_score and not agreement:
+        logger.info(f"LOCAL_INDEX: Слабый локальный recall (лучшая близость {best_score:.3f} < {tools.local_index_min_score}, BM25 {'совпадает' if lexical and lexical[0] == dense[0] else 'не совпадает'}).")
+        return None, best_score
+
+    if lexical:
+        hits = [position for position, _ in reciprocal_rank_fusion([dense, lexical])[:tools.local_index_top_k]]
+        missing = [position for position in hits if position not in scores]
+        if missing:
+            scores.update(zip(missing, map(float, index.similarity(query_vector, missing))))
+        # Найденное только по BM25 с низкой близостью — скорее случайное совпадение слов.
+        min_score = tools.local_index_agreement_min_score
+    else:
+        hits = dense[:tools.local_index_top_k]
+        min_score = tools.local_index_min_score
+
+    context_parts = []
+    for position in hits:
+        score = scores[position]
+        if score < min_score:
+            continue
+        metadata = index.metadatas[position]
+        corpus = CORPUS_TITLES.get(metadata.get("corpus"), CORPUS_TITLES["law"])
+        context_parts.append(f"... (источник: {metadata['label']}, {corpus}, близость ~{score:.2f}) ...\n{index.texts[position]}\n...")
+    context, used = fit_context_parts(
+        "Информация из локальной базы (тексты законов, ответы на вопросы, справочные материалы):\n",
+        context_parts, synthesis_context_chars(),
+    )
+    logger.info(f"LOCAL_INDEX: Найдено {len(context_parts)} фрагментов, в контекст вошло {used} (~{len(context)} симв., лучшая близость {best_score:.3f}, BM25-кандидатов {len(lexical)}).")
+    return context, best_score
@@ -1,22 +1,61 @@
 import logging
-from functools import lru_cache
+import threading
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Union, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Union, Optional
 
-from langchain_community.llms import LlamaCpp
-from langchain_google_genai import ChatGoogleGenerativeAI
-
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.language_models.base import BaseLanguageModel
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import HumanMessage
 from pydantic import SecretStr
 
 from src.config import settings
+from src.agent.llm_pool import LocalLLMPool
+from src.utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.utils.timings import timed
+
+if TYPE_CHECKING:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
 logger = logging.getLogger(__name__)
 
 
-@lru_cache(maxsize=1)
+def _load_once(loader: Callable) -> Callable:
+    """
+    Кеширует результат загрузчика и не дает загрузить модель дважды, если к ней одновременно
+    обращаются фоновый прогрев и первый запрос: второй вызов ждет завершения первого.
+    """
+    cached_loader = lru_cache(maxsize=1)(loader)
+    lock = threading.Lock()
+
+    @wraps(loader)
+    def wrapper():
+        with lock:
+            return cached_loader()
+
+    wrapper.cache_clear = cached_loader.cache_clear
+    return wrapper
+
+
+def local_llm_kwargs() -> Dict[str, Any]:
+    """Параметры LlamaCpp для локальной модели (общие для основного процесса и реплик пула)."""
+    model_path_str = settings.local_llm.model_gguf_path
+    if not model_path_str or not Path(model_path_str).is_file():
+        logger.error(f"Файл локальной модели LLM не найден: {model_path_str}")
+        raise FileNotFoundError(f"Модель LLM не найдена по пути: {model_path_str}")
+    return dict(
+        model_path=str(Path(model_path_str)),
+        n_gpu_layers=settings.local_llm.n_gpu_layers,
+        n_batch=settings.local_llm.n_batch,
+        n_ctx=settings.local_llm.n_ctx,
+        temperature=settings.temperature,
+        max_tokens=settings.max_tokens,
+        verbose=settings.llm_verbose,
+        streaming=False,
+    )
+
+
+@_load_once
 def load_llm() -> Union[BaseLanguageModel, BaseChatModel]:
     """Загружает LLM или ChatModel в зависимости от провайдера в настройках."""
     if not settings:
@@ -27,24 +66,14 @@ def load_llm() -> Union[BaseLanguageModel, BaseChatModel]:
 
     if provider == "local":
 
-        model_path_str = settings.local_llm.model_gguf_path
-        if not model_path_str or not Path(model_path_str).is_file():
-            logger.error(f"Файл локальной модели LLM не найден: {model_path_str}")
-            raise FileNotFoundError(f"Модель LLM не найдена по пути: {model_path_str}")
-        model_path = Path(model_path_str)
+        llm_kwargs = local_llm_kwargs()
         try:
-            logger.info(f"Загрузка LlamaCpp LLM из: {model_path}")
+            with timed("import:llama_cpp"):
+                from langchain_community.llms import LlamaCpp
+            logger.info(f"Загрузка LlamaCpp LLM из: {llm_kwargs['model_path']}")
             logger.info(f"Параметры LlamaCpp: n_gpu_layers={settings.local_llm.n_gpu_layers}, ...")
-            llm = LlamaCpp(
-                model_path=str(model_path),
-                n_gpu_layers=settings.local_llm.n_gpu_layers,
-                n_batch=settings.local_llm.n_batch,
-                n_ctx=settings.local_llm.n_ctx,
-                temperature=settings.temperature,
-                max_tokens=settings.max_tokens,
-                verbose=settings.llm_verbose,
-                streaming=False,
-            )
+            with timed("load:llm"):
+                llm = LlamaCpp(**llm_kwargs)
             logger.info("LlamaCpp LLM успешно загружена.")
             return llm
         except Exception as e:
@@ -75,6 +104,8 @@ def load_llm() -> Union[BaseLanguageModel, BaseChatModel]:
             raise ValueError("Ключ Google API не задан или не удалось извлечь его значение для провайдера gemini.")
 
         try:
+            with timed("import:langchain_google_genai"):
+                from langchain_google_genai import ChatGoogleGenerativeAI
             logger.info(f"Инициализация ChatGoogleGenerativeAI (из langchain-google-genai)...")
             llm = ChatGoogleGenerativeAI(
                 model=settings.gemini_llm.gemini_model_name,
@@ -84,8 +115,12 @@ def load_llm() -> Union[BaseLanguageModel, BaseChatModel]:
                 convert_system_message_to_human=True
             )
 
-            logger.debug("Выполняется пробный вызов ChatGoogleGenerativeAI...")
-            _ = llm.invoke([HumanMessage(content="test")])
+            if settings.model_probe_calls:
+                from langchain_core.messages import HumanMessage
+
+                logger.debug("Выполняется пробный вызов ChatGoogleGenerativeAI...")
+                with timed("probe:llm"):
+                    _ = llm.invoke([HumanMessage(content="test")])
             logger.info(f"Google ChatGoogleGenerativeAI ({settings.gemini_llm.gemini_model_name}) успешно инициализирован.")
             return llm
         except ImportError:
@@ -99,8 +134,22 @@ def load_llm() -> Union[BaseLanguageModel, BaseChatModel]:
 
 
 
-@lru_cache(maxsize=1)
-def load_embedding_model() -> HuggingFaceEmbeddings:
+@_load_once
+def load_llm_pool() -> LocalLLMPool:
+    """Запускает пул реплик локальной модели в отдельных процессах (N_REPLICAS > 1)."""
+    local = settings.local_llm
+    logger.info(f"Запуск пула из {local.n_replicas} реплик LlamaCpp (n_threads на реплику: {local.n_threads_per_replica or 'по ядрам'}).")
+    with timed("load:llm_pool"):
+        return LocalLLMPool(
+            local_llm_kwargs(),
+            replicas=local.n_replicas,
+            threads_per_replica=local.n_threads_per_replica,
+            pin_cores=local.pin_replica_cores,
+        )
+
+
+@_load_once
+def load_embedding_model() -> "HuggingFaceEmbeddings":
     """Загружает модель эмбеддингов."""
     if not settings:
         raise ValueError("Настройки не инициализированы!")
@@ -108,12 +157,18 @@ def load_embedding_model() -> HuggingFaceEmbeddings:
     device = settings.embeddings.embedding_device
     logger.info(f"Загрузка модели эмбеддингов: '{model_name}' на устройство: '{device}'")
     try:
-        embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={'device': device},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        _ = embeddings.embed_query("test")
+        with timed("import:sentence_transformers"):
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            import sentence_transformers  # noqa: F401 (импортируется здесь, чтобы замер не смешивал импорт и загрузку модели)
+        with timed("load:embeddings"):
+            embeddings = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={'device': device},
+                encode_kwargs={'normalize_embeddings': True}
+            )
+        if settings.model_probe_calls:
+            with timed("probe:embeddings"):
+                _ = embeddings.embed_query("test")
         logger.info(f"Модель эмбеддингов '{model_name}' успешно загружена на устройство '{device}'.")
         return embeddings
     except Exception as e:
@@ -121,14 +176,34 @@ def load_embedding_model() -> HuggingFaceEmbeddings:
         raise e
 
 
-try:
+@_load_once
+def load_cached_embedding_model() -> Embeddings:
+    """Возвращает модель эмбеддингов, обернутую персистентным кешем векторов (если кеш включен в настройках)."""
+    base_model = load_embedding_model()
+    if not settings.cache.embedding_cache_enabled:
+        return base_model
+    try:
+        cache = EmbeddingCache(
+            cache_dir=settings.cache.cache_dir,
+            model_name=settings.embeddings.embedding_model_name,
+            max_entries=settings.cache.embedding_cache_max_entries,
+            dtype=settings.cache.embedding_cache_dtype,
+        )
+        return CachedEmbeddings(base_model, cache)
+    except Exception as e:
+        logger.error(f"Не удалось открыть кеш эмбеддингов, используется модель без кеша: {e}", exc_info=True)
+        return base_model
 
-    llm_instance = load_llm()
 
-    embedding_instance = load_embedding_model()
-except Exception as init_error:
-     logger.critical(f"КРИТИЧЕСКАЯ ОШИБКА при загрузке моделей: {init_error}", exc_info=True)
-     llm_instance = None
-     embedding_instance = None
+llm_instance = None
+embedding_instance = None
+if not settings.lazy_model_loading:
+    # Без ленивого режима модели загружаются сразу при импорте (в режиме пула LLM загружается в процессах-репликах).
+    try:
+        if not (settings.llm_provider == "local" and settings.local_llm.n_replicas > 1):
+            llm_instance = load_llm()
+        embedding_instance = load_embedding_model()
+    except Exception as init_error:
+        logger.critical(f"КРИТИЧЕСКАЯ ОШИБКА при загрузке моделей: {init_error}", exc_info=True)
 
-__all__ = ["llm_instance", "embedding_instance", "load_llm", "load_embedding_model"]
\ No newline at end of file
+__all__ = ["llm_instance", "embedding_instance", "load_llm", "load_llm_pool", "local_llm_kwargs", "load_embedding_model", "load_cached_embedding_model"]
\ No newline at end of file
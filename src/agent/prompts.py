@@ -1,5 +1,7 @@
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, MessagesPlaceholder
 
+from src.config import settings
+
 DECIDE_SEARCH_PROMPT_TEMPLATE = """Оцени следующий запрос пользователя по госзакупкам (44-ФЗ, 223-ФЗ).
 Нужно ли для точного, актуального и полного ответа искать информацию на внешних доверенных ресурсах (законы, статьи, практика, конкретные детали)?
 Ответь ТОЛЬКО ОДНИМ СЛОВОМ: YES или NO.
@@ -44,6 +46,37 @@ GENERATE_SEARCH_QUERY_PROMPT_TEMPLATE = """Проанализируй запро
 """
 GENERATE_SEARCH_QUERY_PROMPT = PromptTemplate.from_template(GENERATE_SEARCH_QUERY_PROMPT_TEMPLATE)
 
+PLAN_SEARCH_PROMPT_TEMPLATE = """Проанализируй запрос пользователя по госзакупкам (44-ФЗ, 223-ФЗ) и составь план поиска.
+
+1.  Реши, нужно ли для точного, актуального и полного ответа искать информацию на внешних доверенных ресурсах (законы, статьи, практика, конкретные детали): YES или NO.
+2.  Если поиск нужен, сгенерируй ОДИН лаконичный и точный поисковый запрос на русском языке для доверенных сайтов (zakupki.gov.ru, consultant.ru, garant.ru и т.д.):
+    *   используй ключевые термины запроса и сфокусируйся на интересующем аспекте (порядок, сроки, требования, ответственность и т.п.);
+    *   добавь "44-ФЗ" или "223-ФЗ", если закон указан или уверенно следует из контекста; для общих вопросов 44-ФЗ более вероятен.
+    Если поиск не нужен, оставь запрос пустым.
+
+Выведи ТОЛЬКО JSON-объект ровно такого вида, без пояснений:
+{{"search": "YES", "query": "поисковый запрос"}}
+
+Примеры:
+Запрос пользователя: "Как подать заявку на участие в электронном аукционе для СМП?"
+Результат: {{"search": "YES", "query": "подача заявки электронный аукцион СМП 44-ФЗ"}}
+
+Запрос пользователя: "Привет! Что ты умеешь?"
+Результат: {{"search": "NO", "query": ""}}
+
+Запрос пользователя:
+{user_query}
+"""
+PLAN_SEARCH_PROMPT = PromptTemplate.from_template(PLAN_SEARCH_PROMPT_TEMPLATE)
+
+# Грамматика GBNF для LlamaCpp: ограничивает ответ планировщика JSON-объектом нужного вида.
+PLAN_SEARCH_GRAMMAR = r"""
+root ::= "{" ws "\"search\"" ws ":" ws decision ws "," ws "\"query\"" ws ":" ws string ws "}"
+decision ::= "\"YES\"" | "\"NO\""
+string ::= "\"" ( [^"\\\n] | "\\" ["\\/bfnrt] )* "\""
+ws ::= [ \t\n]*
+"""
+
 
 SYNTHESIZE_ANSWER_PROMPT_TEMPLATE = """Ты — эксперт-ассистент по госзакупкам в Российской Федерации (44-ФЗ и 223-ФЗ).
 Твоя задача — дать ПОЛНЫЙ, ТОЧНЫЙ и СТРУКТУРИРОВАННЫЙ ответ на запрос пользователя, основываясь **ИСКЛЮЧИТЕЛЬНО** на предоставленной ниже информации.
@@ -65,4 +98,20 @@ SYNTHESIZE_ANSWER_PROMPT_TEMPLATE = """Ты — эксперт-ассистен
 
 ФИНАЛЬНЫЙ ОТВЕТ:
 """
-SYNTHESIZE_ANSWER_PROMPT = PromptTemplate.from_template(SYNTHESIZE_ANSWER_PROMPT_TEMPLATE)
\ No newline at end of file
+SYNTHESIZE_ANSWER_PROMPT = PromptTemplate.from_template(SYNTHESIZE_ANSWER_PROMPT_TEMPLATE)
+
+# Консервативная оценка: сколько символов русского текста приходится на один токен локальной модели.
+CHARS_PER_TOKEN = 2.5
+
+
+def synthesis_context_chars() -> int:
+    """
+    Сколько символов контекста (веб-RAG, локальная база, цитаты законов, типовые ответы) помещается в промпт синтеза:
+    не больше tools.context_max_chars, а для локальной модели — не больше остатка окна n_ctx за вычетом
+    ответа (max_tokens) и шаблона SYNTHESIZE_ANSWER_PROMPT.
+    """
+    limit = settings.tools.context_max_chars
+    if settings.llm_provider == "local":
+        window_chars = int((settings.local_llm.n_ctx - settings.max_tokens) * CHARS_PER_TOKEN)
+        limit = min(limit, max(window_chars - len(SYNTHESIZE_ANSWER_PROMPT_TEMPLATE), 0))
+    return limit
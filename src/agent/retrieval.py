@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Константа сглаживания RRF: вклад документа на позиции r равен 1 / (RRF_K + r).
+RRF_K = 60
+CLIPPED_MARK = "\n... (фрагмент обрезан)"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Нормирует строки матрицы на единичную длину (нулевые строки остаются нулевыми)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Позиции k наибольших оценок по убыванию (argpartition + сортировка только k элементов)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Объединяет несколько ранжирований (списки позиций документов, лучшие первыми) по формуле RRF:
+    score(d) = sum(1 / (k + rank(d))). Оценки разных шкал (косинус, BM25) не сравниваются напрямую.
+    При равенстве выше документ, раньше встреченный в первом ранжировании.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking, start=1):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+def fit_context_parts(header: str, parts: Sequence[str], max_chars: int, separator: str = "\n\n") -> Tuple[str, int]:
+    """
+    Собирает контекст синтеза из заголовка и фрагментов (лучшие первыми) не длиннее max_chars:
+    фрагмент, не помещающийся целиком, пропускается; если не помещается даже первый, он обрезается.
+    Возвращает (контекст, сколько фрагментов вошло).
+    """
+    text, used = header, 0
+    for part in parts:
+        candidate = f"{text}{separator if used else ''}{part}"
+        if len(candidate) <= max_chars:
+            text, used = candidate, used + 1
+    if not used and parts:
+        text, used = f"{header}{parts[0]}"[:max(0, max_chars - len(CLIPPED_MARK))] + CLIPPED_MARK, 1
+    return text, used
+
+
+def rank_chunks_for_pages(
+    pages_chunks: Sequence[List[Document]],
+    query: str,
+    embedding_model: Embeddings,
+    k: int,
+) -> List[List[Document]]:
+    """
+    Ранжирует чанки нескольких страниц по запросу за один проход:
+    все чанки векторизуются одним вызовом embed_documents, запрос — одним embed_query,
+    косинусная близость считается одним матричным умножением.
+    Для каждой страницы возвращает top-k ее чанков (по убыванию близости, score в metadata).
+    """
+    texts = [chunk.page_content for chunks in pages_chunks for chunk in chunks]
+    if not texts:
+        return [[] for _ in pages_chunks]
+
+    logger.debug(f"RETRIEVAL: Векторизация {len(texts)} чанков с {len(pages_chunks)} страниц одним батчем...")
+    with span("embed", chunks=len(texts), chars=sum(len(text) for text in texts)):
+        doc_vectors = normalize_rows(np.asarray(embedding_model.embed_documents(texts), dtype=np.float32))
+        query_vector = normalize_rows(np.asarray([embedding_model.embed_query(query)], dtype=np.float32))[0]
+
+    with span("rank", chunks=len(texts), pages=len(pages_chunks), k=k):
+        scores = doc_vectors @ query_vector
+        ranked_pages: List[List[Document]] = []
+        offset = 0
+        for chunks in pages_chunks:
+            page_scores = scores[offset:offset + len(chunks)]
+            offset += len(chunks)
+            top_indices = np.argsort(-page_scores, kind="stable")[:k]
+            ranked = []
+            for idx in top_indices:
+                doc = chunks[int(idx)]
+                doc.metadata["score"] = float(page_scores[idx])
+                ranked.append(doc)
+            ranked_pages.append(ranked)
+    logger.debug(f"RETRIEVAL: Ранжирование завершено (k={k} на страницу).")
+    return ranked_pages
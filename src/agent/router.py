@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+from src.agent.retrieval import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+SEARCH_ROUTER_FILE = "search_router.npz"
+
+
+def load_router_dataset(qa_files: List[str], no_search_file: str) -> Tuple[List[str], List[int]]:
+    """
+    Собирает обучающую выборку для классификатора: вопросы из Q&A-корпусов (предметные вопросы
+    по закупкам, для которых нужен поиск, метка 1) и запросы без поиска из no_search_file (метка 0).
+    """
+    texts: List[str] = []
+    labels: List[int] = []
+    for qa_file in qa_files:
+        try:
+            with open(qa_file, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"ROUTER: Файл Q&A не найден: {qa_file}")
+            continue
+        questions = [str(r.get("question", "")).strip() for r in records if isinstance(r, dict)]
+        questions = [q for q in questions if q]
+        texts.extend(questions)
+        labels.extend([1] * len(questions))
+        logger.info(f"ROUTER: Загружено {len(questions)} вопросов из {qa_file}")
+
+    with open(no_search_file, "r", encoding="utf-8") as f:
+        negatives = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    texts.extend(negatives)
+    labels.extend([0] * len(negatives))
+    logger.info(f"ROUTER: Загружено {len(negatives)} запросов без поиска из {no_search_file}")
+
+    unique: Dict[str, int] = {}
+    for text, label in zip(texts, labels):
+        unique.setdefault(text, label)
+    return list(unique), list(unique.values())
+
+
+class SearchRouter:
+    """
+    Логистическая регрессия над эмбеддингом запроса: оценивает вероятность того, что для ответа
+    нужен поиск. Обучается через scikit-learn, а на инференсе — одно скалярное произведение в NumPy,
+    поэтому scikit-learn нужен только для обучения.
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: float, model_name: str):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = float(intercept)
+        self.model_name = model_name
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, labels: List[int], model_name: str, c: float = 4.0) -> "SearchRouter":
+        from sklearn.linear_model import LogisticRegression
+
+        classifier = LogisticRegression(C=c, class_weight="balanced", max_iter=2000)
+        classifier.fit(normalize_rows(np.asarray(vectors, dtype=np.float32)), np.asarray(labels))
+        return cls(classifier.coef_[0], classifier.intercept_[0], model_name)
+
+    def predict_proba(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Вероятность «поиск нужен» для каждой строки матрицы векторов запросов."""
+        vectors = normalize_rows(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        return 1.0 / (1.0 + np.exp(-(vectors @ self.coef + self.intercept)))
+
+    def save(self, index_dir: str) -> None:
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        np.savez(path / SEARCH_ROUTER_FILE, coef=self.coef, intercept=np.float32(self.intercept), model_name=np.array(self.model_name))
+        logger.info(f"ROUTER: Классификатор сохранен в {path / SEARCH_ROUTER_FILE}")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "SearchRouter":
+        with np.load(Path(index_dir) / SEARCH_ROUTER_FILE) as data:
+            return cls(data["coef"], float(data["intercept"]), str(data["model_name"]))
+
+
+_search_router: Optional[SearchRouter] = None
+_search_router_loaded = False
+_search_router_lock = threading.Lock()
+
+
+def get_search_router() -> Optional[SearchRouter]:
+    """Возвращает загруженный с диска классификатор (или None, если он не обучен / отключен)."""
+    global _search_router, _search_router_loaded
+    if _search_router_loaded:
+        return _search_router
+    with _search_router_lock:
+        if _search_router_loaded:
+            return _search_router
+        if settings.tools.search_router_enabled:
+            try:
+                _search_router = SearchRouter.load(settings.tools.local_index_dir)
+                if _search_router.model_name != settings.embeddings.embedding_model_name:
+                    logger.warning(f"ROUTER: Классификатор обучен на эмбеддингах '{_search_router.model_name}', а текущая модель — '{settings.embeddings.embedding_model_name}'. Классификатор не используется, переобучите его.")
+                    _search_router = None
+                else:
+                    logger.info("ROUTER: Классификатор необходимости поиска загружен.")
+            except FileNotFoundError:
+                logger.info(f"ROUTER: Классификатор не найден в {settings.tools.local_index_dir}, решение о поиске принимает LLM. Запустите scripts/train_search_router.py.")
+            except Exception as e:
+                logger.error(f"ROUTER: Ошибка загрузки классификатора: {e}", exc_info=True)
+                _search_router = None
+        _search_router_loaded = True
+    return _search_router
+
+
+def route_search(query_vector: np.ndarray) -> Tuple[Optional[bool], float]:
+    """
+    Решает, нужен ли поиск, по вектору запроса.
+    Возвращает (решение, вероятность «поиск нужен»); решение None, если классификатор недоступен
+    или не уверен (уверенность ниже search_router_min_confidence) — тогда решает LLM.
+    """
+    router = get_search_router()
+    if router is None:
+        return None, 0.5
+    probability = float(router.predict_proba(query_vector)[0])
+    confidence = max(probability, 1.0 - probability)
+    if confidence < settings.tools.search_router_min_confidence:
+        return None, probability
+    return probability >= 0.5, probability
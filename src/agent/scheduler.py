@@ -0,0 +1,238 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Классы приоритета: меньше — раньше. Короткие промпты планирования идут впереди синтеза."""
+    PLANNING = 0
+    SYNTHESIS = 1
+
+
+class SchedulerBusyError(RuntimeError):
+    """Очередь планировщика заполнена — запрос отклонен (backpressure)."""
+
+
+_STREAM_END = object()
+
+
+@dataclass(order=True)
+class _InferenceRequest:
+    priority: int
+    seq: int
+    prompt: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False)
+    future: Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    stream_queue: Optional["queue.Queue"] = field(default=None, compare=False)
+    stream_cancelled: Optional[threading.Event] = field(default=None, compare=False)
+
+
+class InferenceScheduler:
+    """
+    Владеет экземпляром локальной LLM и выполняет запросы к ней в concurrency рабочих потоках
+    (1 — строго по одному; для пула реплик — по числу реплик). Запросы принимаются из любых потоков
+    и корутин и обслуживаются по приоритету
+    (внутри класса — в порядке поступления). Глубина очереди ограничена: при заполнении submit ждет
+    свободного места не дольше enqueue_timeout и затем отклоняет запрос (SchedulerBusyError).
+    """
+
+    def __init__(self, llm: Any, max_queue_depth: int = 32, enqueue_timeout: float = 5.0, metrics_window: int = 1000,
+                 concurrency: int = 1):
+        self.llm = llm
+        self.concurrency = max(1, concurrency)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: "queue.PriorityQueue[_InferenceRequest]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._slots = threading.Condition()
+        self._pending = 0
+        self._metrics_lock = threading.Lock()
+        self._wait_times: Dict[Priority, Deque[float]] = {p: deque(maxlen=metrics_window) for p in Priority}
+        self._service_times: Dict[Priority, Deque[float]] = {p: deque(maxlen=metrics_window) for p in Priority}
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0}
+        self._workers = [
+            threading.Thread(target=self._run, name=f"llm-scheduler-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, prompt: str, priority: Priority = Priority.SYNTHESIS, **kwargs: Any) -> Future:
+        """Ставит запрос llm.invoke в очередь и возвращает Future с ответом."""
+        return self._enqueue(prompt, priority, kwargs).future
+
+    def invoke(self, prompt: str, priority: Priority = Priority.SYNTHESIS, **kwargs: Any) -> Any:
+        return self.submit(prompt, priority, **kwargs).result()
+
+    async def ainvoke(self, prompt: str, priority: Priority = Priority.SYNTHESIS, **kwargs: Any) -> Any:
+        """Ожидает ответ, не блокируя event loop; отмена корутины снимает запрос, если он еще в очереди."""
+        future = await asyncio.to_thread(self.submit, prompt, priority, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    def stream(self, prompt: str, priority: Priority = Priority.SYNTHESIS, **kwargs: Any) -> Iterator[Any]:
+        """
+        Потоковая генерация через очередь: фрагменты llm.stream передаются вызывающему по мере появления.
+        Если потребитель прекращает чтение, генерация останавливается на следующем фрагменте.
+        """
+        request = self._enqueue(prompt, priority, kwargs, stream=True)
+        try:
+            while True:
+                item = request.stream_queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            request.stream_cancelled.set()
+            request.future.cancel()
+
+    def queue_depth(self) -> int:
+        with self._slots:
+            return self._pending
+
+    def is_saturated(self) -> bool:
+        return self.queue_depth() >= self.max_queue_depth
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики и перцентили времени ожидания в очереди и обслуживания (мс) по классам приоритета."""
+        queue_depth = self.queue_depth()
+        with self._metrics_lock:
+            result: Dict[str, Any] = dict(self._counters)
+            result["queue_depth"] = queue_depth
+            result["max_queue_depth"] = self.max_queue_depth
+            result["concurrency"] = self.concurrency
+            for priority in Priority:
+                name = priority.name.lower()
+                result[f"{name}_queue_wait_ms"] = _percentiles(self._wait_times[priority])
+                result[f"{name}_service_ms"] = _percentiles(self._service_times[priority])
+        return result
+
+    def _enqueue(self, prompt: str, priority: Priority, kwargs: Dict[str, Any], stream: bool = False) -> _InferenceRequest:
+        deadline = time.monotonic() + max(0.0, self.enqueue_timeout)
+        accepted = True
+        with self._slots:
+            while self._pending >= self.max_queue_depth:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    accepted = False
+                    break
+                self._slots.wait(remaining)
+            if accepted:
+                self._pending += 1
+            depth = self._pending
+        if not accepted:
+            with self._metrics_lock:
+                self._counters["rejected"] += 1
+            logger.warning(f"SCHEDULER: Очередь LLM заполнена ({depth}/{self.max_queue_depth}), запрос отклонен.")
+            raise SchedulerBusyError(f"Очередь LLM переполнена ({self.max_queue_depth} запросов), попробуйте позже.")
+        request = _InferenceRequest(
+            int(priority), next(self._seq), prompt, kwargs, Future(), time.perf_counter(),
+            stream_queue=queue.Queue() if stream else None,
+            stream_cancelled=threading.Event() if stream else None,
+        )
+        with self._metrics_lock:
+            self._counters["submitted"] += 1
+        self._queue.put(request)
+        logger.debug(f"SCHEDULER: Запрос поставлен в очередь (приоритет {Priority(priority).name}, глубина {depth}).")
+        return request
+
+    def _release_slot(self) -> None:
+        with self._slots:
+            self._pending -= 1
+            self._slots.notify()
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            priority = Priority(request.priority)
+            try:
+                if not request.future.set_running_or_notify_cancel():
+                    with self._metrics_lock:
+                        self._counters["cancelled"] += 1
+                    continue
+                started = time.perf_counter()
+                with self._metrics_lock:
+                    self._wait_times[priority].append(started - request.enqueued_at)
+                try:
+                    if request.stream_queue is not None:
+                        result = self._run_stream(request)
+                    else:
+                        result = self.llm.invoke(request.prompt, **request.kwargs)
+                    request.future.set_result(result)
+                    outcome = "completed"
+                except BaseException as e:
+                    if request.stream_queue is not None:
+                        request.stream_queue.put(e)
+                    request.future.set_exception(e)
+                    outcome = "failed"
+                    logger.error(f"SCHEDULER: Ошибка выполнения запроса к LLM: {e}", exc_info=True)
+                with self._metrics_lock:
+                    self._service_times[priority].append(time.perf_counter() - started)
+                    self._counters[outcome] += 1
+            finally:
+                self._release_slot()
+
+    def _run_stream(self, request: _InferenceRequest) -> None:
+        for chunk in self.llm.stream(request.prompt, **request.kwargs):
+            if request.stream_cancelled.is_set():
+                logger.info("SCHEDULER: Потребитель потока отключился, генерация остановлена.")
+                break
+            request.stream_queue.put(chunk)
+        request.stream_queue.put(_STREAM_END)
+
+
+def _percentiles(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(values),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+class ScheduledLLM:
+    """
+    Обертка над локальной LLM с интерфейсом invoke / ainvoke / stream, направляющая вызовы
+    через InferenceScheduler. with_priority возвращает представление с другим классом приоритета.
+    """
+
+    def __init__(self, scheduler: InferenceScheduler, priority: Priority = Priority.SYNTHESIS):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    def with_priority(self, priority: Priority) -> "ScheduledLLM":
+        return ScheduledLLM(self.scheduler, priority)
+
+    def invoke(self, prompt: str, **kwargs: Any) -> Any:
+        return self.scheduler.invoke(prompt, self.priority, **kwargs)
+
+    async def ainvoke(self, prompt: str, **kwargs: Any) -> Any:
+        return await self.scheduler.ainvoke(prompt, self.priority, **kwargs)
+
+    def stream(self, prompt: str, **kwargs: Any) -> Iterator[Any]:
+        return self.scheduler.stream(prompt, self.priority, **kwargs)
+
+
+def with_priority(llm: Any, priority: Priority) -> Any:
+    """Возвращает llm с заданным приоритетом (для моделей без планировщика — без изменений)."""
+    return llm.with_priority(priority) if isinstance(llm, ScheduledLLM) else llm
+
+
+__all__ = ["InferenceScheduler", "Priority", "ScheduledLLM", "SchedulerBusyError", "with_priority"]
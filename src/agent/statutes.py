@@ -0,0 +1,194 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.text_chunker import TextChunker
+
+logger = logging.getLogger(__name__)
+
+
+ARTICLE_RE = re.compile(r"Статья\s*(\d+(?:\.\d+)*)\.\s*")
+HEADING_RE = re.compile(r"(?:Глава\s*\d+(?:\.\d+)*\.|§\s*\d+(?:\.\d+)*\.)")
+PART_RE = re.compile(r"(?<!\S)(\d+(?:\.\d+)*)\.\s+(?=[А-ЯЁA-Z«\"])")
+ITEM_RE = re.compile(r"(?<!\S)(\d+(?:\.\d+)*)\)\s+")
+SENTENCE_END_RE = re.compile(r"[.;:]\s+")
+TITLE_NOTE_RE = re.compile(r"\s(?:Дополнительно включена|Утратила силу|Статья в редакции|Наименование в редакции)")
+
+MAX_TITLE_CHARS = 500
+
+
+@dataclass
+class StatuteUnit:
+    """Структурная единица закона (статья, часть или пункт) с позициями в исходном тексте."""
+    law: str
+    article: str
+    part: Optional[str]
+    item: Optional[str]
+    start: int
+    end: int
+    title: str = ""
+
+    @property
+    def label(self) -> str:
+        """Человекочитаемая ссылка, например '44-ФЗ, ст. 34, ч. 5, п. 2'."""
+        parts = [self.law, f"ст. {self.article}"]
+        if self.part:
+            parts.append(f"ч. {self.part}")
+        if self.item:
+            parts.append(f"п. {self.item}")
+        return ", ".join(parts)
+
+
+def _number_key(number: str) -> Tuple[int, ...]:
+    return tuple(int(x) for x in number.split("."))
+
+
+def _follows(previous: Optional[str], candidate: str) -> bool:
+    """Проверяет, что candidate — следующий номер после previous (1 -> 2, 5 -> 5.1, 5.1 -> 5.2, 5.1 -> 6)."""
+    current = _number_key(candidate)
+    if previous is None:
+        return current == (1,)
+    prev = _number_key(previous)
+    if len(current) == 1:
+        return current[0] == prev[0] + 1
+    if len(current) == 2 and current[0] == prev[0]:
+        return current[1] == (prev[1] + 1 if len(prev) == 2 else 1)
+    return False
+
+
+def _sequential_matches(pattern: "re.Pattern", text: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+    """Находит нумерованные элементы (номер, начало, начало текста), идущие подряд по номерам."""
+    found: List[Tuple[str, int, int]] = []
+    previous: Optional[str] = None
+    for match in pattern.finditer(text, start, end):
+        number = match.group(1)
+        if _follows(previous, number):
+            found.append((number, match.start(), match.end()))
+            previous = number
+    return found
+
+
+def parse_statute(text: str, law: str) -> List[StatuteUnit]:
+    """
+    Разбирает текст закона на статьи, части ("N. ") и пункты ("N) ").
+    Номера частей и пунктов должны идти подряд — это отсекает ссылки вида "частью 24 статьи 22".
+    Возвращает плоский список единиц всех уровней в порядке следования в тексте.
+    """
+    articles: List[Tuple[str, int, int]] = []
+    previous_key: Tuple[int, ...] = ()
+    for match in ARTICLE_RE.finditer(text):
+        key = _number_key(match.group(1))
+        if key > previous_key:
+            articles.append((match.group(1), match.start(), match.end()))
+            previous_key = key
+
+    units: List[StatuteUnit] = []
+    for index, (article, article_start, body_start) in enumerate(articles):
+        article_end = articles[index + 1][1] if index + 1 < len(articles) else len(text)
+        heading = HEADING_RE.search(text, body_start, article_end)
+        if heading:
+            article_end = heading.start()
+        article_end = _rstrip_pos(text, body_start, article_end)
+
+        parts = _sequential_matches(PART_RE, text, body_start, article_end)
+        if parts and parts[0][1] - body_start > MAX_TITLE_CHARS:
+            parts = []
+        title_end = parts[0][1] if parts else _title_end(text, body_start, article_end)
+        title = text[body_start:title_end]
+        note = TITLE_NOTE_RE.search(title)
+        title = (title[:note.start()] if note else title).strip()
+        units.append(StatuteUnit(law, article, None, None, article_start, article_end, title))
+        if not parts:
+            # Пункты статьи без частей (например, "1) закупка товара ..." в статье 3 44-ФЗ).
+            items = _sequential_matches(ITEM_RE, text, title_end, article_end)
+            for item_index, (item, item_start, _) in enumerate(items):
+                item_end = items[item_index + 1][1] if item_index + 1 < len(items) else article_end
+                units.append(StatuteUnit(law, article, None, item, item_start, _rstrip_pos(text, item_start, item_end), title))
+
+        for part_index, (part, part_start, part_body_start) in enumerate(parts):
+            part_end = parts[part_index + 1][1] if part_index + 1 < len(parts) else article_end
+            part_end = _rstrip_pos(text, part_body_start, part_end)
+            units.append(StatuteUnit(law, article, part, None, part_start, part_end, title))
+            items = _sequential_matches(ITEM_RE, text, part_body_start, part_end)
+            for item_index, (item, item_start, _) in enumerate(items):
+                item_end = items[item_index + 1][1] if item_index + 1 < len(items) else part_end
+                units.append(StatuteUnit(law, article, part, item, item_start, _rstrip_pos(text, item_start, item_end), title))
+
+    logger.info(f"STATUTES: {law}: разобрано статей: {len(articles)}, единиц всего: {len(units)}.")
+    return units
+
+
+def _rstrip_pos(text: str, start: int, end: int) -> int:
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def _title_end(text: str, start: int, end: int) -> int:
+    """Для статей без нумерованных частей заголовок — до первого конца предложения (не длиннее MAX_TITLE_CHARS)."""
+    match = SENTENCE_END_RE.search(text, start, min(end, start + MAX_TITLE_CHARS))
+    return match.start() if match else start
+
+
+def load_statutes(statute_files: Dict[str, str]) -> Dict[str, str]:
+    """Загружает тексты законов: {название закона: текст}. Отсутствующие файлы пропускаются с ошибкой в логе."""
+    texts: Dict[str, str] = {}
+    for law, path in statute_files.items():
+        try:
+            texts[law] = Path(path).read_text(encoding="utf-8")
+        except OSError as e:
+            logger.error(f"STATUTES: Не удалось прочитать текст {law} из {path}: {e}")
+    return texts
+
+
+def split_for_index(text: str, units: List[StatuteUnit], max_chars: int = 1500) -> List[Tuple[StatuteUnit, str]]:
+    """
+    Готовит фрагменты для векторного индекса: по одному на часть статьи (или на статью без частей).
+    Длинные части делятся по пунктам, а слишком длинные пункты — на окна по границам предложений.
+    Каждый фрагмент начинается с заголовка вида "44-ФЗ. Статья 34. Контракт. Часть 5.".
+    """
+    pieces: List[Tuple[StatuteUnit, str]] = []
+    has_parts = {(u.law, u.article) for u in units if u.part and not u.item}
+    items_by_part: Dict[Tuple[str, str, str], List[StatuteUnit]] = {}
+    for unit in units:
+        if unit.item:
+            items_by_part.setdefault((unit.law, unit.article, unit.part), []).append(unit)
+
+    for unit in units:
+        if unit.item:
+            continue
+        if unit.part is None and (unit.law, unit.article) in has_parts:
+            continue
+        body = text[unit.start:unit.end]
+        items = items_by_part.get((unit.law, unit.article, unit.part), []) if unit.part else []
+        if len(body) <= max_chars or not items:
+            for window in _windows(body, max_chars):
+                pieces.append((unit, _with_header(unit, window)))
+            continue
+
+        intro = text[unit.start:items[0].start].strip()
+        for item in items:
+            item_text = text[item.start:item.end]
+            for window in _windows(item_text, max_chars):
+                pieces.append((item, _with_header(item, f"{intro} {window}" if len(intro) < max_chars // 3 else window)))
+    return pieces
+
+
+def _with_header(unit: StatuteUnit, body: str) -> str:
+    header = f"{unit.law}. Статья {unit.article}."
+    if unit.title:
+        header += f" {unit.title}."
+    if unit.part:
+        header += f" Часть {unit.part}."
+    if unit.item:
+        header += f" Пункт {unit.item}."
+    return f"{header}\n{body.strip()}"
+
+
+def _windows(body: str, max_chars: int) -> List[str]:
+    """Делит текст на окна не длиннее max_chars без перекрытия, по границам пунктов, предложений и клауз."""
+    if len(body) <= max_chars:
+        return [body] if body.strip() else []
+    return TextChunker(chunk_size=max_chars, chunk_overlap=0).split_text(body)
@@ -1,111 +1,265 @@
 import re
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Union
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Union
 import json
+import httpx
 import requests
 
-from tavily import TavilyClient
+from charset_normalizer import from_bytes
 
 
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain.schema import Document
+from langchain_core.documents import Document
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
-from langchain_community.document_transformers import BeautifulSoupTransformer
 
 
 from src.config import settings, VERIFIED_DOMAINS
 
-from src.agent.models import load_embedding_model
+from src.agent.models import load_cached_embedding_model
+from src.agent.prompts import synthesis_context_chars
+from src.agent.retrieval import rank_chunks_for_pages
 
 from src.utils.helpers import get_domain_from_url
+from src.utils.html_text import extract_html_text
+from src.utils.http_client import HttpClient
+from src.utils.page_cache import CachedPage, PageCache
+from src.utils.search_cache import SearchCache
+from src.utils.text_chunker import TextChunker
+from src.utils.tracing import Span, bind_context, span
 
 logger = logging.getLogger(__name__)
 
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+TAVILY_NO_RESULTS = "Поиск Tavily не дал результатов."
+TAVILY_NO_URL_RESULTS = "Поиск Tavily не дал результатов с URL."
+NO_URLS_MESSAGE = "Поиск не предоставил URL для дальнейшей обработки."
+
+
+@dataclass
+class SearchContext:
+    """
+    Результат search_and_rag_chain: текст для контекста синтеза и статус поиска —
+    ok (получены фрагменты страниц), not_found (поиск или страницы не дали релевантной информации),
+    error (сбой поиска, загрузки или обработки страниц).
+    """
+    text: str
+    status: str
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Общий для процесса пул HTTP-соединений (keep-alive, повторы, лимиты) для загрузки страниц и Tavily."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            config = settings.http
+            _http_client = HttpClient(
+                timeout=settings.tools.web_loader_timeout,
+                max_hosts=config.max_hosts,
+                max_connections_per_host=config.max_connections_per_host,
+                max_connections=config.max_connections,
+                keepalive_expiry=config.keepalive_expiry_seconds,
+                retries=config.retries,
+                backoff_factor=config.retry_backoff_factor,
+            )
+        return _http_client
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """Статистика пула HTTP-соединений: запросы, новые соединения, доля переиспользования, время рукопожатия."""
+    return get_http_client().stats.snapshot()
+
+
+class TavilySearchClient:
+    """Клиент Tavily Search REST API поверх общего пула соединений (интерфейс search как у TavilyClient)."""
+
+    def __init__(self, api_key: str, http_client: HttpClient):
+        self._headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self._http_client = http_client
+
+    def search(self, **params: Any) -> Dict[str, Any]:
+        response = self._http_client.request(
+            "POST", TAVILY_SEARCH_URL, headers=self._headers, json=params,
+            max_bytes=settings.http.max_api_response_bytes, truncate=False,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class AsyncTavilySearchClient(TavilySearchClient):
+    """Асинхронный вариант TavilySearchClient (интерфейс search как у AsyncTavilyClient)."""
+
+    async def search(self, **params: Any) -> Dict[str, Any]:
+        response = await self._http_client.arequest(
+            "POST", TAVILY_SEARCH_URL, headers=self._headers, json=params,
+            max_bytes=settings.http.max_api_response_bytes, truncate=False,
+        )
+        response.raise_for_status()
+        return response.json()
+
 
-tavily_client: Optional[TavilyClient] = None
 tavily_api_key_present = settings and settings.tavily and settings.tavily.tavily_api_key and settings.tavily.tavily_api_key.get_secret_value()
+_tavily_clients: Optional[Tuple[Optional[TavilySearchClient], Optional[AsyncTavilySearchClient]]] = None
+_tavily_clients_lock = threading.Lock()
+
+if not tavily_api_key_present:
+    logger.warning("Ключ TAVILY_API_KEY не найден. Поиск Tavily недоступен.")
 
-if tavily_api_key_present:
-    try:
 
-        tavily_client = TavilyClient(api_key=settings.tavily.tavily_api_key.get_secret_value())
-        logger.info("Клиент TavilyClient успешно инициализирован.")
-    except ImportError:
-         logger.error("Библиотека tavily-python не установлена, хотя ключ API есть. Поиск будет недоступен.")
-         tavily_client = None
+def get_tavily_clients() -> Tuple[Optional[TavilySearchClient], Optional[AsyncTavilySearchClient]]:
+    """Создает клиентов Tavily (синхронного и асинхронного) при первом обращении."""
+    global _tavily_clients
+    with _tavily_clients_lock:
+        if _tavily_clients is None:
+            tavily_client, async_tavily_client = None, None
+            if tavily_api_key_present:
+                api_key = settings.tavily.tavily_api_key.get_secret_value()
+                tavily_client = TavilySearchClient(api_key, get_http_client())
+                async_tavily_client = AsyncTavilySearchClient(api_key, get_http_client())
+                logger.info("Клиент Tavily успешно инициализирован.")
+            _tavily_clients = (tavily_client, async_tavily_client)
+        return _tavily_clients
+
+search_cache: Optional[SearchCache] = None
+if settings.cache.search_cache_enabled:
+    try:
+        search_cache = SearchCache(
+            cache_dir=settings.cache.cache_dir,
+            ttl_seconds=settings.cache.search_cache_ttl_seconds,
+            max_entries=settings.cache.search_cache_max_entries,
+        )
+        logger.info("Кеш результатов поиска успешно инициализирован.")
     except Exception as e:
-         logger.error(f"Ошибка инициализации TavilyClient: {e}", exc_info=True)
-         tavily_client = None
-else:
-    logger.warning("Ключ TAVILY_API_KEY не найден. Поиск Tavily недоступен.")
+        logger.error(f"Ошибка инициализации кеша результатов поиска, поиск без кеша: {e}", exc_info=True)
+        search_cache = None
+
 
 
 
+def _tavily_search_params(query: str) -> Dict[str, Any]:
+    max_results_to_fetch = settings.tools.max_search_results
+    search_depth = "advanced"
+    logger.debug(f"TOOL: Запрос к Tavily API с max_results={max_results_to_fetch}, search_depth='{search_depth}'")
+    return {
+        "query": query,
+        "search_depth": search_depth,
+        "max_results": max_results_to_fetch,
+        "include_answer": False,
+        "include_raw_content": False,
+        "include_images": False,
+    }
+
+
+def _cached_tavily_results(search_params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    if search_cache:
+        cached_results = search_cache.get(search_params["query"], search_params["search_depth"], search_params["max_results"])
+        if cached_results is not None:
+            cache_stats = search_cache.stats()
+            logger.info(f"TOOL: Результаты поиска Tavily взяты из кеша ({len(cached_results)} URL, hit rate {cache_stats['hit_rate']:.1%}).")
+            return cached_results
+    try:
+        payload_str = json.dumps(search_params, ensure_ascii=False, indent=2)
+        logger.debug(f"TOOL: Параметры для Tavily API:\n{payload_str}")
+    except TypeError:
+         logger.error(f"TOOL: Не удалось сериализовать параметры для лога: {search_params}")
+    return None
+
+
+def _handle_tavily_response(search_params: Dict[str, Any], results_data: Dict[str, Any]) -> Union[List[Dict[str, Any]], str]:
+    """Извлекает URL и контент из ответа Tavily и кеширует успешный результат."""
+    if "results" in results_data and results_data["results"]:
+        extracted_results = [
+            {"url": r.get("url"), "content": r.get("content")}
+            for r in results_data["results"]
+            if r.get("url")
+        ]
+        if not extracted_results:
+             logger.warning("TOOL: Tavily API вернул результаты, но без URL.")
+             return TAVILY_NO_URL_RESULTS
+
+        logger.info(f"TOOL: Tavily API вернул {len(extracted_results)} результатов с URL.")
+        raw_urls_found = [res.get("url", "N/A") for res in extracted_results]
+        logger.info(f"TOOL: Найденные URL от Tavily: {raw_urls_found}")
+        logger.debug(f"TOOL: Пример первого результата Tavily: {str(extracted_results[0])[:200]}...")
+        if search_cache:
+            try:
+                search_cache.put(search_params["query"], search_params["search_depth"], search_params["max_results"], extracted_results)
+            except Exception as cache_err:
+                logger.error(f"TOOL: Не удалось сохранить результаты поиска в кеш: {cache_err}", exc_info=True)
+        return extracted_results
+    else:
+        logger.warning("TOOL: Поиск Tavily не вернул результатов в ключе 'results'.")
+        logger.debug(f"TOOL: Полный ответ Tavily без результатов: {results_data}")
+        return TAVILY_NO_RESULTS
+
+
+def _tavily_error_message(e: Exception) -> str:
+    response = getattr(e, "response", None)
+    if isinstance(e, (requests.exceptions.HTTPError, httpx.HTTPStatusError)) and response is not None:
+         try:
+              error_detail = response.json()
+              logger.error(f"TOOL: Ошибка HTTP при выполнении поиска Tavily ({response.status_code}): {error_detail}", exc_info=False)
+              return f"Ошибка поиска Tavily ({response.status_code}): {json.dumps(error_detail)}"
+         except ValueError:
+              logger.error(f"TOOL: Ошибка HTTP при выполнении поиска Tavily ({response.status_code}): {response.text}", exc_info=True)
+              return f"Ошибка поиска Tavily ({response.status_code}): {response.text}"
+    else:
+         logger.error(f"TOOL: Ошибка при выполнении поиска Tavily ({type(e).__name__}): {e}", exc_info=True)
+         return f"Ошибка поиска Tavily ({type(e).__name__}): {e}"
+
 
 def run_tavily_search(query: str) -> Union[List[Dict[str, Any]], str]:
     """
     Запускает поиск Tavily НАПРЯМУЮ через КЛИЕНТ.
-    Использует 'advanced' поиск.
+    Использует 'advanced' поиск. Успешные результаты кешируются по нормализованному запросу (SearchCache).
     Возвращает список словарей с результатами или строку с ошибкой/сообщением.
     """
     logger.debug(f"TOOL: Вызов run_tavily_search с запросом: '{query}'")
+    tavily_client, _ = get_tavily_clients()
     if tavily_client:
         try:
-            max_results_to_fetch = settings.tools.max_search_results
-            search_depth = "advanced"
-            logger.debug(f"TOOL: Запрос к Tavily API с max_results={max_results_to_fetch}, search_depth='{search_depth}'")
-
-            search_params = {
-                "query": query,
-                "search_depth": search_depth,
-                "max_results": max_results_to_fetch,
-                "include_answer": False,
-                "include_raw_content": False,
-                "include_images": False,
-            }
-            try:
-                payload_str = json.dumps(search_params, ensure_ascii=False, indent=2)
-                logger.debug(f"TOOL: Параметры для Tavily API:\n{payload_str}")
-            except TypeError:
-                 logger.error(f"TOOL: Не удалось сериализовать параметры для лога: {search_params}")
-
-            results_data = tavily_client.search(**search_params)
-
-            if "results" in results_data and results_data["results"]:
-                extracted_results = [
-                    {"url": r.get("url"), "content": r.get("content")}
-                    for r in results_data["results"]
-                    if r.get("url")
-                ]
-                if not extracted_results:
-                     logger.warning("TOOL: Tavily API вернул результаты, но без URL.")
-                     return "Поиск Tavily не дал результатов с URL."
-
-                logger.info(f"TOOL: Tavily API вернул {len(extracted_results)} результатов с URL.")
-                raw_urls_found = [res.get("url", "N/A") for res in extracted_results]
-                logger.info(f"TOOL: Найденные URL от Tavily: {raw_urls_found}")
-                logger.debug(f"TOOL: Пример первого результата Tavily: {str(extracted_results[0])[:200]}...")
-                return extracted_results
-            else:
-                logger.warning("TOOL: Поиск Tavily не вернул результатов в ключе 'results'.")
-                logger.debug(f"TOOL: Полный ответ Tavily без результатов: {results_data}")
-                return "Поиск Tavily не дал результатов."
-
+            with span("search") as search_span:
+                search_params = _tavily_search_params(query)
+                cached_results = _cached_tavily_results(search_params)
+                if cached_results is not None:
+                    search_span.set(cache="hit", results=len(cached_results))
+                    return cached_results
+                results = _handle_tavily_response(search_params, tavily_client.search(**search_params))
+                search_span.set(cache="miss", results=len(results) if isinstance(results, list) else 0)
+                return results
         except Exception as e:
+            return _tavily_error_message(e)
+    else:
+        logger.warning("TOOL: Клиент поиска Tavily недоступен (не инициализирован).")
+        return "Инструмент поиска Tavily недоступен."
 
-            if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
-                 try:
-                      error_detail = e.response.json()
-                      logger.error(f"TOOL: Ошибка HTTP при выполнении поиска Tavily ({e.response.status_code}): {error_detail}", exc_info=False)
-                      return f"Ошибка поиска Tavily ({e.response.status_code}): {json.dumps(error_detail)}"
-                 except requests.exceptions.JSONDecodeError:
-                      logger.error(f"TOOL: Ошибка HTTP при выполнении поиска Tavily ({e.response.status_code}): {e.response.text}", exc_info=True)
-                      return f"Ошибка поиска Tavily ({e.response.status_code}): {e.response.text}"
-            else:
-                 logger.error(f"TOOL: Ошибка при выполнении поиска Tavily ({type(e).__name__}): {e}", exc_info=True)
-                 return f"Ошибка поиска Tavily ({type(e).__name__}): {e}"
+
+async def arun_tavily_search(query: str) -> Union[List[Dict[str, Any]], str]:
+    """Асинхронный вариант run_tavily_search (AsyncTavilyClient, тот же кеш результатов)."""
+    logger.debug(f"TOOL: Вызов arun_tavily_search с запросом: '{query}'")
+    _, async_tavily_client = get_tavily_clients()
+    if async_tavily_client:
+        try:
+            with span("search") as search_span:
+                search_params = _tavily_search_params(query)
+                cached_results = _cached_tavily_results(search_params)
+                if cached_results is not None:
+                    search_span.set(cache="hit", results=len(cached_results))
+                    return cached_results
+                results = _handle_tavily_response(search_params, await async_tavily_client.search(**search_params))
+                search_span.set(cache="miss", results=len(results) if isinstance(results, list) else 0)
+                return results
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return _tavily_error_message(e)
     else:
         logger.warning("TOOL: Клиент поиска Tavily недоступен (не инициализирован).")
         return "Инструмент поиска Tavily недоступен."
@@ -176,36 +330,169 @@ WEB_LOADER_HEADERS = {
     'DNT': '1',
     'Upgrade-Insecure-Requests': '1',
 }
-bs_transformer = BeautifulSoupTransformer()
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000, chunk_overlap=200, length_function=len, add_start_index=True
-)
+TEXT_CHUNKER = TextChunker(chunk_size=1000, chunk_overlap=200)
 MAX_PAGE_CHUNKS = settings.tools.max_page_chunks
 WEB_LOADER_TIMEOUT = settings.tools.web_loader_timeout
+MAX_PAGE_TEXT_CHARS = settings.tools.max_page_text_chars
+RAG_MAX_WORKERS = max(1, settings.tools.rag_max_workers)
+RAG_PER_HOST_CONCURRENCY = max(1, settings.tools.rag_per_host_concurrency)
 
-def load_web_page_robust(url: str) -> List[Document]:
-    """Загружает веб-страницу с таймаутом, логированием статуса и контента."""
-    logger.debug(f"TOOL/LOADER: Попытка загрузки {url} (Таймаут: {WEB_LOADER_TIMEOUT} сек)")
-    docs = []
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def _get_host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """Возвращает общий для процесса семафор домена, ограничивающий одновременные загрузки с него."""
+    host = get_domain_from_url(url) or "unknown"
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(RAG_PER_HOST_CONCURRENCY)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+
+_async_host_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_host_semaphore(url: str) -> asyncio.Semaphore:
+    """Асинхронный аналог _get_host_semaphore: семафоры домена общие для всех задач текущего event loop."""
+    host = get_domain_from_url(url) or "unknown"
+    loop_semaphores = _async_host_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = loop_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(RAG_PER_HOST_CONCURRENCY)
+        loop_semaphores[host] = semaphore
+    return semaphore
+
+
+async def arelease_loop_resources() -> None:
+    """
+    Освобождает ресурсы текущего event loop: семафоры доменов и httpx.AsyncClient общего HTTP-клиента.
+    Они ссылаются на свой loop и сами не освобождаются — вызывается владельцем loop перед его закрытием.
+    """
+    _async_host_semaphores.pop(asyncio.get_running_loop(), None)
+    if _http_client is not None:
+        await _http_client.aclose_loop_client()
+
+page_cache: Optional[PageCache] = None
+if settings.cache.page_cache_enabled:
     try:
-        loader = WebBaseLoader(
-            web_paths=[url],
-            bs_kwargs={"parse_only": None},
-            requests_kwargs={"headers": WEB_LOADER_HEADERS, "timeout": WEB_LOADER_TIMEOUT}
+        page_cache = PageCache(
+            cache_dir=settings.cache.cache_dir,
+            default_ttl=settings.cache.page_cache_ttl_seconds,
+            domain_ttls=settings.cache.page_cache_domain_ttls,
+            max_entries=settings.cache.page_cache_max_entries,
         )
-        docs = loader.load()
-        if not docs:
-             logger.warning(f"TOOL/LOADER: WebBaseLoader не вернул документы для {url}")
-             return [Document(page_content="", metadata={"source": url, "load_error": "Loader returned no documents"})]
-        page_content_raw = docs[0].page_content
-        if not page_content_raw or not page_content_raw.strip():
-            logger.warning(f"TOOL/LOADER: Загруженная страница {url} пуста или не содержит текста (длина: {len(page_content_raw)}).")
-            docs[0].metadata["load_error"] = f"Page content is empty (length: {len(page_content_raw)})"
+        logger.info("Кеш веб-страниц успешно инициализирован.")
+    except Exception as e:
+        logger.error(f"Ошибка инициализации кеша веб-страниц, загрузка без кеша: {e}", exc_info=True)
+        page_cache = None
 
-        else:
-            logger.info(f"TOOL/LOADER: Страница {url} успешно загружена (сырой контент ~{len(page_content_raw)} симв.)")
-            logger.debug(f"TOOL/LOADER: Начало сырого контента {url}:\n{page_content_raw[:500]}...")
+
+def _extract_page_text(url: str, html: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Извлекает очищенный текст и метаданные страницы (title / description / language) за один проход
+    потокового парсера lxml; служебные блоки (скрипты, навигация, футер и т.п.) отбрасываются при разборе.
+    """
+    extracted = extract_html_text(html, max_chars=MAX_PAGE_TEXT_CHARS)
+    metadata: Dict[str, Any] = {"source": url, **extracted.metadata}
+    if extracted.truncated:
+        metadata["truncated"] = True
+        logger.info(f"TOOL/LOADER: Текст страницы {url} ограничен {MAX_PAGE_TEXT_CHARS} симв.")
+    return extracted.text, metadata
+
+
+def _document_from_cache(cached: CachedPage, outcome: str) -> Document:
+    metadata = dict(cached.metadata)
+    metadata.update({"source": cached.url, "page_cache": outcome})
+    return Document(page_content=cached.text, metadata=metadata)
+
+
+def _conditional_headers(cached: Optional[CachedPage]) -> Dict[str, str]:
+    headers = dict(WEB_LOADER_HEADERS)
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
+def _documents_from_response(url: str, cached: Optional[CachedPage], status_code: int, response_headers: Any,
+                             content: bytes, text: str) -> List[Document]:
+    """Общая обработка ответа сервера для синхронного и асинхронного загрузчиков (304, извлечение текста, кеш)."""
+    if cached and status_code == 304:
+        page_cache.mark_revalidated(url, response_headers.get("ETag"), response_headers.get("Last-Modified"))
+        page_cache.record("revalidated")
+        logger.info(f"TOOL/LOADER: Страница {url} не изменилась (304), используется копия из кеша.")
+        return [_document_from_cache(cached, "revalidated")]
+
+    with span("extract", url=url, bytes=len(content)) as extract_span:
+        page_content_raw, metadata = _extract_page_text(url, text)
+        extract_span.set(chars=len(page_content_raw), truncated=bool(metadata.get("truncated")))
+    if page_cache:
+        page_cache.record("miss")
+        if status_code == 200 and page_content_raw.strip():
+            page_cache.store(
+                url, page_content_raw,
+                etag=response_headers.get("ETag"),
+                last_modified=response_headers.get("Last-Modified"),
+                metadata=metadata,
+            )
+    docs = [Document(page_content=page_content_raw, metadata={**metadata, "page_cache": "miss"})]
+
+    if not page_content_raw or not page_content_raw.strip():
+        logger.warning(f"TOOL/LOADER: Загруженная страница {url} пуста или не содержит текста (длина: {len(page_content_raw)}).")
+        docs[0].metadata["load_error"] = f"Page content is empty (length: {len(page_content_raw)})"
+
+    else:
+        logger.info(f"TOOL/LOADER: Страница {url} успешно загружена (сырой контент ~{len(page_content_raw)} симв.)")
+        logger.debug(f"TOOL/LOADER: Начало сырого контента {url}:\n{page_content_raw[:500]}...")
+    return docs
+
+
+def _fresh_cached_page(url: str) -> Tuple[Optional[CachedPage], Optional[List[Document]]]:
+    """Возвращает (запись кеша, документы), документы — только если копия в кеше свежая."""
+    cached = page_cache.get(url) if page_cache else None
+    if cached and page_cache.is_fresh(cached):
+        page_cache.record("hit")
+        logger.info(f"TOOL/LOADER: Страница {url} взята из кеша (возраст {time.time() - cached.fetched_at:.0f} сек, ~{len(cached.text)} симв.)")
+        return cached, [_document_from_cache(cached, "hit")]
+    return cached, None
+
+
+def _set_fetch_attributes(fetch_span: Span, docs: List[Document]) -> None:
+    metadata = docs[0].metadata if docs else {}
+    fetch_span.set(
+        cache=metadata.get("page_cache", "off"),
+        chars=sum(len(doc.page_content) for doc in docs),
+        failed="load_error" in metadata,
+    )
+
+
+def load_web_page_robust(url: str) -> List[Document]:
+    """
+    Загружает веб-страницу с таймаутом, логированием статуса и контента.
+    Если включен кеш страниц, свежие страницы берутся из него, а устаревшие перепроверяются
+    условным GET (If-None-Match / If-Modified-Since): ответ 304 возвращает закешированную копию.
+    """
+    with span("fetch", url=url) as fetch_span:
+        docs = _fetch_web_page(url)
+        _set_fetch_attributes(fetch_span, docs)
         return docs
+
+
+def _fetch_web_page(url: str) -> List[Document]:
+    logger.debug(f"TOOL/LOADER: Попытка загрузки {url} (Таймаут: {WEB_LOADER_TIMEOUT} сек)")
+    try:
+        cached, cached_docs = _fresh_cached_page(url)
+        if cached_docs:
+            return cached_docs
+
+        response = get_http_client().get(url, headers=_conditional_headers(cached), max_bytes=settings.http.max_page_bytes)
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            response.encoding = response.apparent_encoding
+        return _documents_from_response(url, cached, response.status_code, response.headers, response.content, response.text)
     except requests.exceptions.Timeout:
          logger.error(f"TOOL/LOADER: Ошибка ТАЙМАУТА ({WEB_LOADER_TIMEOUT} сек) при загрузке {url}", exc_info=False)
          return [Document(page_content="", metadata={"source": url, "load_error": f"Timeout after {WEB_LOADER_TIMEOUT}s"})]
@@ -214,11 +501,141 @@ def load_web_page_robust(url: str) -> List[Document]:
          logger.error(f"TOOL/LOADER: Ошибка HTTP/Соединения ({status_code}) при загрузке {url}: {req_err}", exc_info=False)
          return [Document(page_content="", metadata={"source": url, "load_error": f"HTTP/Connection Error ({status_code}): {req_err}"})]
     except Exception as e:
-        error_message = f"Неожиданная ошибка WebBaseLoader при обработке {url}: {e}"
+        error_message = f"Неожиданная ошибка загрузчика при обработке {url}: {e}"
+        logger.error(f"TOOL/LOADER: {error_message}", exc_info=True)
+        return [Document(page_content="", metadata={"source": url, "load_error": error_message})]
+
+
+def _detect_encoding(content: bytes) -> str:
+    """Кодировка страницы без charset в Content-Type (аналог requests apparent_encoding)."""
+    best = from_bytes(content).best()
+    return best.encoding if best else "utf-8"
+
+
+async def aload_web_page_robust(url: str) -> List[Document]:
+    """Асинхронный вариант load_web_page_robust (общий пул httpx, тот же кеш страниц)."""
+    with span("fetch", url=url) as fetch_span:
+        docs = await _afetch_web_page(url)
+        _set_fetch_attributes(fetch_span, docs)
+        return docs
+
+
+async def _afetch_web_page(url: str) -> List[Document]:
+    logger.debug(f"TOOL/LOADER: Попытка асинхронной загрузки {url} (Таймаут: {WEB_LOADER_TIMEOUT} сек)")
+    try:
+        cached, cached_docs = _fresh_cached_page(url)
+        if cached_docs:
+            return cached_docs
+
+        response = await get_http_client().aget(url, headers=_conditional_headers(cached), max_bytes=settings.http.max_page_bytes)
+        encoding = response.charset_encoding or _detect_encoding(response.content)
+        return await asyncio.to_thread(
+            _documents_from_response, url, cached, response.status_code, response.headers,
+            response.content, response.content.decode(encoding, errors="replace")
+        )
+    except asyncio.CancelledError:
+        raise
+    except httpx.TimeoutException:
+         logger.error(f"TOOL/LOADER: Ошибка ТАЙМАУТА ({WEB_LOADER_TIMEOUT} сек) при загрузке {url}", exc_info=False)
+         return [Document(page_content="", metadata={"source": url, "load_error": f"Timeout after {WEB_LOADER_TIMEOUT}s"})]
+    except httpx.HTTPError as req_err:
+         status_code = getattr(getattr(req_err, "response", None), 'status_code', 'N/A')
+         logger.error(f"TOOL/LOADER: Ошибка HTTP/Соединения ({status_code}) при загрузке {url}: {req_err}", exc_info=False)
+         return [Document(page_content="", metadata={"source": url, "load_error": f"HTTP/Connection Error ({status_code}): {req_err}"})]
+    except Exception as e:
+        error_message = f"Неожиданная ошибка загрузчика при обработке {url}: {e}"
         logger.error(f"TOOL/LOADER: {error_message}", exc_info=True)
         return [Document(page_content="", metadata={"source": url, "load_error": error_message})]
 
 
+def _load_and_chunk_page(url: str, log_prefix: str) -> Union[List[Document], str]:
+    """
+    Загружает, очищает и чанкирует страницу.
+    Возвращает список чанков или строку с ошибкой RAG (в формате rag_on_single_page).
+    """
+    return _chunk_page_documents(url, load_web_page_robust(url), log_prefix)
+
+
+def _chunk_page_documents(url: str, docs_raw: List[Document], log_prefix: str) -> Union[List[Document], str]:
+    """Чанкирует загруженную и уже очищенную страницу (общий этап синхронного и асинхронного пайплайнов)."""
+    page_content_to_split = ""
+    raw_content = ""
+    raw_content_len = 0
+
+    if not docs_raw:
+        logger.error(f"{log_prefix} load_web_page_robust вернул пустой список!")
+        return f"Ошибка RAG [{url}]: Не удалось получить документ после загрузки."
+    load_error = docs_raw[0].metadata.get("load_error")
+    if load_error:
+        logger.warning(f"{log_prefix} Ошибка на этапе загрузки: {load_error}")
+
+        if "Page content is empty" in load_error and (not docs_raw[0].page_content or not docs_raw[0].page_content.strip()):
+             return f"Ошибка RAG [{url}]: Не удалось загрузить контент. Причина: {load_error}"
+
+
+    raw_content = docs_raw[0].page_content if docs_raw[0].page_content else ""
+    raw_content_len = len(raw_content)
+    logger.info(f"{log_prefix} Этап ЗАГРУЗКИ пройден (сырой контент: {raw_content_len} симв).")
+
+
+    # Служебная разметка отбрасывается уже при извлечении текста (_extract_page_text), отдельный проход очистки не нужен.
+    if raw_content and raw_content.strip():
+        page_content_to_split = raw_content
+    else:
+        page_content_to_split = ""
+        logger.warning(f"{log_prefix} Текст страницы пуст.")
+
+
+    if not page_content_to_split or not page_content_to_split.strip():
+         logger.error(f"{log_prefix} Текст для чанкинга пуст ПОСЛЕ ВСЕХ ПОПЫТОК!")
+
+         if load_error: return f"Ошибка RAG [{url}]: Не удалось загрузить. Причина: {load_error}"
+         return f"Ошибка RAG [{url}]: Не найден текстовый контент для обработки."
+
+    logger.debug(f"{log_prefix} Попытка чанкинга текста (~{len(page_content_to_split)} симв)...")
+    try:
+        with span("chunk", url=url, chars=len(page_content_to_split)) as chunk_span:
+            chunks = TEXT_CHUNKER.create_documents([page_content_to_split], metadatas=[{"source": url}])
+            chunk_span.set(chunks=len(chunks))
+        if not chunks:
+            logger.error(f"{log_prefix} Чанкинг не создал ни одного чанка!")
+            return f"Ошибка RAG [{url}]: Не удалось разбить контент на чанки."
+        logger.info(f"{log_prefix} Этап ЧАНКИНГА пройден ({len(chunks)} чанков создано).")
+        logger.debug(f"{log_prefix} Пример первого чанка:\n{chunks[0].page_content[:300]}...")
+        return chunks
+    except Exception as split_err:
+        logger.error(f"{log_prefix} Ошибка при чанкинге текста!", exc_info=True)
+        return f"Ошибка RAG [{url}]: Сбой при разбиении на чанки. {split_err}"
+
+
+def _build_page_context(url: str, query: str, results: List[Document], log_prefix: str) -> str:
+    """Формирует итоговый контекст страницы из отобранных релевантных чанков."""
+    found_chunks_count = len(results)
+    logger.info(f"{log_prefix} Этап ПОИСКА ПО ЧАНКАМ пройден ({found_chunks_count} релевантных чанков найдено).")
+    if not results:
+         return f"RAG Результат [{url}]: На странице не найдено информации, точно соответствующей запросу '{query[:50]}...'."
+    logger.debug(f"{log_prefix} Пример первого найденного релевантного чанка:\n{results[0].page_content[:300]}...")
+
+    logger.debug(f"{log_prefix} Формирование итогового контекста...")
+    context_parts = []
+    empty_chunks_found = 0
+    for i, doc in enumerate(results):
+        source_info = doc.metadata.get('source', url)
+        start_index = doc.metadata.get('start_index', 'N/A')
+        if doc.page_content and doc.page_content.strip():
+            context_parts.append(f"... (источник: {source_info}, чанк #{i+1}, начало ~: {start_index}) ...\n{doc.page_content}\n...")
+        else:
+             empty_chunks_found += 1; logger.warning(f"{log_prefix} Найден пустой релевантный чанк #{i+1}, пропуск.")
+    if not context_parts:
+         logger.error(f"{log_prefix} Все найденные ({found_chunks_count}) релевантные чанки оказались пустыми!")
+         return f"Ошибка RAG [{url}]: Найденные релевантные фрагменты пусты."
+    context = "\n\n".join(context_parts)
+    final_len = len(context)
+    logger.info(f"{log_prefix} Итоговый контекст успешно сформирован ({len(context_parts)} фрагментов, ~{final_len} симв).")
+    if empty_chunks_found > 0: logger.warning(f"{log_prefix} При формировании контекста пропущено {empty_chunks_found} пустых чанков.")
+    return context
+
+
 def rag_on_single_page(inputs: Dict[str, Any]) -> str:
     """Загружает, очищает, чанкирует страницу и ищет релевантные фрагменты. С ИСПРАВЛЕННОЙ ОЧИСТКОЙ и ДЕТАЛЬНЫМ ЛОГИРОВАНИЕМ."""
     url = inputs.get("url")
@@ -231,127 +648,167 @@ def rag_on_single_page(inputs: Dict[str, Any]) -> str:
         return f"Ошибка RAG [{url}]: Отсутствует URL или запрос."
 
     try:
-        current_embedding_model = load_embedding_model()
+        current_embedding_model = load_cached_embedding_model()
         if not current_embedding_model: raise ValueError("Модель эмбеддингов не загружена.")
         logger.debug(f"{log_prefix} Модель эмбеддингов получена.")
     except Exception as emb_err:
         logger.error(f"{log_prefix} Ошибка загрузки модели эмбеддингов!", exc_info=True)
         return f"Критическая ошибка RAG [{url}]: Сбой эмбеддингов. {emb_err}"
 
-    page_content_to_split = ""
-    raw_content = ""
-    raw_content_len = 0
+    try:
+        chunks = _load_and_chunk_page(url, log_prefix)
+        if isinstance(chunks, str):
+            return chunks
 
+        logger.debug(f"{log_prefix} Поиск релевантных чанков (k={MAX_PAGE_CHUNKS})...")
+        try:
+            results = rank_chunks_for_pages([chunks], query, current_embedding_model, k=MAX_PAGE_CHUNKS)[0]
+        except Exception as rank_err:
+            logger.error(f"{log_prefix} Ошибка при векторном поиске!", exc_info=True)
+            return f"Ошибка RAG [{url}]: Сбой векторного поиска. {rank_err}"
+
+        return _build_page_context(url, query, results, log_prefix)
+
+    except Exception as e:
+        logger.error(f"{log_prefix} НЕОЖИДАННАЯ ОШИБКА на верхнем уровне rag_on_single_page!", exc_info=True)
+        return f"Критическая ошибка RAG [{url}]: Неожиданная ошибка при обработке. {e}"
+
+
+def _load_page_chunks_limited(url: str) -> Union[List[Document], str]:
+    """Загружает и чанкирует страницу с учетом лимита одновременных загрузок на домен."""
+    log_prefix = f"TOOL/RAG [{url[:50]}...]:"
     try:
+        with _get_host_semaphore(url):
+            return _load_and_chunk_page(url, log_prefix)
+    except Exception as e:
+        logger.error(f"{log_prefix} НЕОЖИДАННАЯ ОШИБКА при загрузке/чанкинге!", exc_info=True)
+        return f"Критическая ошибка RAG [{url}]: Неожиданная ошибка при обработке. {e}"
 
-        docs_raw = load_web_page_robust(url)
-        if not docs_raw:
-            logger.error(f"{log_prefix} load_web_page_robust вернул пустой список!")
-            return f"Ошибка RAG [{url}]: Не удалось получить документ после загрузки."
-        load_error = docs_raw[0].metadata.get("load_error")
-        if load_error:
-            logger.warning(f"{log_prefix} Ошибка на этапе загрузки: {load_error}")
 
-            if "Page content is empty" in load_error and (not docs_raw[0].page_content or not docs_raw[0].page_content.strip()):
-                 return f"Ошибка RAG [{url}]: Не удалось загрузить контент. Причина: {load_error}"
+def _classify_rag_result(url: str, result_content: str) -> Dict[str, str]:
+    """Классифицирует результат RAG страницы: ok / not_found / error."""
+    if result_content.startswith("Ошибка RAG") or result_content.startswith("Критическая ошибка RAG"):
+        result_status = "error"; logger.warning(f"TOOL: Зафиксирована ошибка RAG для {url}: {result_content}")
+    elif result_content.startswith("RAG Результат") and "не найдено информации" in result_content:
+        result_status = "not_found"; logger.info(f"TOOL: RAG не нашел релевантной информации для {url}.")
+    elif result_content:
+        result_status = "ok"; logger.info(f"TOOL: RAG успешно извлек контент для {url} (~{len(result_content)} симв).")
+    else:
+         result_content = f"Ошибка RAG [{url}]: Функция вернула пустой результат."; logger.error(f"TOOL: {result_content}"); result_status = "error"
+    return {"url": url, "status": result_status, "content": result_content}
 
 
-        raw_content = docs_raw[0].page_content if docs_raw[0].page_content else ""
-        raw_content_len = len(raw_content)
-        logger.info(f"{log_prefix} Этап ЗАГРУЗКИ пройден (сырой контент: {raw_content_len} симв).")
+def _rag_on_pages_batched(urls: List[str], query: str) -> List[str]:
+    """
+    RAG по нескольким страницам с общим этапом поиска:
+    страницы загружаются и чанкируются параллельно, затем чанки всех страниц векторизуются
+    одним батчем, запрос — один раз, и для каждой страницы отбираются top MAX_PAGE_CHUNKS чанков.
+    Возвращает результаты (в формате rag_on_single_page) в порядке urls.
+    """
+    try:
+        current_embedding_model = load_cached_embedding_model()
+        if not current_embedding_model: raise ValueError("Модель эмбеддингов не загружена.")
+    except Exception as emb_err:
+        logger.error("TOOL: Ошибка загрузки модели эмбеддингов!", exc_info=True)
+        return [f"Критическая ошибка RAG [{url}]: Сбой эмбеддингов. {emb_err}" for url in urls]
+
+    workers = min(RAG_MAX_WORKERS, len(urls))
+    if workers > 1:
+        logger.debug(f"TOOL: Параллельная загрузка {len(urls)} URL ({workers} потоков, до {RAG_PER_HOST_CONCURRENCY} на домен)...")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag") as pool:
+            loaded = list(pool.map(bind_context(_load_page_chunks_limited), urls))
+    else:
+        loaded = []
+        for i, url in enumerate(urls):
+            logger.debug(f"TOOL: Обработка URL {i+1}/{len(urls)}: {url}")
+            loaded.append(_load_page_chunks_limited(url))
+
+    page_positions = [i for i, item in enumerate(loaded) if not isinstance(item, str)]
+    results: List[str] = [item if isinstance(item, str) else "" for item in loaded]
+    if not page_positions:
+        return results
+
+    total_chunks = sum(len(loaded[i]) for i in page_positions)
+    logger.debug(f"TOOL: Общий векторный поиск по {total_chunks} чанкам с {len(page_positions)} страниц (k={MAX_PAGE_CHUNKS} на страницу)...")
+    try:
+        ranked_pages = rank_chunks_for_pages([loaded[i] for i in page_positions], query, current_embedding_model, k=MAX_PAGE_CHUNKS)
+    except Exception as rank_err:
+        logger.error("TOOL: Ошибка при общем векторном поиске!", exc_info=True)
+        for i in page_positions:
+            results[i] = f"Ошибка RAG [{urls[i]}]: Сбой векторного поиска. {rank_err}"
+        return results
 
+    for i, ranked in zip(page_positions, ranked_pages):
+        url = urls[i]
+        results[i] = _build_page_context(url, query, ranked, f"TOOL/RAG [{url[:50]}...]:")
+    return results
 
-        cleaned_content = ""
-        try:
-            logger.debug(f"{log_prefix} Попытка очистки HTML (без tags_to_extract)...")
-            unwanted_tags = ["script", "style", "nav", "footer", "aside", "header", "form", "button", "img", "svg", "iframe", "figure", "noscript"]
-
-            if raw_content and raw_content.strip():
-                docs_transformed = bs_transformer.transform_documents(
-                    docs_raw,
-                    unwanted_tags=unwanted_tags
-                )
-                cleaned_content = " ".join([doc.page_content for doc in docs_transformed if doc.page_content and doc.page_content.strip()])
-                cleaned_len = len(cleaned_content)
-
-                if cleaned_content:
-                     page_content_to_split = cleaned_content
-                     logger.info(f"{log_prefix} Этап ОЧИСТКИ пройден успешно (очищенный контент: {cleaned_len} симв).")
-                     logger.debug(f"{log_prefix} Начало очищенного контента:\n{page_content_to_split[:500]}...")
-                else:
-                     page_content_to_split = raw_content
-                     logger.warning(f"{log_prefix} Очистка HTML не дала результата (0 симв). Используется сырой текст ({raw_content_len} симв).")
-            else:
 
-                page_content_to_split = ""
-                logger.warning(f"{log_prefix} Исходный сырой контент пуст. Очистка невозможна.")
+async def _aload_page_chunks_limited(url: str) -> Union[List[Document], str]:
+    """Асинхронно загружает страницу (с лимитом на домен) и чанкирует ее в отдельном потоке."""
+    log_prefix = f"TOOL/RAG [{url[:50]}...]:"
+    try:
+        async with _get_async_host_semaphore(url):
+            docs_raw = await aload_web_page_robust(url)
+        return await asyncio.to_thread(_chunk_page_documents, url, docs_raw, log_prefix)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"{log_prefix} НЕОЖИДАННАЯ ОШИБКА при загрузке/чанкинге!", exc_info=True)
+        return f"Критическая ошибка RAG [{url}]: Неожиданная ошибка при обработке. {e}"
+
 
-        except Exception as clean_err:
+async def _arag_on_pages_batched(urls: List[str], query: str) -> List[str]:
+    """
+    Асинхронный вариант _rag_on_pages_batched: страницы загружаются конкурентно через
+    общий пул httpx, а CPU-нагрузка (очистка, чанкинг, векторизация) выполняется через asyncio.to_thread.
+    """
+    try:
+        current_embedding_model = await asyncio.to_thread(load_cached_embedding_model)
+        if not current_embedding_model: raise ValueError("Модель эмбеддингов не загружена.")
+    except Exception as emb_err:
+        logger.error("TOOL: Ошибка загрузки модели эмбеддингов!", exc_info=True)
+        return [f"Критическая ошибка RAG [{url}]: Сбой эмбеддингов. {emb_err}" for url in urls]
 
-             page_content_to_split = raw_content
-             logger.error(f"{log_prefix} Ошибка при очистке HTML! Используется сырой текст ({raw_content_len} симв). Ошибка: {clean_err}", exc_info=False)
+    logger.debug(f"TOOL: Асинхронная загрузка {len(urls)} URL (до {RAG_PER_HOST_CONCURRENCY} на домен)...")
+    loaded = await asyncio.gather(*(_aload_page_chunks_limited(url) for url in urls))
 
+    page_positions = [i for i, item in enumerate(loaded) if not isinstance(item, str)]
+    results: List[str] = [item if isinstance(item, str) else "" for item in loaded]
+    if not page_positions:
+        return results
 
-        if not page_content_to_split or not page_content_to_split.strip():
-             logger.error(f"{log_prefix} Текст для чанкинга пуст ПОСЛЕ ВСЕХ ПОПЫТОК!")
+    try:
+        ranked_pages = await asyncio.to_thread(
+            rank_chunks_for_pages, [loaded[i] for i in page_positions], query, current_embedding_model, MAX_PAGE_CHUNKS
+        )
+    except Exception as rank_err:
+        logger.error("TOOL: Ошибка при общем векторном поиске!", exc_info=True)
+        for i in page_positions:
+            results[i] = f"Ошибка RAG [{urls[i]}]: Сбой векторного поиска. {rank_err}"
+        return results
 
-             if load_error: return f"Ошибка RAG [{url}]: Не удалось загрузить. Причина: {load_error}"
-             return f"Ошибка RAG [{url}]: Не найден текстовый контент для обработки."
+    for i, ranked in zip(page_positions, ranked_pages):
+        url = urls[i]
+        results[i] = _build_page_context(url, query, ranked, f"TOOL/RAG [{url[:50]}...]:")
+    return results
 
-        logger.debug(f"{log_prefix} Попытка чанкинга текста (~{len(page_content_to_split)} симв)...")
-        try:
-            chunks = text_splitter.create_documents([page_content_to_split], metadatas=[{"source": url}])
-            if not chunks:
-                logger.error(f"{log_prefix} Чанкинг не создал ни одного чанка!")
-                return f"Ошибка RAG [{url}]: Не удалось разбить контент на чанки."
-            logger.info(f"{log_prefix} Этап ЧАНКИНГА пройден ({len(chunks)} чанков создано).")
-            logger.debug(f"{log_prefix} Пример первого чанка:\n{chunks[0].page_content[:300]}...")
-        except Exception as split_err:
-            logger.error(f"{log_prefix} Ошибка при чанкинге текста!", exc_info=True)
-            return f"Ошибка RAG [{url}]: Сбой при разбиении на чанки. {split_err}"
-
-
-        logger.debug(f"{log_prefix} Попытка создания FAISS индекса и поиска...")
-        try:
-            vectorstore = FAISS.from_documents(chunks, current_embedding_model)
-            logger.debug(f"{log_prefix} FAISS индекс создан. Поиск релевантных чанков (k={MAX_PAGE_CHUNKS})...")
-            results = vectorstore.similarity_search(query, k=MAX_PAGE_CHUNKS)
-            found_chunks_count = len(results)
-            logger.info(f"{log_prefix} Этап ПОИСКА ПО ЧАНКАМ пройден ({found_chunks_count} релевантных чанков найдено).")
-            if not results:
-                 return f"RAG Результат [{url}]: На странице не найдено информации, точно соответствующей запросу '{query[:50]}...'."
-            logger.debug(f"{log_prefix} Пример первого найденного релевантного чанка:\n{results[0].page_content[:300]}...")
-        except Exception as faiss_err:
-            logger.error(f"{log_prefix} Ошибка при создании FAISS или поиске!", exc_info=True)
-            return f"Ошибка RAG [{url}]: Сбой векторного поиска. {faiss_err}"
-
-
-        logger.debug(f"{log_prefix} Формирование итогового контекста...")
-        context_parts = []
-        empty_chunks_found = 0
-        for i, doc in enumerate(results):
-            source_info = doc.metadata.get('source', url)
-            start_index = doc.metadata.get('start_index', 'N/A')
-            if doc.page_content and doc.page_content.strip():
-                context_parts.append(f"... (источник: {source_info}, чанк #{i+1}, начало ~: {start_index}) ...\n{doc.page_content}\n...")
-            else:
-                 empty_chunks_found += 1; logger.warning(f"{log_prefix} Найден пустой релевантный чанк #{i+1}, пропуск.")
-        if not context_parts:
-             logger.error(f"{log_prefix} Все найденные ({found_chunks_count}) релевантные чанки оказались пустыми!")
-             return f"Ошибка RAG [{url}]: Найденные релевантные фрагменты пусты."
-        context = "\n\n".join(context_parts)
-        final_len = len(context)
-        logger.info(f"{log_prefix} Итоговый контекст успешно сформирован ({len(context_parts)} фрагментов, ~{final_len} симв).")
-        if empty_chunks_found > 0: logger.warning(f"{log_prefix} При формировании контекста пропущено {empty_chunks_found} пустых чанков.")
-        return context
 
-    except Exception as e:
-        logger.error(f"{log_prefix} НЕОЖИДАННАЯ ОШИБКА на верхнем уровне rag_on_single_page!", exc_info=True)
-        return f"Критическая ошибка RAG [{url}]: Неожиданная ошибка при обработке. {e}"
+def _no_urls_context(search_status: str) -> SearchContext:
+    """Результат без URL для RAG: сообщение Tavily (нет результатов или ошибка) или общее сообщение."""
+    logger.info("TOOL: Нет URL для RAG.")
+    if not search_status:
+        return SearchContext(NO_URLS_MESSAGE, "not_found")
+    logger.warning(f"TOOL: Передача статуса/ошибки поиска: {search_status}")
+    return SearchContext(search_status, "not_found" if search_status in (TAVILY_NO_RESULTS, TAVILY_NO_URL_RESULTS) else "error")
 
 
-def process_multiple_urls(inputs: dict) -> str:
-    """Вызывает rag_on_single_page для ВСЕХ найденных URL и собирает результаты, включая статусы ошибок."""
+def process_multiple_urls(inputs: dict) -> SearchContext:
+    """
+    Выполняет RAG для ВСЕХ найденных URL и собирает результаты, включая статусы ошибок.
+    Страницы загружаются параллельно (RAG_MAX_WORKERS потоков, не более RAG_PER_HOST_CONCURRENCY на домен),
+    поиск по чанкам всех страниц выполняется одним батчем; результаты возвращаются в исходном порядке URL.
+    """
     urls = inputs.get("urls", [])
     query = inputs.get("query", "")
     search_status = inputs.get("search_status", "")
@@ -359,30 +816,53 @@ def process_multiple_urls(inputs: dict) -> str:
     logger.debug(f"TOOL: Вызов process_multiple_urls для {len(urls)} URL (из них {verified_count} совпали с доверенными). Запрос: '{query[:50]}...'")
 
     if not urls:
-        logger.info("TOOL: Нет URL для RAG.");
-        if search_status: logger.warning(f"TOOL: Передача статуса/ошибки поиска: {search_status}"); return search_status
-        return "Поиск не предоставил URL для дальнейшей обработки."
-
-    all_page_results_with_status = []
-    processed_urls = set()
-    for i, url in enumerate(urls):
-        if url in processed_urls: logger.debug(f"TOOL: Пропуск дублирующего URL: {url}"); continue
-        processed_urls.add(url); logger.debug(f"TOOL: Обработка URL {i+1}/{len(urls)}: {url}")
-        result_content = ""; result_status = "error"
-        try:
-            result_content = rag_on_single_page({"url": url, "query": query})
-            if result_content.startswith("Ошибка RAG") or result_content.startswith("Критическая ошибка RAG"):
-                result_status = "error"; logger.warning(f"TOOL: Зафиксирована ошибка RAG для {url}: {result_content}")
-            elif result_content.startswith("RAG Результат") and "не найдено информации" in result_content:
-                result_status = "not_found"; logger.info(f"TOOL: RAG не нашел релевантной информации для {url}.")
-            elif result_content:
-                result_status = "ok"; logger.info(f"TOOL: RAG успешно извлек контент для {url} (~{len(result_content)} симв).")
-            else:
-                 result_content = f"Ошибка RAG [{url}]: Функция вернула пустой результат."; logger.error(f"TOOL: {result_content}"); result_status = "error"
-        except Exception as e:
-             result_status = "error"; result_content = f"Критическая ошибка RAG при вызове обработки {url}: {e}"; logger.error(f"TOOL: {result_content}", exc_info=True)
-        finally:
-             all_page_results_with_status.append({"url": url, "status": result_status, "content": result_content})
+        return _no_urls_context(search_status)
+
+    unique_urls = _unique_urls(urls)
+    try:
+        page_contents = _rag_on_pages_batched(unique_urls, query)
+    except Exception as e:
+        logger.error(f"TOOL: Критическая ошибка пакетного RAG: {e}", exc_info=True)
+        page_contents = [f"Критическая ошибка RAG при вызове обработки {url}: {e}" for url in unique_urls]
+    return _assemble_rag_context(urls, unique_urls, page_contents, verified_count)
+
+
+async def aprocess_multiple_urls(inputs: dict) -> SearchContext:
+    """Асинхронный вариант process_multiple_urls."""
+    urls = inputs.get("urls", [])
+    query = inputs.get("query", "")
+    search_status = inputs.get("search_status", "")
+    verified_count = inputs.get("verified_count", 0)
+    logger.debug(f"TOOL: Вызов aprocess_multiple_urls для {len(urls)} URL (из них {verified_count} совпали с доверенными). Запрос: '{query[:50]}...'")
+
+    if not urls:
+        return _no_urls_context(search_status)
+
+    unique_urls = _unique_urls(urls)
+    try:
+        page_contents = await _arag_on_pages_batched(unique_urls, query)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"TOOL: Критическая ошибка пакетного RAG: {e}", exc_info=True)
+        page_contents = [f"Критическая ошибка RAG при вызове обработки {url}: {e}" for url in unique_urls]
+    return _assemble_rag_context(urls, unique_urls, page_contents, verified_count)
+
+
+def _unique_urls(urls: List[str]) -> List[str]:
+    unique_urls: List[str] = []
+    for url in urls:
+        if url in unique_urls: logger.debug(f"TOOL: Пропуск дублирующего URL: {url}"); continue
+        unique_urls.append(url)
+    return unique_urls
+
+
+def _assemble_rag_context(urls: List[str], unique_urls: List[str], page_contents: List[str], verified_count: int) -> SearchContext:
+    """
+    Собирает итоговый контекст RAG из результатов страниц (успешные фрагменты, ошибки, статистика доверенных URL).
+    Статус ok, если хотя бы одна страница дала релевантные фрагменты.
+    """
+    all_page_results_with_status = [_classify_rag_result(url, content) for url, content in zip(unique_urls, page_contents)]
 
     successful_rag_results = []; error_messages = []; not_found_messages = []
     for res in all_page_results_with_status:
@@ -406,34 +886,40 @@ def process_multiple_urls(inputs: dict) -> str:
 
          load_errors = [res['content'] for res in all_page_results_with_status if res['status'] == "error" and "Не удалось загрузить" in res['content']]
          other_errors = [res['content'] for res in all_page_results_with_status if res['status'] == "error" and "Не удалось загрузить" not in res['content']]
-         if load_errors: return verified_info_prefix + f"Не удалось загрузить контент как минимум с одной страницы. Пример ошибки: {load_errors[0].split(':')[-1].strip()}"
-         if other_errors: return verified_info_prefix + f"Произошли ошибки при обработке найденных страниц. Пример ошибки: {other_errors[0].split(':')[-1].strip()}"
+         if load_errors: return SearchContext(verified_info_prefix + f"Не удалось загрузить контент как минимум с одной страницы. Пример ошибки: {load_errors[0].split(':')[-1].strip()}", "error")
+         if other_errors: return SearchContext(verified_info_prefix + f"Произошли ошибки при обработке найденных страниц. Пример ошибки: {other_errors[0].split(':')[-1].strip()}", "error")
 
-         return verified_info_prefix + "Поиск по найденным страницам не дал релевантных результатов по вашему запросу."
+         return SearchContext(verified_info_prefix + "Поиск по найденным страницам не дал релевантных результатов по вашему запросу.", "not_found")
 
     final_result_text = "\n\n".join(final_result_parts)
     final_result_with_prefix = verified_info_prefix + final_result_text
+    status = "ok" if successful_rag_results else "error"
 
     logger.debug(f"TOOL: Финальный результат RAG собран (~{len(final_result_with_prefix)} симв.).")
-    max_len = 3500
+    max_len = synthesis_context_chars()
     if len(final_result_with_prefix) > max_len:
         logger.warning(f"TOOL: Результат RAG обрезан с {len(final_result_with_prefix)} до {max_len} символов.")
         clipped_result = final_result_with_prefix[:max_len] + "\n... (результат поиска обрезан)"
-        logger.debug(f"TOOL: Возврат из process_multiple_urls (обрезанный)."); return clipped_result
-    else: logger.debug(f"TOOL: Возврат из process_multiple_urls."); return final_result_with_prefix
+        logger.debug(f"TOOL: Возврат из process_multiple_urls (обрезанный)."); return SearchContext(clipped_result, status)
+    else: logger.debug(f"TOOL: Возврат из process_multiple_urls."); return SearchContext(final_result_with_prefix, status)
+
+
 
+async def _atavily_search_step(inputs: dict) -> Union[List[Dict[str, Any]], str]:
+    return await arun_tavily_search(inputs["query"])
 
 
+# invoke() использует синхронные функции, ainvoke() — асинхронные (afunc) без блокировки event loop.
 search_and_rag_chain = (
     RunnableLambda(lambda input_query: {"query": input_query})
     | RunnablePassthrough.assign(
-        search_results_structured=RunnableLambda(lambda x: run_tavily_search(x["query"]))
+        search_results_structured=RunnableLambda(lambda x: run_tavily_search(x["query"]), afunc=_atavily_search_step)
     ).with_config(run_name="TavilyПоиск_Direct")
     | RunnableLambda(check_urls_against_verified_list).with_config(run_name="CheckURL_Verified")
-    | RunnableLambda(process_multiple_urls).with_config(run_name="RAGпоСтраницам")
+    | RunnableLambda(process_multiple_urls, afunc=aprocess_multiple_urls).with_config(run_name="RAGпоСтраницам")
 )
 
 
-__all__ = ["search_and_rag_chain"]
+__all__ = ["SearchContext", "arelease_loop_resources", "search_and_rag_chain"]
 
 logger.info("Цепочка 'search_and_rag_chain' (без фильтрации, улучшенная очистка/логи RAG) готова.")
\ No newline at end of file
@@ -0,0 +1,259 @@
+import logging
+import math
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from src.agent.retrieval import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Кодирование векторов в хранилище: flat — float32 без потерь (.npy), sq8 — int8 скалярное квантование
+# (в 4 раза меньше), pq — product quantization (pq_m байт на вектор, для 384-d и pq_m=48 — в 32 раза меньше).
+VECTOR_ENCODINGS = ("flat", "sq8", "pq")
+# Движок поиска: flat — полный перебор (точный для кодирования flat), hnsw — граф HNSW (точность
+# регулируется efSearch), ivf — инвертированные списки по кластерам k-means (точность регулируется nprobe).
+VECTOR_ENGINES = ("flat", "hnsw", "ivf")
+# Обучение PQ: k-means на 256 центроидов в каждом подпространстве требует хотя бы столько векторов.
+PQ_MIN_TRAIN_VECTORS = 256
+
+_SPEC_TOKEN_RE = re.compile(r"(pca|hnsw|ivf|pq)(\d*)|(flat|sq8)")
+
+
+@dataclass(frozen=True)
+class VectorStoreConfig:
+    """
+    Параметры хранилища векторов. Обозначение (spec) — части через запятую: [pca<D>,][hnsw<M>|ivf<N>,]<кодирование>,
+    например "flat", "sq8", "pq48", "pca192,sq8", "hnsw32,sq8", "ivf256,pq48". ivf_nlist=0 — подбирается по числу векторов.
+    """
+    encoding: str = "flat"
+    engine: str = "flat"
+    pca_dim: int = 0
+    pq_m: int = 48
+    hnsw_m: int = 32
+    ivf_nlist: int = 0
+
+    @property
+    def spec(self) -> str:
+        parts = [f"pca{self.pca_dim}"] if self.pca_dim else []
+        if self.engine == "hnsw":
+            parts.append(f"hnsw{self.hnsw_m}")
+        elif self.engine == "ivf":
+            parts.append(f"ivf{self.ivf_nlist or ''}")
+        parts.append(f"pq{self.pq_m}" if self.encoding == "pq" else self.encoding)
+        return ",".join(parts)
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding == "flat" and self.engine == "flat" and not self.pca_dim
+
+
+def parse_vector_spec(spec: str) -> VectorStoreConfig:
+    """Разбирает обозначение хранилища ("flat", "pq48", "pca192,hnsw32,sq8") в VectorStoreConfig."""
+    values = {}
+    for part in spec.lower().replace(" ", "").split(","):
+        match = _SPEC_TOKEN_RE.fullmatch(part)
+        if not match:
+            raise ValueError(f"Неизвестное хранилище векторов '{spec}' (примеры: flat, sq8, pq48, pca192,sq8, hnsw32,sq8, ivf256,flat).")
+        kind, number = match.group(1), match.group(2)
+        if match.group(3):
+            values["encoding"] = match.group(3)
+        elif kind == "pq":
+            values.update(encoding="pq", **({"pq_m": int(number)} if number else {}))
+        elif kind == "pca" and number:
+            values["pca_dim"] = int(number)
+        elif kind == "hnsw":
+            values.update(engine="hnsw", **({"hnsw_m": int(number)} if number else {}))
+        elif kind == "ivf":
+            values.update(engine="ivf", ivf_nlist=int(number) if number else 0)
+        else:
+            raise ValueError(f"Не указана размерность PCA в '{spec}'.")
+    if "encoding" not in values:
+        raise ValueError(f"Не указано кодирование векторов в '{spec}' (flat, sq8 или pq<M>).")
+    return VectorStoreConfig(**values)
+
+
+class ExactVectorStore:
+    """Нормированные векторы float32 в .npy; при загрузке отображаются в память (mmap) и общие для процессов."""
+
+    spec = "flat"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def set_search_params(self, ef_search: int = 0, nprobe: int = 0) -> None:
+        """У точного перебора параметров поиска нет."""
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-k (позиция, косинусная близость) для нормированного вектора запроса, по убыванию близости."""
+        scores = np.asarray(self.vectors @ query)
+        return [(int(i), float(scores[i])) for i in top_k_indices(scores, k)]
+
+    def similarity(self, query: np.ndarray, positions: Sequence[int]) -> np.ndarray:
+        return np.asarray(self.vectors[np.asarray(positions, dtype=np.int64)] @ query)
+
+    def save(self, path: Path) -> None:
+        np.save(_with_suffix(path, ".npy"), self.vectors)
+
+    @classmethod
+    def load(cls, path: Path) -> "ExactVectorStore":
+        return cls(np.load(_with_suffix(path, ".npy"), mmap_mode="r"))
+
+
+class FaissVectorStore:
+    """
+    Векторы в индексе FAISS: сжатые (int8 SQ или PQ, опционально после понижения размерности PCA)
+    и/или с приближенным поиском (HNSW, IVF). Индекс читается с флагами mmap + read-only: коды
+    не копируются в память процесса, а страницы файла разделяются всеми процессами (воркерами Streamlit)
+    через страничный кеш ОС.
+    """
+
+    def __init__(self, index, spec: str):
+        self.index = index
+        self.spec = spec
+        self._direct_map_ready = False
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal)
+
+    @property
+    def nbytes(self) -> int:
+        """Объем кодов векторов (без графа HNSW, центроидов и других служебных структур)."""
+        import faiss
+
+        index = faiss.downcast_index(self.index.index if isinstance(self.index, faiss.IndexPreTransform) else self.index)
+        codes = faiss.downcast_index(index.storage) if hasattr(index, "storage") else index
+        return int(codes.code_size * codes.ntotal) if hasattr(codes, "code_size") else 0
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, config: VectorStoreConfig) -> "FaissVectorStore":
+        import faiss
+
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count, dim = vectors.shape
+        out_dim = config.pca_dim or dim
+        if config.pca_dim and not 0 < config.pca_dim < dim:
+            raise ValueError(f"Размерность PCA ({config.pca_dim}) должна быть меньше размерности векторов ({dim}).")
+        if config.encoding == "pq":
+            if out_dim % config.pq_m:
+                raise ValueError(f"Размерность {out_dim} не делится на число подквантователей PQ ({config.pq_m}).")
+            if count < PQ_MIN_TRAIN_VECTORS:
+                raise ValueError(f"Для обучения PQ нужно хотя бы {PQ_MIN_TRAIN_VECTORS} векторов, а их {count}.")
+            if config.engine == "hnsw":
+                # IndexHNSWPQ в FAISS строится только с метрикой L2: оценки не были бы косинусной близостью.
+                raise ValueError("HNSW с кодированием PQ не поддерживается, используйте hnsw с flat/sq8 или ivf с pq.")
+        codes = {"flat": "Flat", "sq8": "SQ8", "pq": f"PQ{config.pq_m}"}[config.encoding]
+        if config.engine == "ivf":
+            # По умолчанию ~4*sqrt(n) кластеров, но не меньше 39 векторов на кластер для обучения k-means.
+            nlist = config.ivf_nlist or max(1, min(count // 39, int(4 * math.sqrt(count))))
+            if nlist > count:
+                raise ValueError(f"Число кластеров IVF ({nlist}) больше числа векторов ({count}).")
+            config = VectorStoreConfig(config.encoding, config.engine, config.pca_dim, config.pq_m, config.hnsw_m, nlist)
+            description = f"IVF{nlist},{codes}"
+        elif config.engine == "hnsw":
+            description = f"HNSW{config.hnsw_m}" + ("" if config.encoding == "flat" else f"_{codes}")
+        else:
+            description = codes
+        index = faiss.index_factory(out_dim, description, faiss.METRIC_INNER_PRODUCT)
+
+        if config.pca_dim:
+            # Проекция на главные компоненты без центрирования, затем нормировка: проекция теряет часть
+            # нормы вектора, и без нормировки близость вектора к самому себе была бы заметно меньше 1.
+            # Скалярное произведение нормированных проекций приближает косинус исходных векторов,
+            # поэтому пороги близости не меняются.
+            _, _, components = np.linalg.svd(vectors, full_matrices=False)
+            transform = faiss.LinearTransform(dim, config.pca_dim, False)
+            faiss.copy_array_to_vector(np.ascontiguousarray(components[:config.pca_dim]).ravel(), transform.A)
+            transform.is_trained = True
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(config.pca_dim), index)
+            index.prepend_transform(transform)
+        index.train(vectors)
+        index.add(vectors)
+        return cls(index, config.spec)
+
+    def set_search_params(self, ef_search: int = 0, nprobe: int = 0) -> None:
+        """Точность приближенного поиска: efSearch для HNSW, nprobe для IVF (0 — значение FAISS по умолчанию)."""
+        import faiss
+
+        parameters = faiss.ParameterSpace()
+        if ef_search and "hnsw" in self.spec:
+            parameters.set_index_parameter(self.index, "efSearch", ef_search)
+        if nprobe and "ivf" in self.spec:
+            parameters.set_index_parameter(self.index, "nprobe", nprobe)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-k (позиция, приближенная косинусная близость) по убыванию близости."""
+        scores, ids = self.index.search(np.asarray([query], dtype=np.float32), min(k, len(self)))
+        return [(int(i), float(s)) for i, s in zip(ids[0], scores[0]) if i >= 0]
+
+    def similarity(self, query: np.ndarray, positions: Sequence[int]) -> np.ndarray:
+        """
+        Близость к произвольным документам по восстановленным из кодов векторам. При PCA запрос
+        проходит ту же цепочку преобразований, что и при поиске, и сравнивается с кодами в ее пространстве.
+        """
+        import faiss
+
+        index = self.index
+        query = np.asarray([query], dtype=np.float32)
+        if isinstance(index, faiss.IndexPreTransform):
+            for i in range(index.chain.size()):
+                query = index.chain.at(i).apply(query)
+            index = faiss.downcast_index(index.index)
+        if not self._direct_map_ready:
+            # IVF восстанавливает вектор по номеру только с прямым отображением номер -> (список, позиция).
+            ivf = faiss.try_extract_index_ivf(self.index)
+            if ivf is not None:
+                ivf.make_direct_map()
+            self._direct_map_ready = True
+        return index.reconstruct_batch(np.asarray(positions, dtype=np.int64)) @ query[0]
+
+    def save(self, path: Path) -> None:
+        import faiss
+
+        faiss.write_index(self.index, str(_with_suffix(path, ".faiss")))
+
+    @classmethod
+    def load(cls, path: Path, spec: str) -> "FaissVectorStore":
+        import faiss
+
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        return cls(faiss.read_index(str(_with_suffix(path, ".faiss")), flags), spec)
+
+
+def _with_suffix(path: Path, suffix: str) -> Path:
+    # Path.with_suffix заменил бы часть имени после точки ("laws.v2" -> "laws.npy").
+    return path.parent / f"{path.name}{suffix}"
+
+
+def build_vector_store(vectors: np.ndarray, config: VectorStoreConfig = VectorStoreConfig()):
+    """Хранилище нормированных векторов: точное (.npy) для flat без PCA и ANN, иначе индекс FAISS."""
+    if config.encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"Неизвестное кодирование векторов '{config.encoding}', допустимы: {', '.join(VECTOR_ENCODINGS)}.")
+    if config.engine not in VECTOR_ENGINES:
+        raise ValueError(f"Неизвестный движок поиска '{config.engine}', допустимы: {', '.join(VECTOR_ENGINES)}.")
+    if config.exact:
+        return ExactVectorStore(vectors)
+    store = FaissVectorStore.build(vectors, config)
+    logger.info(f"VECTOR_STORE: Построено хранилище '{store.spec}': {len(store)} векторов, коды {store.nbytes / 1024 / 1024:.1f} МБ (float32: {vectors.nbytes / 1024 / 1024:.1f} МБ).")
+    return store
+
+
+def load_vector_store(path: Path, spec: str):
+    """Загружает хранилище, сохраненное как <path>.npy (spec "flat") или <path>.faiss (остальные)."""
+    return ExactVectorStore.load(path) if spec == "flat" else FaissVectorStore.load(path, spec)
+
+
+__all__ = [
+    "VECTOR_ENCODINGS", "VECTOR_ENGINES", "VectorStoreConfig", "ExactVectorStore", "FaissVectorStore",
+    "parse_vector_spec", "build_vector_store", "load_vector_store",
+]
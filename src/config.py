@@ -1,7 +1,7 @@
 import logging
 import os
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 # Явно импортируем load_dotenv
 from dotenv import load_dotenv
@@ -30,6 +30,9 @@ class LocalLLMSettings(BaseSettings):
     n_gpu_layers: int = Field(default=0, description="Кол-во слоев на GPU (-1 = все)")
     n_batch: int = Field(default=512, description="Размер батча для промпта")
     n_ctx: int = Field(default=4096, description="Размер контекста LLM")
+    n_replicas: int = Field(default=1, description="Кол-во реплик модели в отдельных процессах (1 = одна модель в основном процессе)")
+    n_threads_per_replica: int = Field(default=0, description="n_threads каждой реплики (0 = по числу выделенных ей ядер)")
+    pin_replica_cores: bool = Field(default=True, description="Закреплять каждую реплику за своим непересекающимся набором ядер")
 
     @field_validator('model_gguf_path')
     def check_model_path(cls, v, info): # Добавлен info для Pydantic v2
@@ -55,12 +58,114 @@ class EmbeddingSettings(BaseSettings):
 class TavilySettings(BaseSettings):
     tavily_api_key: Optional[SecretStr] = Field(default=None, description="API ключ Tavily Search") # Используем SecretStr
 
+class CacheSettings(BaseSettings):
+    """Настройки локальных кешей."""
+    cache_dir: str = str(PROJECT_ROOT / "data" / "cache")
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = Field(default=200_000, description="Макс. кол-во векторов в кеше эмбеддингов (LRU)")
+    embedding_cache_dtype: Literal["float16", "float32"] = "float16"
+    page_cache_enabled: bool = True
+    page_cache_ttl_seconds: int = Field(default=86400, description="TTL закешированной страницы по умолчанию (сек.)")
+    page_cache_domain_ttls: Dict[str, int] = Field(
+        default={"zakupki.gov.ru": 6 * 3600, "consultant.ru": 7 * 86400, "garant.ru": 7 * 86400},
+        description="TTL по доменам (сек.), применяется и к поддоменам"
+    )
+    page_cache_max_entries: int = 5000
+    search_cache_enabled: bool = True
+    search_cache_ttl_seconds: int = Field(default=86400, description="TTL результатов поиска Tavily (сек.)")
+    search_cache_max_entries: int = 10000
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = Field(default=0.92, description="Мин. косинусная близость вопросов для ответа из кеша")
+    answer_cache_ttl_seconds: int = Field(default=21600, description="Время жизни закешированного ответа (сек.)")
+    answer_cache_max_entries: int = 2000
+
 class ToolSettings(BaseSettings):
     """Настройки инструментов агента."""
     verified_sources_file: str = str(PROJECT_ROOT / "data" / "raw" / "verified_sources.txt")
     max_search_results: int = 7
     max_page_chunks: int = 3
     web_loader_timeout: int = 15
+    max_page_text_chars: int = Field(default=500_000, description="Извлечение текста страницы прекращается после стольких символов")
+    rag_max_workers: int = Field(default=4, description="Кол-во потоков для параллельной обработки URL (1 = последовательно)")
+    rag_per_host_concurrency: int = Field(default=2, description="Макс. кол-во одновременных загрузок с одного домена")
+    context_max_chars: int = Field(default=3500, description="Макс. объем контекста (веб-RAG, локальная база, цитаты законов, типовые ответы) в промпте синтеза; для локальной LLM дополнительно ограничен окном n_ctx")
+    statute_files: Dict[str, str] = {
+        "44-ФЗ": str(PROJECT_ROOT / "data" / "raw" / "44fz.txt"),
+        "223-ФЗ": str(PROJECT_ROOT / "data" / "raw" / "223fz.txt"),
+    }
+    local_index_enabled: bool = True
+    local_index_dir: str = str(PROJECT_ROOT / "data" / "index")
+    local_index_top_k: int = 4
+    local_index_min_score: float = Field(default=0.55, description="Мин. косинусная близость, при которой локальной базы достаточно без веб-поиска")
+    local_index_hybrid_enabled: bool = Field(default=True, description="Объединять векторный поиск по локальной базе с BM25 (RRF)")
+    local_index_candidates: int = Field(default=50, description="Сколько лучших документов векторного поиска и BM25 участвует в RRF")
+    local_index_encoding: Literal["flat", "sq8", "pq"] = Field(default="flat", description="Хранение векторов индекса: flat — float32 без потерь, sq8 — int8 (x4 меньше), pq — product quantization")
+    local_index_pca_dim: int = Field(default=0, description="Понижение размерности векторов PCA перед сжатием (0 — без PCA)")
+    local_index_pq_m: int = Field(default=48, description="Число подквантователей PQ (байт на вектор); должно делить размерность")
+    local_index_engine: Literal["flat", "hnsw", "ivf"] = Field(default="flat", description="Поиск по векторам: flat — полный перебор, hnsw — граф HNSW, ivf — инвертированные списки")
+    local_index_hnsw_m: int = Field(default=32, description="Число связей вершины графа HNSW (больше — точнее и больше памяти)")
+    local_index_hnsw_ef_search: int = Field(default=64, description="Ширина поиска HNSW (больше — точнее и медленнее)")
+    local_index_ivf_nlist: int = Field(default=0, description="Число кластеров IVF (0 — около 4*sqrt(числа векторов))")
+    local_index_ivf_nprobe: int = Field(default=8, description="Сколько кластеров IVF просматривается при поиске (больше — точнее и медленнее)")
+    local_index_agreement_min_score: float = Field(default=0.45, description="Мин. близость, при которой локальной базы достаточно, если лучший документ BM25 совпадает с лучшим векторным")
+    # Ответы на вопросы и справочные материалы в локальном индексе (вместе с текстами законов).
+    # data/old/data_md/44fz_parsed.md и 223fz_parsed.md повторяют тексты законов, zakupki_parsed.md — zakupki_parsed.json.
+    local_corpus_qa_files: List[str] = [
+        str(PROJECT_ROOT / "data" / "old" / "data_prev" / "zakupki_parsed.json"),
+        str(PROJECT_ROOT / "data" / "old" / "data_prev" / "data.json"),
+    ]
+    local_corpus_md_files: List[str] = [
+        str(PROJECT_ROOT / "data" / "old" / "data_md" / "abc_parsed.md"),
+        str(PROJECT_ROOT / "data" / "old" / "data_md" / "answers_44and223fz_parsed.md"),
+        str(PROJECT_ROOT / "data" / "old" / "data_md" / "typical_questions_parsed.md"),
+    ]
+    citation_resolver_enabled: bool = Field(default=True, description="Вопросы со ссылкой на конкретную статью/часть/пункт закона отвечаются по точному тексту без поиска")
+    citation_max_refs: int = Field(default=5, description="Сколько ссылок из одного вопроса подставляется в контекст")
+    faq_enabled: bool = Field(default=True, description="Вопросы, практически совпадающие с типовыми (local_corpus_qa_files), отвечаются по готовому ответу без поиска")
+    faq_min_score: float = Field(default=0.92, description="Мин. косинусная близость вопроса к типовому, при которой используется готовый ответ")
+    faq_max_answers: int = Field(default=2, description="Сколько совпавших типовых вопросов подставляется в контекст")
+    search_router_enabled: bool = True
+    search_router_min_confidence: float = Field(default=0.9, description="Мин. уверенность классификатора, при которой решение о поиске принимается без LLM")
+    router_qa_files: List[str] = [
+        str(PROJECT_ROOT / "data" / "old" / "data_prev" / "zakupki_parsed.json"),
+        str(PROJECT_ROOT / "data" / "old" / "data_prev" / "data.json"),
+    ]
+    router_no_search_file: str = str(PROJECT_ROOT / "data" / "raw" / "no_search_queries.txt")
+
+class HttpSettings(BaseSettings):
+    """Настройки общего пула HTTP-соединений (загрузка страниц и Tavily)."""
+    max_hosts: int = Field(default=32, description="Сколько хостов держат пул keep-alive соединений одновременно")
+    max_connections_per_host: int = Field(default=4, description="Макс. соединений с одним хостом (лишние запросы ждут)")
+    max_connections: int = Field(default=64, description="Макс. соединений асинхронного клиента в сумме")
+    keepalive_expiry_seconds: float = 30.0
+    retries: int = Field(default=2, description="Повторы при сетевых ошибках и ответах 429/5xx")
+    retry_backoff_factor: float = Field(default=0.5, description="Задержка перед повтором: factor * 2^(попытка - 1) сек.")
+    max_page_bytes: int = Field(default=5 * 1024 * 1024, description="Страницы больше этого размера обрезаются")
+    max_api_response_bytes: int = Field(default=10 * 1024 * 1024, description="Ответ API поиска больше этого размера считается ошибкой")
+
+class SchedulerSettings(BaseSettings):
+    """Настройки очереди запросов к локальной LLM."""
+    enabled: bool = True
+    max_queue_depth: int = Field(default=32, description="Макс. кол-во запросов в очереди (ожидающих и выполняемых)")
+    enqueue_timeout_seconds: float = Field(default=5.0, description="Сколько ждать места в заполненной очереди перед отказом")
+    metrics_window: int = Field(default=1000, description="Кол-во последних запросов для метрик ожидания/обслуживания")
+
+class ObservabilitySettings(BaseSettings):
+    """Настройки экспорта спанов пайплайна: метрики Prometheus и JSONL-трейсы."""
+    metrics_enabled: bool = True
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = Field(default=0, description="Порт HTTP-эндпоинта /metrics (0 = эндпоинт не запускается)")
+    histogram_buckets: List[float] = Field(
+        default=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+        description="Границы корзин гистограммы длительности этапов (сек.)"
+    )
+    trace_file_enabled: bool = True
+    trace_file: str = str(PROJECT_ROOT / "data" / "traces" / "spans.jsonl")
+    trace_file_max_bytes: int = Field(default=50 * 1024 * 1024, description="Размер файла трейсов, после которого он ротируется")
+    trace_file_backups: int = 3
+    profile_dir: str = str(PROJECT_ROOT / "data" / "profiles")
+    profile_top_n: int = Field(default=30, description="Кол-во функций и мест выделения памяти в отчете профилирования")
+    profile_trace_frames: int = Field(default=5, description="Глубина стека, сохраняемая tracemalloc для каждого выделения")
 
 class AgentSettings(BaseSettings):
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR"] = "INFO"
@@ -69,12 +174,20 @@ class AgentSettings(BaseSettings):
     max_tokens: int = 1536
     llm_verbose: bool = False
     agent_verbose: bool = True # Оставим для отладки executor если понадобится
+    use_query_planner: bool = True # Решение о поиске и поисковый запрос одним вызовом LLM
+    lazy_model_loading: bool = True # Модели загружаются при первом обращении (или фоновым прогревом), а не при импорте
+    background_warmup: bool = True # Прогрев моделей и индексов в фоновом потоке сразу после старта
+    model_probe_calls: bool = False # Пробные вызовы LLM / эмбеддингов при загрузке (проверка работоспособности)
 
     local_llm: LocalLLMSettings = LocalLLMSettings()
     gemini_llm: GeminiLLMSettings = GeminiLLMSettings()
     tavily: TavilySettings = TavilySettings() # <--- ДОБАВЛЕНО
     embeddings: EmbeddingSettings = EmbeddingSettings()
     tools: ToolSettings = ToolSettings()
+    cache: CacheSettings = CacheSettings()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    http: HttpSettings = HttpSettings()
+    observability: ObservabilitySettings = ObservabilitySettings()
 
     model_config = SettingsConfigDict(
         env_nested_delimiter='__',
@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_MAX_PARAMS = 500
+
+
+class EmbeddingCache:
+    """
+    Персистентный content-addressed кеш эмбеддингов.
+    Ключ — sha256(имя модели + текст чанка). Векторы хранятся в memory-mapped массиве
+    (float16/float32) в файле, индекс ключ -> слот и время последнего обращения — в SQLite.
+    При превышении max_entries вытесняются давно не использованные записи (LRU), их слоты переиспользуются.
+    Каталог кеша могут одновременно использовать несколько процессов (Streamlit, build_local_index):
+    слоты выделяются в транзакции BEGIN IMMEDIATE (MAX(slot) + 1 или вытесненные), вектор пишется в файл
+    после фиксации строки, а читатели видят только строки с ready = 1 — записанные полностью.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 200_000, dtype: str = "float16"):
+        self.model_name = model_name
+        self.max_entries = max(1, max_entries)
+        self._dtype = np.dtype(dtype)
+        self._dir = Path(cache_dir) / "embeddings" / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self._dir / f"vectors.{self._dtype.name}"
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._capacity = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(str(self._dir / "index.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER NOT NULL, last_access REAL NOT NULL, ready INTEGER NOT NULL DEFAULT 1)"
+        )
+        if "ready" not in {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN ready INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        meta = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+        self._dim: Optional[int] = int(meta["dim"]) if "dim" in meta else None
+        if meta.get("dtype", self._dtype.name) != self._dtype.name:
+            logger.warning(f"EMB_CACHE: Тип хранения изменился ({meta.get('dtype')} -> {self._dtype.name}), кеш очищается.")
+            self.clear()
+        elif self._dim is not None:
+            self._open_vectors()
+        logger.info(f"EMB_CACHE: Кеш эмбеддингов '{model_name}' открыт ({self._count()} записей, лимит {self.max_entries}, {self._dtype.name}).")
+
+    def make_key(self, text: str) -> str:
+        """Возвращает content-addressed ключ для текста."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Возвращает векторы (float32) для текстов; None для отсутствующих в кеше."""
+        keys = [self.make_key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            if self._dim is None:
+                self._load_dim()
+            slots: Dict[str, int] = {}
+            if self._vectors is not None:
+                # Разделяемая блокировка SQLite держится, пока векторы читаются из файла: другой процесс не может
+                # зафиксировать вытеснение этих слотов и записать в них новые векторы.
+                self._conn.execute("BEGIN")
+                try:
+                    slots = self._lookup_slots(keys, ready_only=True)
+                    if slots and max(slots.values()) >= self._capacity:
+                        self._open_vectors()  # файл векторов вырос в другом процессе
+                    for i, key in enumerate(keys):
+                        slot = slots.get(key)
+                        if slot is not None:
+                            results[i] = np.array(self._vectors[slot], dtype=np.float32)
+                finally:
+                    self._conn.commit()
+            if slots:
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(now, key) for key in slots])
+                self._conn.commit()
+            found = sum(1 for r in results if r is not None)
+            self.hits += found
+            self.misses += len(keys) - found
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Сохраняет векторы текстов, вытесняя LRU-записи при достижении лимита."""
+        unique: Dict[str, np.ndarray] = {}
+        for text, vector in zip(texts, vectors):
+            unique[self.make_key(text)] = np.asarray(vector, dtype=np.float32)
+        if not unique:
+            return
+        with self._lock:
+            if self._dim is None:
+                self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(len(next(iter(unique.values())))),))
+                self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dtype', ?)", (self._dtype.name,))
+                self._conn.commit()
+                self._load_dim()
+
+            # Выделение слотов — под блокировкой записи SQLite, общей для всех процессов кеша.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._lookup_slots(list(unique), ready_only=False)
+                new_keys = [key for key in unique if key not in existing]
+                if not new_keys:
+                    self._conn.commit()
+                    return
+                slots = self._allocate_slots(len(new_keys))
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT INTO entries (key, slot, last_access, ready) VALUES (?, ?, ?, 0)",
+                    [(key, slot, now) for key, slot in zip(new_keys, slots)],
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+            # После фиксации ни один читатель не видит в этих слотах вытесненные записи, а новые скрыты до ready = 1.
+            for key, slot in zip(new_keys, slots):
+                self._vectors[slot] = unique[key]
+            self._vectors.flush()
+            self._conn.executemany("UPDATE entries SET ready = 1 WHERE key = ? AND slot = ?", list(zip(new_keys, slots)))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика кеша: попадания, промахи, hit rate, кол-во записей."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._count(),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self) -> None:
+        """Полностью очищает кеш."""
+        with self._lock:
+            self._vectors = None
+            self._capacity = 0
+            self._dim = None
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+            if self._vectors_path.exists():
+                self._vectors_path.unlink()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _load_dim(self) -> None:
+        """Размерность из meta (ее мог записать другой процесс) и отображение файла векторов."""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        if row is not None:
+            self._dim = int(row[0])
+            self._open_vectors()
+
+    def _lookup_slots(self, keys: List[str], ready_only: bool) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        condition = " AND ready = 1" if ready_only else ""
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            batch = keys[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            for key, slot in self._conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders}){condition}", batch):
+                slots[key] = slot
+        return slots
+
+    def _allocate_slots(self, needed: int) -> List[int]:
+        """Слоты для новых записей; вызывается внутри транзакции BEGIN IMMEDIATE."""
+        next_slot = self._conn.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()[0]
+        slots = list(range(next_slot, next_slot + max(0, min(needed, self.max_entries - next_slot))))
+        to_evict = needed - len(slots)
+        if to_evict > 0:
+            # Вытесняются только записанные полностью: в слот недописанной записи еще пишет другой процесс.
+            evicted = self._conn.execute(
+                "SELECT key, slot FROM entries WHERE ready = 1 ORDER BY last_access ASC LIMIT ?", (to_evict,)
+            ).fetchall()
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+            logger.debug(f"EMB_CACHE: Вытеснено {len(evicted)} записей (LRU).")
+        if slots and max(slots) >= self._capacity:
+            self._grow(max(slots) + 1)
+        return slots
+
+    def _open_vectors(self) -> None:
+        row_bytes = self._dim * self._dtype.itemsize
+        size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+        self._capacity = size // row_bytes
+        if self._capacity == 0:
+            self._vectors = None
+            self._grow(1)
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=self._dtype, mode="r+", shape=(self._capacity, self._dim))
+
+    def _grow(self, min_capacity: int) -> None:
+        row_bytes = self._dim * self._dtype.itemsize
+        new_capacity = min(self.max_entries, max(min_capacity, self._capacity * 2, 1024))
+        new_capacity = max(new_capacity, min_capacity)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            # Файл мог вырасти в другом процессе: он только расширяется, никогда не усекается.
+            size = f.seek(0, 2)
+            if new_capacity * row_bytes > size:
+                f.truncate(new_capacity * row_bytes)
+            new_capacity = max(new_capacity, size // row_bytes)
+        self._capacity = new_capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=self._dtype, mode="r+", shape=(self._capacity, self._dim))
+
+
+class CachedEmbeddings(Embeddings):
+    """Обертка над моделью эмбеддингов: embed_documents берет векторы из EmbeddingCache и вызывает модель только для промахов."""
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        try:
+            cached = self.cache.get_many(texts)
+        except Exception as e:
+            logger.error(f"EMB_CACHE: Ошибка чтения кеша, векторизация без кеша: {e}", exc_info=True)
+            return self.base.embed_documents(texts)
+
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            computed = self.base.embed_documents(missing_texts)
+            computed_by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(missing_texts, computed)}
+            for i in missing:
+                cached[i] = computed_by_text[texts[i]]
+            try:
+                self.cache.put_many(missing_texts, computed)
+            except Exception as e:
+                logger.error(f"EMB_CACHE: Ошибка записи в кеш: {e}", exc_info=True)
+
+        stats = self.cache.stats()
+        logger.debug(f"EMB_CACHE: Из кеша {len(texts) - len(missing)}/{len(texts)} векторов (общий hit rate: {stats['hit_rate']:.1%}, записей: {stats['entries']}).")
+        return [vector.tolist() for vector in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from lxml import etree
+
+# Теги, содержимое которых целиком отбрасывается при разборе (служебные блоки, навигация, элементы управления).
+# Сам <form> не отбрасывается: на страницах ASP.NET WebForms (многие региональные порталы закупок)
+# в одну форму обернуто все тело страницы.
+DROPPED_TAGS = frozenset({
+    "script", "style", "noscript", "template", "nav", "footer", "aside",
+    "input", "button", "select", "textarea", "svg", "iframe", "img", "object", "embed", "canvas",
+})
+# Блочные теги: их границы становятся переводами строк, чтобы абзацы и пункты не склеивались.
+BLOCK_TAGS = frozenset({
+    "p", "div", "br", "li", "ul", "ol", "dl", "dt", "dd", "tr", "table", "section", "article", "main",
+    "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "header", "figure", "figcaption", "form",
+})
+CELL_TAGS = frozenset({"td", "th"})
+_HEAD_TAGS = frozenset({"html", "head", "title", "meta"})
+
+_FEED_CHUNK = 64 * 1024
+
+
+@dataclass
+class HtmlText:
+    """Текст страницы без служебной разметки и метаданные в формате WebBaseLoader."""
+    text: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+
+class _TextCollector:
+    """
+    Цель парсера lxml: получает события start / end / data по мере разбора и собирает только видимый текст.
+    Обработчики вызываются на каждый тег и фрагмент текста, поэтому в них минимум работы:
+    нормализация пробелов и подсчет символов делаются пачками вне парсера.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.metadata: Dict[str, str] = {}
+        self._skip = 0
+        # Куда пишется текст: тело страницы, заголовок (title) или никуда (остальное содержимое head).
+        self._sink: Optional[List[str]] = self.parts
+        self._title: List[str] = []
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        if self._skip or tag in DROPPED_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in CELL_TAGS:
+            self.parts.append(" ")
+        elif tag in _HEAD_TAGS:
+            self._start_head_tag(tag, attrib)
+
+    def end(self, tag: str) -> None:
+        if self._skip:
+            self._skip -= 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag == "head":
+            self._sink = self.parts
+        elif tag == "title":
+            self.metadata.setdefault("title", " ".join("".join(self._title).split()))
+            self._sink = None if self._sink is self._title else self._sink
+
+    def data(self, text: str) -> None:
+        if not self._skip and self._sink is not None:
+            self._sink.append(text)
+
+    def close(self) -> None:
+        pass
+
+    def _start_head_tag(self, tag: str, attrib: Dict[str, str]) -> None:
+        if tag == "html" and "lang" in attrib:
+            self.metadata.setdefault("language", attrib["lang"])
+        elif tag == "head":
+            self._sink = None
+        elif tag == "title":
+            self._sink = self._title
+        elif tag == "meta" and attrib.get("name", "").lower() == "description":
+            self.metadata.setdefault("description", attrib.get("content", ""))
+
+
+def extract_html_text(html: str, max_chars: Optional[int] = None) -> HtmlText:
+    """
+    Извлекает видимый текст HTML за один проход потокового парсера lxml: служебные теги
+    (DROPPED_TAGS) отбрасываются вместе с содержимым прямо во время разбора, дерево документа
+    не строится. Разбор прекращается, как только набрано max_chars символов текста.
+    """
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector, remove_comments=True, remove_pis=True, no_network=True, recover=True)
+    parts = collector.parts
+    chars, counted, truncated = 0, 0, False
+    for start in range(0, len(html), _FEED_CHUNK):
+        parser.feed(html[start:start + _FEED_CHUNK])
+        if max_chars is not None:
+            chars += sum(map(len, parts[counted:]))
+            counted = len(parts)
+            if chars >= max_chars:
+                truncated = start + _FEED_CHUNK < len(html)
+                break
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass
+
+    # str.split() без аргументов схлопывает любые пробельные символы, включая неразрывный пробел, и намного быстрее regex.
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    text = "\n".join(line for line in lines if line)
+    if max_chars is not None and len(text) > max_chars:
+        text, truncated = text[:max_chars], True
+    return HtmlText(text=text, metadata=collector.metadata, truncated=truncated)
+
+
+__all__ = ["HtmlText", "extract_html_text", "DROPPED_TAGS"]
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ResponseTooLarge(Exception):
+    """Ответ превышает допустимый размер, а обрезать его нельзя (например, JSON API)."""
+
+
+class HttpStats:
+    """Счетчики пула соединений: запросы, новые соединения (рукопожатия TCP+TLS), объем и обрезанные ответы."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.handshake_seconds = 0.0
+        self.bytes_received = 0
+        self.truncated = 0
+
+    def record_request(self, received: int, truncated: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += received
+            self.truncated += int(truncated)
+
+    def record_connection(self, seconds: float) -> None:
+        with self._lock:
+            self.connections += 1
+            self.handshake_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reuse_ratio": max(0.0, 1 - self.connections / self.requests) if self.requests else 0.0,
+                "avg_handshake_ms": self.handshake_seconds / self.connections * 1000 if self.connections else 0.0,
+                "bytes_received": self.bytes_received,
+                "truncated": self.truncated,
+            }
+
+
+def _timed_pool_classes(stats: HttpStats) -> Dict[str, type]:
+    """Классы пулов urllib3, чьи соединения замеряют время установки (TCP, для https — вместе с TLS)."""
+
+    class TimedHTTPConnection(HTTPConnection):
+        def connect(self) -> None:
+            started = time.perf_counter()
+            super().connect()
+            stats.record_connection(time.perf_counter() - started)
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self) -> None:
+            started = time.perf_counter()
+            super().connect()
+            stats.record_connection(time.perf_counter() - started)
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+class _PooledAdapter(HTTPAdapter):
+    def __init__(self, stats: HttpStats, **kwargs: Any):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _timed_pool_classes(self._stats)
+
+
+class HttpClient:
+    """
+    Общий для процесса HTTP-клиент загрузки страниц и запросов к API поиска.
+    Синхронные запросы идут через requests.Session с пулом keep-alive соединений
+    (не более max_connections_per_host на хост, лишние запросы ждут свободного соединения)
+    и повторами с экспоненциальной задержкой для сетевых ошибок и ответов 429/5xx.
+    Асинхронные — через httpx.AsyncClient, по одному на event loop, с теми же лимитами; клиент держит
+    ссылку на свой loop, поэтому владелец loop закрывает его через aclose_loop_client() до закрытия loop.
+    Тело ответа читается потоком и ограничивается max_bytes.
+    """
+
+    def __init__(self, timeout: float, max_hosts: int = 32, max_connections_per_host: int = 4,
+                 max_connections: int = 64, keepalive_expiry: float = 30.0, retries: int = 2,
+                 backoff_factor: float = 0.5):
+        self.timeout = timeout
+        self.stats = HttpStats()
+        self._retries = retries
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        adapter = _PooledAdapter(
+            self.stats, pool_connections=max_hosts, pool_maxsize=max_connections_per_host,
+            pool_block=True, max_retries=retry,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._backoff_factor = backoff_factor
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None,
+            truncate: bool = True) -> requests.Response:
+        return self.request("GET", url, headers=headers, max_bytes=max_bytes, truncate=truncate)
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, json: Any = None,
+                max_bytes: Optional[int] = None, truncate: bool = True) -> requests.Response:
+        """
+        Выполняет запрос через общий пул. Тело ответа длиннее max_bytes обрезается (truncate=True)
+        или приводит к ResponseTooLarge.
+        """
+        response = self.session.request(method, url, headers=headers, json=json, timeout=self.timeout, stream=True)
+        try:
+            body, truncated = _read_limited(response.iter_content(64 * 1024), max_bytes)
+        finally:
+            response.close()
+        self.stats.record_request(len(body), truncated)
+        if truncated:
+            if not truncate:
+                raise ResponseTooLarge(f"Ответ {url} больше {max_bytes} байт.")
+            logger.warning(f"HTTP: Ответ {url} обрезан до {max_bytes} байт.")
+        response._content = body
+        return response
+
+    async def aget(self, url: str, headers: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None,
+                   truncate: bool = True) -> httpx.Response:
+        return await self.arequest("GET", url, headers=headers, max_bytes=max_bytes, truncate=truncate)
+
+    async def arequest(self, method: str, url: str, headers: Optional[Dict[str, str]] = None, json: Any = None,
+                       max_bytes: Optional[int] = None, truncate: bool = True) -> httpx.Response:
+        """Асинхронный вариант request (общий пул httpx текущего event loop)."""
+        client = self._async_client()
+        attempt = 0
+        while True:
+            async with client.stream(method, url, headers=headers, json=json,
+                                     extensions={"trace": self._trace_callback(url.startswith("https"))}) as response:
+                retry = response.status_code in RETRY_STATUSES and attempt < self._retries
+                if not retry:
+                    body, truncated = await _aread_limited(response.aiter_bytes(64 * 1024), max_bytes)
+            if retry:
+                # Транспорт httpx повторяет только ошибки соединения; 429/5xx повторяем сами, с той же задержкой, что и urllib3.
+                await asyncio.sleep(self._backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            self.stats.record_request(len(body), truncated)
+            if truncated:
+                if not truncate:
+                    raise ResponseTooLarge(f"Ответ {url} больше {max_bytes} байт.")
+                logger.warning(f"HTTP: Ответ {url} обрезан до {max_bytes} байт.")
+            # Тело уже распаковано и, возможно, обрезано — заголовки о сжатии и длине к нему не относятся.
+            headers_read = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in ("content-encoding", "content-length")]
+            return httpx.Response(response.status_code, headers=headers_read, content=body, request=response.request)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(limits=self._limits, retries=self._retries)
+            client = httpx.AsyncClient(transport=transport, timeout=self.timeout, follow_redirects=True)
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose_loop_client(self) -> None:
+        """Закрывает httpx.AsyncClient текущего event loop (его keep-alive соединения) и забывает его."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _trace_callback(self, https: bool) -> Callable[[str, Any], Any]:
+        """Обработчик событий httpcore: замеряет установку нового соединения (TCP, для https — вместе с TLS)."""
+        done_event = "connection.start_tls.complete" if https else "connection.connect_tcp.complete"
+        started: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.started":
+                started["at"] = time.perf_counter()
+            elif event_name == done_event and "at" in started:
+                self.stats.record_connection(time.perf_counter() - started.pop("at"))
+
+        return trace
+
+    def close(self) -> None:
+        self.session.close()
+
+
+async def _aread_limited(chunks: Any, max_bytes: Optional[int]) -> Tuple[bytes, bool]:
+    parts, size = [], 0
+    async for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            return b"".join(parts)[:max_bytes], True
+    return b"".join(parts), False
+
+
+def _read_limited(chunks: Any, max_bytes: Optional[int]) -> Tuple[bytes, bool]:
+    parts, size = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            return b"".join(parts)[:max_bytes], True
+    return b"".join(parts), False
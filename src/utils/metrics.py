@@ -0,0 +1,201 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.utils.tracing import Span, add_span_listener
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Числовые атрибуты спанов, которые суммируются в счетчики zakupki_stage_<атрибут>_total.
+_COUNTED_ATTRIBUTES = ("chars", "bytes", "chunks", "results")
+
+
+class StageMetrics:
+    """
+    Агрегирует завершенные спаны в метрики Prometheus по этапам: гистограмму длительности,
+    счетчики ошибок, исходов кеша и объемов (символы, байты, чанки, результаты поиска).
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._cache: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._totals: Dict[Tuple[str, str], float] = defaultdict(float)
+
+    def observe(self, span: Span) -> None:
+        seconds = span.duration_ms / 1000
+        attributes = span.attributes
+        with self._lock:
+            counts = self._bucket_counts.setdefault(span.name, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            self._sums[span.name] += seconds
+            self._counts[span.name] += 1
+            if "error" in attributes:
+                self._errors[span.name] += 1
+            if "cache" in attributes:
+                self._cache[(span.name, str(attributes["cache"]))] += 1
+            for attribute in _COUNTED_ATTRIBUTES:
+                value = attributes.get(attribute)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._totals[(span.name, attribute)] += value
+
+    __call__ = observe
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Кол-во вызовов, средняя длительность (мс) и кол-во ошибок по этапам — для интерфейса."""
+        with self._lock:
+            return {
+                stage: {
+                    "count": count,
+                    "mean_ms": self._sums[stage] / count * 1000,
+                    "errors": self._errors.get(stage, 0),
+                }
+                for stage, count in self._counts.items()
+            }
+
+    def render(self) -> str:
+        """Метрики в текстовом формате экспозиции Prometheus (версия 0.0.4)."""
+        with self._lock:
+            lines = [
+                "# HELP zakupki_stage_duration_seconds Длительность этапов пайплайна агента.",
+                "# TYPE zakupki_stage_duration_seconds histogram",
+            ]
+            for stage in sorted(self._counts):
+                label = _escape(stage)
+                for bound, count in zip(self.buckets, self._bucket_counts[stage]):
+                    lines.append(f'zakupki_stage_duration_seconds_bucket{{stage="{label}",le="{bound:g}"}} {count}')
+                lines.append(f'zakupki_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {self._counts[stage]}')
+                lines.append(f'zakupki_stage_duration_seconds_sum{{stage="{label}"}} {self._sums[stage]:.6f}')
+                lines.append(f'zakupki_stage_duration_seconds_count{{stage="{label}"}} {self._counts[stage]}')
+
+            lines += [
+                "# HELP zakupki_stage_errors_total Этапы, завершившиеся исключением.",
+                "# TYPE zakupki_stage_errors_total counter",
+            ]
+            for stage in sorted(self._counts):
+                lines.append(f'zakupki_stage_errors_total{{stage="{_escape(stage)}"}} {self._errors.get(stage, 0)}')
+
+            lines += [
+                "# HELP zakupki_stage_cache_total Исходы обращений к кешам по этапам.",
+                "# TYPE zakupki_stage_cache_total counter",
+            ]
+            for (stage, result), count in sorted(self._cache.items()):
+                lines.append(f'zakupki_stage_cache_total{{stage="{_escape(stage)}",result="{_escape(result)}"}} {count}')
+
+            for attribute in _COUNTED_ATTRIBUTES:
+                values = sorted((stage, value) for (stage, name), value in self._totals.items() if name == attribute)
+                if not values:
+                    continue
+                lines += [
+                    f"# HELP zakupki_stage_{attribute}_total Суммарный объем ({attribute}) по этапам.",
+                    f"# TYPE zakupki_stage_{attribute}_total counter",
+                ]
+                for stage, value in values:
+                    lines.append(f'zakupki_stage_{attribute}_total{{stage="{_escape(stage)}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+class JsonlTraceWriter:
+    """Пишет каждый завершенный спан строкой JSON в файл с ротацией по размеру."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, span: Span) -> None:
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "session_id": span.session_id,
+            "name": span.name,
+            "start": round(span.started_at, 6),
+            "duration_ms": round(span.duration_ms, 3),
+            "attributes": span.attributes,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        self._handler.emit(logging.makeLogRecord({"msg": line, "args": None}))
+
+    __call__ = write
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics" or _stage_metrics is None:
+            self.send_error(404)
+            return
+        body = _stage_metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+_stage_metrics: Optional[StageMetrics] = None
+_install_lock = threading.Lock()
+_installed = False
+
+
+def install_exporters() -> None:
+    """
+    Подключает экспорт спанов согласно настройкам observability: метрики Prometheus (и, если задан
+    порт, HTTP-эндпоинт /metrics) и JSONL-трейсы. Повторные вызовы ничего не делают.
+    """
+    global _stage_metrics, _installed
+    from src.config import settings
+
+    with _install_lock:
+        if _installed or not settings:
+            return
+        _installed = True
+        config = settings.observability
+        if config.metrics_enabled:
+            _stage_metrics = StageMetrics(config.histogram_buckets)
+            add_span_listener(_stage_metrics)
+            if config.metrics_port:
+                try:
+                    server = ThreadingHTTPServer((config.metrics_host, config.metrics_port), _MetricsHandler)
+                    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+                    logger.info(f"TRACING: Метрики Prometheus доступны на http://{config.metrics_host}:{config.metrics_port}/metrics")
+                except OSError as e:
+                    logger.error(f"TRACING: Не удалось запустить HTTP-эндпоинт метрик: {e}")
+        if config.trace_file_enabled:
+            try:
+                add_span_listener(JsonlTraceWriter(config.trace_file, config.trace_file_max_bytes, config.trace_file_backups))
+                logger.info(f"TRACING: Трейсы запросов пишутся в {config.trace_file}")
+            except OSError as e:
+                logger.error(f"TRACING: Не удалось открыть файл трейсов {config.trace_file}: {e}")
+
+
+def get_stage_metrics() -> Optional[StageMetrics]:
+    return _stage_metrics
+
+
+def render_prometheus() -> str:
+    """Текущие метрики в формате Prometheus (пустая строка, если экспорт метрик выключен)."""
+    return _stage_metrics.render() if _stage_metrics else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+__all__ = ["StageMetrics", "JsonlTraceWriter", "install_exporters", "get_stage_metrics", "render_prometheus"]
@@ -0,0 +1,134 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.utils.helpers import get_domain_from_url
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedPage:
+    """Запись кеша страниц."""
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class PageCache:
+    """
+    Локальный кеш веб-страниц (SQLite): извлеченный текст, метаданные и ETag / Last-Modified.
+    Свежесть определяется TTL домена; устаревшие записи перепроверяются условным
+    GET (If-None-Match / If-Modified-Since).
+    """
+
+    def __init__(self, cache_dir: str, default_ttl: int = 86400, domain_ttls: Optional[Dict[str, int]] = None, max_entries: int = 5000):
+        self.default_ttl = default_ttl
+        self.domain_ttls = {domain.lower(): ttl for domain, ttl in (domain_ttls or {}).items()}
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        path = Path(cache_dir) / "pages.sqlite"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if "body" in columns:
+            # Кеш прежнего формата хранил еще и сжатое тело страницы; записи просто загрузятся заново.
+            logger.info("PAGE_CACHE: Кеш страниц прежнего формата сброшен.")
+            self._conn.execute("DROP TABLE pages")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, last_modified TEXT, metadata TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages (last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def ttl_for(self, url: str) -> int:
+        """TTL (сек.) для URL: ищется по домену и его родительским доменам, иначе default_ttl."""
+        domain = get_domain_from_url(url) or ""
+        while domain:
+            if domain in self.domain_ttls:
+                return self.domain_ttls[domain]
+            domain = domain.partition(".")[2]
+        return self.default_ttl
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.fetched_at < self.ttl_for(page.url)
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, etag, last_modified, metadata, fetched_at FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+        text, etag, last_modified, metadata, fetched_at = row
+        return CachedPage(
+            url=url, text=text, etag=etag, last_modified=last_modified, fetched_at=fetched_at, metadata=json.loads(metadata),
+        )
+
+    def store(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str],
+              metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Сохраняет (или заменяет) извлеченный текст страницы."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, metadata, fetched_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, json.dumps(metadata or {}, ensure_ascii=False), now, now),
+            )
+            self._prune()
+            self._conn.commit()
+
+    def mark_revalidated(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Обновляет время проверки после ответа 304 Not Modified."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (time.time(), etag, last_modified, url),
+            )
+            self._conn.commit()
+
+    def record(self, outcome: str) -> None:
+        """Учитывает исход обращения к кешу: hit / revalidated / miss."""
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        total = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+            "entries": entries,
+        }
+
+    def _prune(self) -> None:
+        excess = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY last_access ASC LIMIT ?)", (excess,)
+            )
+            logger.debug(f"PAGE_CACHE: Вытеснено {excess} страниц (LRU).")
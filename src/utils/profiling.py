@@ -0,0 +1,179 @@
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Профилирование включает глобальные хуки (threading.setprofile, tracemalloc), поэтому одновременно профилируется один запрос.
+_profile_lock = threading.Lock()
+
+# До Python 3.12 cProfile профилирует только поток, в котором включен; потоки, созданные во время запроса
+# (параллельная обработка URL), получают собственные профайлеры. С 3.12 один профайлер видит все потоки.
+_PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+
+@dataclass
+class ProfileReport:
+    """Результат профилирования одного запроса и пути к сохраненным артефактам."""
+    query: str
+    session_id: str
+    wall_ms: float
+    peak_memory_bytes: int
+    cpu_summary: str
+    memory_summary: str
+    directory: Path
+
+    @property
+    def report_path(self) -> Path:
+        return self.directory / "report.txt"
+
+    @property
+    def stats_path(self) -> Path:
+        """Файл pstats (открывается pstats.Stats, snakeviz и т.п.)."""
+        return self.directory / "cpu.prof"
+
+    def to_text(self) -> str:
+        return (
+            f"Запрос: {self.query}\n"
+            f"Сессия: {self.session_id}\n"
+            f"Время: {self.wall_ms:.0f} мс\n"
+            f"Пик памяти (tracemalloc): {self.peak_memory_bytes / 1024 / 1024:.1f} МБ\n\n"
+            f"=== CPU: самые затратные функции ===\n{self.cpu_summary}\n"
+            f"=== Память: места выделения около пика ===\n{self.memory_summary}\n"
+        )
+
+
+class _PeakSampler(threading.Thread):
+    """Следит за объемом памяти под tracemalloc и снимает снимок, когда он приближается к новому пику."""
+
+    def __init__(self, interval: float = 0.05, growth: float = 1.1):
+        super().__init__(name="profile-memory-sampler", daemon=True)
+        self.interval = interval
+        self.growth = growth
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self._snapshot_size = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        current, _ = tracemalloc.get_traced_memory()
+        if self.snapshot is None or current > self._snapshot_size * self.growth:
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+@contextmanager
+def profile_query(query: str, session_id: str, output_dir: str, top_n: int = 30,
+                  trace_frames: int = 5) -> Iterator[List[ProfileReport]]:
+    """
+    Профилирует блок кода (обработку одного запроса) через cProfile и tracemalloc.
+    По выходе из блока сохраняет в output_dir/<время>-<сессия>/ файлы cpu.prof и report.txt,
+    а отчет добавляет в выдаваемый список (он остается пустым, если профилирование не удалось
+    или уже идет профилирование другого запроса — тогда блок выполняется без него).
+    """
+    reports: List[ProfileReport] = []
+    if not _profile_lock.acquire(blocking=False):
+        logger.warning("PROFILING: Уже профилируется другой запрос, этот выполняется без профилирования.")
+        yield reports
+        return
+
+    try:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(trace_frames)
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.take_snapshot()
+        sampler = _PeakSampler()
+        sampler.start()
+
+        profiler = cProfile.Profile()
+        thread_profilers: List[cProfile.Profile] = []
+
+        def _start_thread_profiler(frame, event, arg):
+            thread_profiler = cProfile.Profile()
+            thread_profilers.append(thread_profiler)
+            sys.setprofile(None)
+            thread_profiler.enable()
+
+        if _PER_THREAD_PROFILERS:
+            threading.setprofile(_start_thread_profiler)
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield reports
+        finally:
+            profiler.disable()
+            wall_ms = (time.perf_counter() - started) * 1000
+            if _PER_THREAD_PROFILERS:
+                threading.setprofile(None)
+            sampler.stop()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_snapshot = sampler.snapshot
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                reports.append(_save_report(
+                    query, session_id, output_dir, top_n, wall_ms, peak,
+                    [profiler] + thread_profilers, baseline, peak_snapshot,
+                ))
+            except Exception as e:
+                logger.error(f"PROFILING: Не удалось сохранить профиль запроса: {e}", exc_info=True)
+    finally:
+        _profile_lock.release()
+
+
+def _save_report(query: str, session_id: str, output_dir: str, top_n: int, wall_ms: float, peak: int,
+                 profilers: List[cProfile.Profile], baseline: tracemalloc.Snapshot,
+                 peak_snapshot: Optional[tracemalloc.Snapshot]) -> ProfileReport:
+    directory = Path(output_dir) / f"{datetime.now():%Y%m%d-%H%M%S}-{session_id[:8]}"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    stats = pstats.Stats(profilers[0])
+    for thread_profiler in profilers[1:]:
+        stats.add(thread_profiler)
+    stats.dump_stats(str(directory / "cpu.prof"))
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top_n)
+    cpu_summary = buffer.getvalue()
+
+    if peak_snapshot is not None:
+        # Исключаем выделения самого профилировщика, чтобы они не заслоняли код пайплайна.
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        differences = peak_snapshot.filter_traces(ignored).compare_to(baseline.filter_traces(ignored), "traceback")
+        memory_lines = []
+        for difference in differences[:top_n]:
+            if difference.size_diff <= 0:
+                continue
+            frames = difference.traceback.format(limit=3, most_recent_first=True)
+            memory_lines.append(f"+{difference.size_diff / 1024:.1f} КБ в {difference.count_diff:+d} блоках\n  " + "\n  ".join(frames))
+        memory_summary = "\n".join(memory_lines) or "Нет заметных выделений памяти."
+    else:
+        memory_summary = "Снимок памяти не получен."
+
+    report = ProfileReport(query, session_id, wall_ms, peak, cpu_summary, memory_summary, directory)
+    report.report_path.write_text(report.to_text(), encoding="utf-8")
+    logger.info(f"PROFILING: Профиль запроса ({wall_ms:.0f} мс, пик памяти {peak / 1024 / 1024:.1f} МБ) сохранен в {directory}")
+    return report
+
+
+__all__ = ["ProfileReport", "profile_query"]
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_QUOTES_RE = re.compile(r"[\"'«»“”„`]")
+
+
+def normalize_query(query: str) -> str:
+    """Нормализует поисковый запрос: регистр, ё -> е, кавычки, пробелы и порядок слов."""
+    text = _QUOTES_RE.sub(" ", query.lower().replace("ё", "е"))
+    return " ".join(sorted(text.split()))
+
+
+class SearchCache:
+    """
+    Персистентный TTL-кеш результатов поиска (SQLite).
+    Ключ — нормализованный запрос + параметры поиска (search_depth, max_results).
+    При превышении max_entries удаляются самые старые записи.
+    """
+
+    def __init__(self, cache_dir: str, ttl_seconds: int = 86400, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        path = Path(cache_dir) / "search.sqlite"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "key TEXT PRIMARY KEY, normalized_query TEXT NOT NULL, results TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_search_created_at ON search_results (created_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, search_depth: str, max_results: int) -> str:
+        payload = json.dumps([normalize_query(query), search_depth, max_results], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, search_depth: str, max_results: int) -> Optional[List[Dict[str, Any]]]:
+        """Возвращает закешированные результаты, если они есть и не старше TTL."""
+        key = self.make_key(query, search_depth, max_results)
+        with self._lock:
+            row = self._conn.execute("SELECT results, created_at FROM search_results WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] >= self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, query: str, search_depth: str, max_results: int, results: List[Dict[str, Any]]) -> None:
+        key = self.make_key(query, search_depth, max_results)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, normalized_query, results, created_at) VALUES (?, ?, ?, ?)",
+                (key, normalize_query(query), json.dumps(results, ensure_ascii=False), time.time()),
+            )
+            self._conn.execute("DELETE FROM search_results WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            excess = self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM search_results WHERE key IN (SELECT key FROM search_results ORDER BY created_at ASC LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,140 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Сила границы: при выборе конца чанка побеждает самая сильная граница в окне, при равенстве — самая дальняя.
+ARTICLE, PARAGRAPH, LINE, PART, ITEM, SENTENCE, CLAUSE = 6, 5, 4, 4, 3, 2, 1
+
+# Все границы находятся одним проходом одного регулярного выражения; альтернативы упорядочены по силе.
+# Опережающая проверка первого символа позволяет движку re быстро пропускать позиции, где границы быть не может;
+# цифры заданы диапазоном [0-9]: проверка класса \d для каждого символа заметно медленнее.
+_BOUNDARY_RE = re.compile(
+    r"(?=[СГ§\n.!?…;:)0-9])(?:"
+    r"(?P<article>(?:Статья|Глава)\s*[0-9]+(?:\.[0-9]+)*\.|§\s*[0-9]+(?:\.[0-9]+)*\.)"
+    r"|(?P<paragraph>\n[^\S\n]*\n)"
+    r"|(?P<line>\n)"
+    r"|(?<!\S)(?P<part>[0-9]+(?:\.[0-9]+)*\.\s+(?=[А-ЯЁA-Z«\"]))"
+    r"|(?<!\S)(?P<item>[0-9]+(?:\.[0-9]+)*\)\s)"
+    r"|(?P<letter_item>\)(?<=(?<!\S)[а-яё]\))\s)"
+    r"|(?P<sentence>[.!?…]+(?=\s+[А-ЯЁA-Z«\"(]))"
+    r"|(?P<clause>[;:](?=\s))"
+    r")"
+)
+# Сила границы и ее позиция относительно начала совпадения: заголовки, части и пункты начинают новую
+# единицу (у буквенного пункта "а)" совпадение начинается со скобки, поэтому сдвиг -1). Для остальных
+# (None) граница — конец совпадения: разделитель остается в предыдущем чанке.
+_BOUNDARY_KINDS: Dict[str, Tuple[int, Optional[int]]] = {
+    "article": (ARTICLE, 0),
+    "paragraph": (PARAGRAPH, None),
+    "line": (LINE, None),
+    "part": (PART, 0),
+    "item": (ITEM, 0),
+    "letter_item": (ITEM, -1),
+    "sentence": (SENTENCE, None),
+    "clause": (CLAUSE, None),
+}
+
+
+class TextChunker:
+    """
+    Делит текст на чанки не длиннее chunk_size с перекрытием до chunk_overlap символов.
+    Границы (статьи и главы законов, абзацы, части "1. ...", пункты "1) ...", концы предложений
+    и клауз) находятся за один проход по тексту; конец чанка — самая сильная граница во второй
+    половине окна, а если ее нет — пробел между словами. Чанки задаются смещениями в исходном
+    тексте, копируется только итоговый фрагмент. Заменяет RecursiveCharacterTextSplitter
+    (тот же create_documents с метаданными start_index).
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) должен быть меньше chunk_size ({chunk_size}).")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Границы чанков в виде пар (начало, конец) в исходном тексте, без пробелов по краям."""
+        positions: List[int] = []
+        strengths: List[int] = []
+        for match in _BOUNDARY_RE.finditer(text):
+            strength, shift = _BOUNDARY_KINDS[match.lastgroup]
+            positions.append(match.end() if shift is None else match.start() + shift)
+            strengths.append(strength)
+
+        length = len(text)
+        spans: List[Tuple[int, int]] = []
+        first = 0  # первая граница правее начала текущего чанка; указатель только растет
+        start = _skip_space(text, 0, length)
+        while start < length:
+            limit = start + self.chunk_size
+            while first < len(positions) and positions[first] <= start:
+                first += 1
+            if limit >= length:
+                end, strength = length, ARTICLE
+            else:
+                end, strength = self._best_end(text, positions, strengths, first, start, limit)
+            stripped_end = _rstrip_space(text, start, end)
+            if stripped_end > start:
+                spans.append((start, stripped_end))
+            if end >= length:
+                break
+            start = _skip_space(text, self._next_start(text, positions, strengths, first, start, end, strength), length)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def create_documents(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None) -> List[Document]:
+        """Чанки в виде Document; в метаданных — копия metadatas[i] и start_index (смещение чанка в тексте)."""
+        documents = []
+        for index, text in enumerate(texts):
+            metadata = metadatas[index] if metadatas else {}
+            for start, end in self.split_offsets(text):
+                documents.append(Document(page_content=text[start:end], metadata={**metadata, "start_index": start}))
+        return documents
+
+    def _best_end(self, text: str, positions: List[int], strengths: List[int], first: int,
+                  start: int, limit: int) -> Tuple[int, int]:
+        floor = start + self.chunk_size // 2
+        best, best_strength = -1, -1
+        index = first
+        while index < len(positions) and positions[index] <= limit:
+            if positions[index] >= floor and strengths[index] >= best_strength:
+                best, best_strength = positions[index], strengths[index]
+            index += 1
+        if best >= 0:
+            return best, best_strength
+        cut = text.rfind(" ", floor, limit)
+        return (cut + 1, 0) if cut >= 0 else (limit, 0)
+
+    def _next_start(self, text: str, positions: List[int], strengths: List[int], first: int,
+                    start: int, end: int, end_strength: int) -> int:
+        """
+        Начало следующего чанка: самая ранняя граница предложения (или сильнее) в последних
+        chunk_overlap символах предыдущего чанка, иначе граница слова. Перед новой статьей перекрытия нет.
+        """
+        low = max(end - self.chunk_overlap, start + 1)
+        if not self.chunk_overlap or end_strength >= ARTICLE or low >= end:
+            return end
+        index = first
+        while index < len(positions) and positions[index] < end:
+            if positions[index] >= low and strengths[index] >= SENTENCE:
+                return positions[index]
+            index += 1
+        space = text.find(" ", low, end)
+        return space + 1 if space >= 0 else end
+
+
+def _skip_space(text: str, start: int, end: int) -> int:
+    while start < end and text[start].isspace():
+        start += 1
+    return start
+
+
+def _rstrip_space(text: str, start: int, end: int) -> int:
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+__all__ = ["TextChunker"]
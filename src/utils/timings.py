@@ -0,0 +1,29 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+
+@contextmanager
+def timed(component: str) -> Iterator[None]:
+    """Замеряет время импорта / загрузки компонента и сохраняет его под именем component (мс)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _timings_lock:
+            _timings[component] = elapsed_ms
+        logger.info(f"TIMINGS: {component}: {elapsed_ms:.0f} мс")
+
+
+def get_timings() -> Dict[str, float]:
+    """Замеры времени импорта и загрузки компонентов (мс) в порядке их выполнения."""
+    with _timings_lock:
+        return dict(_timings)
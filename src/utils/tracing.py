@@ -0,0 +1,123 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """Замер одного этапа пайплайна: имя, длительность и атрибуты (размеры, исход кеша и т.п.)."""
+    name: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    started_at: float = 0.0
+    duration_ms: float = 0.0
+    trace_id: Optional[str] = None
+    session_id: Optional[str] = None
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+SpanListener = Callable[[Span], None]
+
+_listeners: List[SpanListener] = []
+_listeners_lock = threading.Lock()
+
+# Текущий запрос (trace id, session_id) и текущий спан — для связи вложенных этапов между собой.
+_current_trace: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def add_span_listener(listener: SpanListener) -> None:
+    """Подписывает обработчик на завершенные спаны (вызывается в потоке, где завершился этап)."""
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_span_listener(listener: SpanListener) -> None:
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Замеряет этап пайплайна. Атрибуты можно дополнить внутри блока через span.set(...);
+    если этап завершился исключением, его тип записывается в атрибут error.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(
+        name, dict(attributes), time.time(),
+        trace_id=trace["trace_id"] if trace else None,
+        session_id=trace["session_id"] if trace else None,
+        parent_id=parent.span_id if parent else None,
+    )
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        _reset(_current_span, token)
+        with _listeners_lock:
+            listeners = list(_listeners)
+        for listener in listeners:
+            try:
+                listener(current)
+            except Exception as e:
+                logger.error(f"TRACING: Ошибка обработчика спанов: {e}", exc_info=True)
+
+
+@contextmanager
+def trace(name: str, session_id: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Корневой спан запроса: выдает новый trace id, который вместе с session_id получают
+    все спаны, открытые внутри блока (в том числе в asyncio.to_thread и потоках через bind_context).
+    """
+    token = _current_trace.set({"trace_id": uuid.uuid4().hex, "session_id": session_id})
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _reset(_current_trace, token)
+
+
+def current_trace_id() -> Optional[str]:
+    trace_context = _current_trace.get()
+    return trace_context["trace_id"] if trace_context else None
+
+
+def bind_context(func: F) -> F:
+    """
+    Возвращает func, выполняемую в копии текущего контекста (trace id, родительский спан).
+    Нужна для пулов потоков: ThreadPoolExecutor, в отличие от asyncio.to_thread, контекст не переносит.
+    """
+    context = contextvars.copy_context()
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+def _reset(var: contextvars.ContextVar, token: contextvars.Token) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        # Генератор (потоковый ответ) закрыт в другом контексте — значение в нем уже не актуально.
+        pass
@@ -19,6 +19,7 @@ if 'session_id' not in st.session_state:
     st.session_state.init_error = None
     st.session_state.internet_checked = False
     st.session_state.run_agent = None
+    st.session_state.run_agent_stream = None
     logger.info(f"STREAMLIT: Новая сессия Streamlit создана: {st.session_state['session_id']}")
 
 @st.cache_data(show_spinner=False)
@@ -37,10 +38,11 @@ def check_internet_connection(host="8.8.8.8", port=53, timeout=3):
 def initialize_flow_components():
     """
     Импортирует зависимости, загружает конфиг и инициализирует LLM.
-    Возвращает кортеж (run_agent_func, settings_object, error_message).
+    Возвращает кортеж (run_agent_func, run_agent_stream_func, settings_object, error_message).
     """
     logger.info("STREAMLIT: Попытка инициализации компонентов (внутри @st.cache_resource)...")
     run_agent_local_func = None
+    run_agent_stream_local_func = None
     settings_local = None
     error_msg = None
     success = False
@@ -56,8 +58,11 @@ def initialize_flow_components():
             logging.getLogger(lib_logger).setLevel(logging.WARNING)
         logger.info(f"STREAMLIT: Уровень логирования установлен в {settings_local.log_level}.")
 
-        from src.agent.executor import initialize_flow, run_agent as agent_runner
+        from src.utils.timings import timed
+        with timed("import:src.agent.executor"):
+            from src.agent.executor import initialize_flow, run_agent as agent_runner, run_agent_stream as agent_stream_runner
         run_agent_local_func = agent_runner
+        run_agent_stream_local_func = agent_stream_runner
 
         logger.debug("STREAMLIT: Вызов initialize_flow()...")
         success, error_msg_init = initialize_flow()
@@ -65,11 +70,11 @@ def initialize_flow_components():
 
         if success:
             logger.info("STREAMLIT: Инициализация компонентов прошла успешно.")
-            return run_agent_local_func, settings_local, None
+            return run_agent_local_func, run_agent_stream_local_func, settings_local, None
         else:
             error_msg = error_msg_init or "Неизвестная ошибка при инициализации потока."
             logger.error(f"STREAMLIT: Ошибка инициализации: {error_msg}")
-            return (lambda q, sid: f"Ошибка: {error_msg}"), settings_local, error_msg
+            return (lambda q, sid: f"Ошибка: {error_msg}"), None, settings_local, error_msg
 
     except ImportError as e:
          error_msg = f"Критическая ошибка импорта при инициализации: {e}"
@@ -80,23 +85,24 @@ def initialize_flow_components():
             gemini_llm = type('obj', (object,), {'gemini_model_name': 'N/A'})()
             agent_verbose = "N/A"; log_level = "ERROR"
          settings_local = DummySettings()
-         return (lambda q, sid: error_msg), settings_local, error_msg
+         return (lambda q, sid: error_msg), None, settings_local, error_msg
     except Exception as e:
         error_msg = f"Неожиданная ошибка при инициализации: {e}"
         logger.critical(error_msg, exc_info=True)
         class DummySettings:
              llm_provider = "Ошибка инициализации"; local_llm = type(...); gemini_llm = type(...); agent_verbose = "N/A"; log_level = "ERROR"
         settings_local = DummySettings()
-        return (lambda q, sid: error_msg), settings_local, error_msg
+        return (lambda q, sid: error_msg), None, settings_local, error_msg
 
 
-run_agent_func_from_init, settings_loaded, init_error_msg = initialize_flow_components()
+run_agent_func_from_init, run_agent_stream_func_from_init, settings_loaded, init_error_msg = initialize_flow_components()
 has_internet = check_internet_connection()
 
 if not init_error_msg and run_agent_func_from_init and settings_loaded:
     st.session_state.flow_initialized = True
     st.session_state.init_error = None
     st.session_state.run_agent = run_agent_func_from_init
+    st.session_state.run_agent_stream = run_agent_stream_func_from_init
     logger.info("STREAMLIT: Состояние обновлено - компоненты инициализированы.")
 else:
     st.session_state.flow_initialized = False
@@ -105,6 +111,7 @@ else:
         error_message = st.session_state.get('init_error', "Компоненты не инициализированы.")
         return f"Ошибка: {error_message}"
     st.session_state.run_agent = error_stub
+    st.session_state.run_agent_stream = None
     logger.error(f"STREAMLIT: Состояние обновлено - ошибка инициализации: {st.session_state.init_error}")
 
 
@@ -138,6 +145,37 @@ if settings_loaded:
     st.sidebar.markdown(f"*   LLM: `{settings_loaded.llm_provider}`")
     st.sidebar.markdown(f"*   Agent Verbose: `{settings_loaded.agent_verbose}`")
     st.sidebar.markdown(f"*   Log Level: `{settings_loaded.log_level}`")
+    if st.session_state.flow_initialized:
+        from src.agent.executor import get_llm_scheduler_stats, get_warmup_status
+        warmup_status = get_warmup_status()
+        with st.sidebar.expander("Загрузка компонентов"):
+            st.markdown(f"Прогрев: `{warmup_status['state']}`")
+            st.json(warmup_status, expanded=False)
+        scheduler_stats = get_llm_scheduler_stats()
+        if scheduler_stats:
+            with st.sidebar.expander("Очередь LLM"):
+                st.markdown(f"В очереди: `{scheduler_stats['queue_depth']}` / `{scheduler_stats['max_queue_depth']}`, отклонено: `{scheduler_stats['rejected']}`")
+                st.json(scheduler_stats, expanded=False)
+        from src.utils.metrics import get_stage_metrics
+        stage_metrics = get_stage_metrics()
+        if stage_metrics:
+            with st.sidebar.expander("Метрики этапов"):
+                st.dataframe(
+                    [{"этап": stage, "вызовов": m["count"], "среднее, мс": round(m["mean_ms"], 1), "ошибок": m["errors"]}
+                     for stage, m in sorted(stage_metrics.summary().items())],
+                    hide_index=True,
+                )
+                st.download_button("Метрики Prometheus", stage_metrics.render(), file_name="metrics.prom", mime="text/plain")
+        from src.agent.tools import get_http_stats
+        http_stats = get_http_stats()
+        if http_stats["requests"]:
+            with st.sidebar.expander("HTTP-соединения"):
+                st.markdown(f"Переиспользование: `{http_stats['reuse_ratio']:.0%}`, рукопожатие: `{http_stats['avg_handshake_ms']:.0f} мс`")
+                st.json(http_stats, expanded=False)
+        st.sidebar.checkbox(
+            "Профилировать запросы (CPU и память)", key="profile_queries",
+            help="Каждый запрос выполняется под cProfile и tracemalloc (без потокового вывода); отчет появится ниже.",
+        )
 else:
     st.sidebar.warning("Настройки не загружены.")
 
@@ -153,6 +191,7 @@ prompt_placeholder = "Ассистент недоступен..." if prompt_disa
 if prompt := st.chat_input(prompt_placeholder, disabled=prompt_disabled):
 
     current_run_agent_func = st.session_state.get('run_agent')
+    current_run_agent_stream_func = st.session_state.get('run_agent_stream')
 
     if not st.session_state.flow_initialized or not current_run_agent_func:
         st.error("Ассистент недоступен или произошла ошибка. Невозможно обработать запрос.", icon="🚫")
@@ -168,8 +207,19 @@ if prompt := st.chat_input(prompt_placeholder, disabled=prompt_disabled):
             message_placeholder.markdown("Думаю... 🧠")
 
             try:
-                assistant_response = current_run_agent_func(prompt, session_id=st.session_state['session_id'])
-                message_placeholder.markdown(assistant_response)
+                if st.session_state.get("profile_queries"):
+                    assistant_response = current_run_agent_func(prompt, session_id=st.session_state['session_id'], profile=True)
+                    message_placeholder.markdown(assistant_response)
+                elif current_run_agent_stream_func:
+                    # Ответ выводится по мере генерации; "Думаю..." остается на экране до первого фрагмента.
+                    assistant_response = message_placeholder.write_stream(
+                        current_run_agent_stream_func(prompt, session_id=st.session_state['session_id'])
+                    )
+                    if not isinstance(assistant_response, str):
+                        assistant_response = "".join(str(part) for part in assistant_response)
+                else:
+                    assistant_response = current_run_agent_func(prompt, session_id=st.session_state['session_id'])
+                    message_placeholder.markdown(assistant_response)
                 st.session_state.messages.append({"role": "assistant", "content": assistant_response})
                 logger.info(f"STREAMLIT: Ответ ассистента успешно отображен (сессия: {st.session_state['session_id']}).")
             except Exception as e:
@@ -182,4 +232,16 @@ if prompt := st.chat_input(prompt_placeholder, disabled=prompt_disabled):
 elif prompt_disabled and st.session_state.init_error:
      pass
 elif prompt_disabled:
-     st.warning("Ассистент недоступен, хотя явных ошибок при инициализации не было. Проверьте логи.", icon="⚠️")
\ No newline at end of file
+     st.warning("Ассистент недоступен, хотя явных ошибок при инициализации не было. Проверьте логи.", icon="⚠️")
+
+
+if st.session_state.flow_initialized:
+    from src.agent.executor import get_last_profile
+    last_profile = get_last_profile(st.session_state['session_id'])
+    if last_profile:
+        with st.sidebar.expander("Профиль последнего запроса"):
+            st.markdown(f"Время: `{last_profile.wall_ms:.0f} мс`, пик памяти: `{last_profile.peak_memory_bytes / 1024 / 1024:.1f} МБ`")
+            st.caption(str(last_profile.directory))
+            st.download_button("Отчет (txt)", last_profile.to_text(), file_name="report.txt", mime="text/plain")
+            st.download_button("Профиль CPU (pstats)", last_profile.stats_path.read_bytes(), file_name="cpu.prof")
+            st.text(last_profile.to_text())
\ No newline at end of file
@@ -0,0 +1,4 @@
+import os
+
+# src.config читает настройки при импорте; ключ Gemini обязателен, но тестам сеть не нужна.
+os.environ.setdefault("GOOGLE_API_KEY", "test")
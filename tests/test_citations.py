@@ -0,0 +1,121 @@
+import pytest
+
+from src.agent.citations import Citation, StatuteIndex, build_citation_context, find_citations
+from src.agent.statutes import parse_statute
+
+LAWS = ["44-ФЗ", "223-ФЗ"]
+
+STATUTE = (
+    "Статья 1. Сфера применения\n"
+    "1. Настоящий закон регулирует отношения в сфере закупок.\n"
+    "2. Заказчик вправе: 1) проводить закупки; 2) заключать контракты в соответствии с частью 24 статьи 22.\n"
+    "24. Это не часть, а ссылка.\n"
+    "2.1. Дополнительная часть.\n"
+    "3. Последняя часть.\n"
+    "Статья 2. Термины. Используются понятия: 1) закупка товара; 2) заказчик; 5) пропуск. Статья 1. утратила силу."
+)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("Что сказано в ч. 5 ст. 34 44-ФЗ?", [Citation("44-ФЗ", "34", "5")]),
+        ("пункт 2 части 1 статьи 93 Закона № 44-ФЗ", [Citation("44-ФЗ", "93", "1", "2")]),
+        ("ч. 15 ст. 99 ФЗ № 44", [Citation("44-ФЗ", "99", "15")]),
+        ("п. 3 ст. 3 федерального закона о контрактной системе", [Citation("44-ФЗ", "3", None, "3")]),
+        ("ст. 34 и ст. 95 44-ФЗ", [Citation("44-ФЗ", "34"), Citation("44-ФЗ", "95")]),
+        ("Статья 3 44-ФЗ и ст. 5 223-ФЗ", [Citation("44-ФЗ", "3"), Citation("223-ФЗ", "5")]),
+        # Ссылка на другой акт между статьей и законом: вопрос обрабатывается обычным путем.
+        ("ст. 7.30 КоАП за нарушение 44-ФЗ", None),
+        # Другой акт в вопросе: единственный упомянутый закон не подставляется по умолчанию.
+        ("ст. 22 ГК и 44-ФЗ", None),
+        # Ссылка без закона.
+        ("Что говорит статья 34?", None),
+        ("Что такое НМЦК?", None),
+    ],
+)
+def test_find_citations(query, expected):
+    assert find_citations(query, LAWS) == expected
+
+
+def test_parse_statute_sequential_numbering():
+    units = parse_statute(STATUTE, "44-ФЗ")
+    # "24." и "5)" нарушают нумерацию и не считаются частью и пунктом, "Статья 1." после статьи 2 — не заголовок.
+    assert [(unit.article, unit.part, unit.item) for unit in units] == [
+        ("1", None, None),
+        ("1", "1", None),
+        ("1", "2", None),
+        ("1", "2", "1"),
+        ("1", "2", "2"),
+        ("1", "2.1", None),
+        ("1", "3", None),
+        ("2", None, None),
+        ("2", None, "1"),
+        ("2", None, "2"),
+    ]
+    assert {unit.title for unit in units} == {"Сфера применения", "Термины"}
+
+
+@pytest.mark.parametrize(
+    "citation, label, text",
+    [
+        (Citation("44-ФЗ", "1", "2.1"), "44-ФЗ, ст. 1, ч. 2.1", "2.1. Дополнительная часть."),
+        (Citation("44-ФЗ", "1", "2", "1"), "44-ФЗ, ст. 1, ч. 2, п. 1", "1) проводить закупки;"),
+        (Citation("44-ФЗ", "1", "2"), "44-ФЗ, ст. 1, ч. 2",
+         "2. Заказчик вправе: 1) проводить закупки; 2) заключать контракты в соответствии с частью 24 статьи 22.\n"
+         "24. Это не часть, а ссылка."),
+        # Пункт без части разрешается, только если он в статье один.
+        (Citation("44-ФЗ", "2", None, "1"), "44-ФЗ, ст. 2, п. 1", "1) закупка товара;"),
+    ],
+)
+def test_statute_index_resolve(citation, label, text):
+    index = StatuteIndex({"44-ФЗ": STATUTE}, parse_statute(STATUTE, "44-ФЗ"))
+    unit = index.resolve(citation)
+    assert unit.label == label
+    assert index.unit_text(unit) == text
+
+
+@pytest.mark.parametrize("citation", [Citation("44-ФЗ", "1", "24"), Citation("44-ФЗ", "2", None, "5"), Citation("44-ФЗ", "3")])
+def test_statute_index_unresolved(citation):
+    index = StatuteIndex({"44-ФЗ": STATUTE}, parse_statute(STATUTE, "44-ФЗ"))
+    assert index.resolve(citation) is None
+
+
+@pytest.mark.parametrize(
+    "query, max_chars, included, excluded",
+    [
+        # Статья помещается целиком.
+        ("ст. 1 44-ФЗ", 3500, ["Статья 1. Сфера применения", "3. Последняя часть."], ["фрагменты"]),
+        # Длинная статья сокращается до фрагментов со словами вопроса.
+        ("ст. 1 44-ФЗ о дополнительной части", 300, ["фрагменты, относящиеся к вопросу", "2.1. Дополнительная часть."],
+         ["1. Настоящий закон"]),
+    ],
+)
+def test_build_citation_context(query, max_chars, included, excluded):
+    index = StatuteIndex({"44-ФЗ": STATUTE}, parse_statute(STATUTE, "44-ФЗ"))
+    context = build_citation_context(index, [Citation("44-ФЗ", "1")], query, max_chars)
+    assert len(context) <= max_chars
+    assert all(text in context for text in included)
+    assert not any(text in context for text in excluded)
+
+
+@pytest.mark.parametrize(
+    "citations, query",
+    [
+        # Длинная статья, а вопрос не уточняет, что в ней искать.
+        ([Citation("44-ФЗ", "1")], "Что говорит ст. 1 44-ФЗ"),
+        # Ссылка не найдена в тексте закона.
+        ([Citation("44-ФЗ", "1"), Citation("44-ФЗ", "3")], "ст. 1 и ст. 3 44-ФЗ"),
+    ],
+)
+def test_build_citation_context_falls_back(citations, query):
+    index = StatuteIndex({"44-ФЗ": STATUTE}, parse_statute(STATUTE, "44-ФЗ"))
+    assert build_citation_context(index, citations, query, 300) is None
+
+
+def test_build_citation_context_keeps_braces():
+    statute = "Статья 5. Формат {кода}\n1. Код имеет вид {0}-{ИКЗ}.\n2. Прочее {}."
+    index = StatuteIndex({"44-ФЗ": statute}, parse_statute(statute, "44-ФЗ"))
+    context = build_citation_context(index, [Citation("44-ФЗ", "5", "1")], "ч. 1 ст. 5 44-ФЗ", 3500)
+    assert "Статья 5. Формат {кода}\n" in context
+    assert "Код имеет вид {0}-{ИКЗ}." in context
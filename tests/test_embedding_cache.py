@@ -0,0 +1,40 @@
+import hashlib
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from src.utils.embedding_cache import EmbeddingCache
+
+DIM = 8
+
+
+def _vector(text: str) -> np.ndarray:
+    return np.random.default_rng(int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)).standard_normal(DIM).astype(np.float32)
+
+
+def _fill(cache_dir: str, worker: int, max_entries: int) -> None:
+    cache = EmbeddingCache(cache_dir, "model", max_entries=max_entries, dtype="float32")
+    for batch in range(20):
+        texts = [f"w{worker}-b{batch}-{i}" for i in range(5)]
+        cache.put_many(texts, [_vector(text) for text in texts])
+        cache.get_many(texts)
+
+
+@pytest.mark.parametrize("max_entries", [1000, 150])
+def test_concurrent_processes_keep_vectors_consistent(tmp_path, max_entries):
+    # Процессы, делящие каталог кеша, не должны записывать разные векторы в один слот.
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_fill, args=(str(tmp_path), worker, max_entries)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), "model", max_entries=max_entries, dtype="float32")
+    texts = [f"w{worker}-b{batch}-{i}" for worker in range(4) for batch in range(20) for i in range(5)]
+    found = [(text, vector) for text, vector in zip(texts, cache.get_many(texts)) if vector is not None]
+    assert len(found) == min(len(texts), max_entries)
+    for text, vector in found:
+        np.testing.assert_array_equal(vector, _vector(text))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src.agent import faq
+
+
+class FakeFaqIndex:
+    def __init__(self, texts, metadatas, scores):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.scores = scores
+
+    def search(self, query_vector, k):
+        return list(enumerate(self.scores))[:k]
+
+
+@pytest.fixture
+def fake_index(monkeypatch):
+    index = FakeFaqIndex(
+        texts=["Как заполнить поле {ИКЗ} в извещении?", "Что такое {0} и {}?"],
+        metadatas=[
+            {"label": "Вопрос-ответ {ЕИС}", "answer": "Поле {ИКЗ} заполняется автоматически.", "link": "https://zakupki.gov.ru/?q={x}"},
+            {"label": "Вопрос-ответ", "answer": "Ответ со скобками: {name}.", "link": ""},
+        ],
+        scores=[0.97, 0.95],
+    )
+    monkeypatch.setattr(faq, "_faq_index", index)
+    monkeypatch.setattr(faq, "_faq_index_loaded", True)
+    monkeypatch.setattr(faq.settings.tools, "faq_min_score", 0.9)
+    monkeypatch.setattr(faq.settings.tools, "faq_max_answers", 2)
+    return index
+
+
+def test_match_faq_keeps_braces(fake_index):
+    context, best_score = faq.match_faq(np.zeros(4, dtype=np.float32))
+    assert best_score == pytest.approx(0.97)
+    assert context.startswith(faq.FAQ_CONTEXT_HEADER)
+    assert "источник: Вопрос-ответ {ЕИС}" in context
+    assert "Вопрос: Как заполнить поле {ИКЗ} в извещении?\nОтвет: Поле {ИКЗ} заполняется автоматически." in context
+    assert "Вопрос: Что такое {0} и {}?\nОтвет: Ответ со скобками: {name}." in context
@@ -0,0 +1,25 @@
+import pytest
+
+from src.utils.html_text import extract_html_text
+
+
+@pytest.mark.parametrize(
+    "html, expected",
+    [
+        # ASP.NET WebForms: все тело страницы внутри одной формы.
+        ('<html><body><form id="aspnetForm"><div><p>Статья 93 Закона 44-ФЗ</p></div></form></body></html>',
+         "Статья 93 Закона 44-ФЗ"),
+        # Элементы управления формы отбрасываются, текст вокруг них остается.
+        ('<body><form><label>Номер закупки</label><input type="text" value="123">'
+         '<select><option>44-ФЗ</option></select><textarea>черновик</textarea><button>Найти</button>'
+         '<p>Результаты поиска</p></form></body>',
+         "Номер закупки\nРезультаты поиска"),
+        # header и figure — блоки с текстом, а не служебные разделы.
+        ("<body><header><h1>Закупка у единственного поставщика</h1></header>"
+         "<figure><table><tr><td>Порог</td><td>600 тыс. руб.</td></tr></table><figcaption>Таблица 1</figcaption></figure>"
+         "<nav>Меню</nav><script>var x = 1;</script><footer>Контакты</footer></body>",
+         "Закупка у единственного поставщика\nПорог 600 тыс. руб.\nТаблица 1"),
+    ],
+)
+def test_extract_html_text(html, expected):
+    assert extract_html_text(html).text == expected
@@ -0,0 +1,65 @@
+import pytest
+
+from src.utils.text_chunker import TextChunker
+
+ARTICLES = "Статья 1. Общие положения закона о закупках.\nСтатья 2. Термины и определения в сфере закупок."
+PARTS = "1. Заказчик размещает извещение. 2. Участник подает заявку на участие."
+ITEMS = "Закупка включает: 1) планирование закупки; 2) определение поставщика; 3) исполнение контракта."
+SENTENCES = "Первое предложение текста. Второе предложение текста. Третье предложение текста."
+
+
+@pytest.mark.parametrize(
+    "text, chunk_size, chunk_overlap, expected",
+    [
+        # Короткий текст — один чанк без пробелов по краям.
+        ("  Короткий текст.  ", 100, 10, ["Короткий текст."]),
+        # Граница статьи: перекрытия перед новой статьей нет.
+        (ARTICLES, 60, 10, [
+            "Статья 1. Общие положения закона о закупках.",
+            "Статья 2. Термины и определения в сфере закупок.",
+        ]),
+        # Часть "2. ..." начинает новый чанк.
+        (PARTS, 45, 0, ["1. Заказчик размещает извещение.", "2. Участник подает заявку на участие."]),
+        # Пункты "N) ..." сильнее границы клаузы ";".
+        (ITEMS, 50, 0, [
+            "Закупка включает: 1) планирование закупки;",
+            "2) определение поставщика;",
+            "3) исполнение контракта.",
+        ]),
+        # Перекрытие начинается с границы предложения в конце предыдущего чанка.
+        (SENTENCES, 60, 40, [
+            "Первое предложение текста. Второе предложение текста.",
+            "Второе предложение текста. Третье предложение текста.",
+        ]),
+        # Без границ текст режется по пробелу между словами.
+        ("слово " * 10, 30, 0, ["слово слово слово слово слово"] * 2),
+    ],
+)
+def test_split_text_boundaries(text, chunk_size, chunk_overlap, expected):
+    chunks = TextChunker(chunk_size, chunk_overlap).split_text(text)
+    assert chunks == expected
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+
+
+@pytest.mark.parametrize(
+    "text, chunk_size, chunk_overlap, expected_starts",
+    [
+        ("  Короткий текст.  ", 100, 10, [2]),
+        (ARTICLES, 60, 10, [0, 45]),
+        (PARTS, 45, 0, [0, 33]),
+        (SENTENCES, 60, 40, [0, 27]),
+    ],
+)
+def test_create_documents_start_index(text, chunk_size, chunk_overlap, expected_starts):
+    documents = TextChunker(chunk_size, chunk_overlap).create_documents([text], [{"source": "law"}])
+    assert [doc.metadata["start_index"] for doc in documents] == expected_starts
+    for doc in documents:
+        start = doc.metadata["start_index"]
+        assert text[start:start + len(doc.page_content)] == doc.page_content
+        assert doc.metadata["source"] == "law"
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(100, 100), (100, 150)])
+def test_overlap_must_be_less_than_chunk_size(chunk_size, chunk_overlap):
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size, chunk_overlap)
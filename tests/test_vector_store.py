@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from src.agent.vector_store import build_vector_store, parse_vector_spec
+
+pytest.importorskip("faiss")
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    # Почти изотропные векторы: PCA отбрасывает заметную часть нормы каждого из них.
+    matrix = np.random.default_rng(0).standard_normal((1000, 64)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("spec", ["pca16,flat", "pca16,sq8", "pca32,hnsw16,flat", "pca32,ivf8,flat"])
+def test_pca_keeps_self_similarity(vectors, spec):
+    store = build_vector_store(vectors, parse_vector_spec(spec))
+    store.set_search_params(ef_search=64, nprobe=8)
+    positions = [0, 17, 500]
+    for position in positions:
+        top_position, top_score = store.search(vectors[position], 1)[0]
+        assert top_position == position
+        assert top_score == pytest.approx(1.0, abs=0.02)
+    self_scores = [store.similarity(vectors[position], [position])[0] for position in positions]
+    assert self_scores == pytest.approx([1.0] * len(positions), abs=0.02)